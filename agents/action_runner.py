@@ -1,17 +1,229 @@
+import asyncio
+import copy
 import os
-os.environ["http_proxy"] = "http://172.31.226.127:7890"
-os.environ["https_proxy"] = "http://172.31.226.127:7890"
-from langchain_community.tools import WikipediaQueryRun
-from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
-# from langchain_community.tools.wikipedia import Wiki
-from langchain_community.docstore.wikipedia import Wikipedia    # 这是一个docstore
-from langchain.agents.react.base import DocstoreExplorer
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from functools import cache
+from typing import TYPE_CHECKING, Any
 
-# 🌐 设置代理环境变量以访问维基百科
+if TYPE_CHECKING:
+    from langchain.agents.react.base import DocstoreExplorer
 
+# 🌐 访问维基百科使用的代理,可以通过 WIKIPEDIA_PROXY 环境变量覆盖,设置为空字符串则不使用代理
+DEFAULT_WIKIPEDIA_PROXY = "http://172.31.226.127:7890"
 
-def create_wikipedia_docstore() -> DocstoreExplorer:
-    return DocstoreExplorer(docstore=Wikipedia())
+
+@cache
+def configure_proxy() -> None:
+    """设置代理环境变量以访问维基百科(只在第一次创建 docstore 时执行)"""
+    proxy = os.getenv("WIKIPEDIA_PROXY", DEFAULT_WIKIPEDIA_PROXY)
+    if proxy:
+        os.environ["http_proxy"] = proxy
+        os.environ["https_proxy"] = proxy
+
+
+def create_wikipedia_docstore() -> "DocstoreExplorer":
+    # 延迟导入: langchain 的 docstore 只在真正需要搜索时加载
+    from langchain_community.docstore.wikipedia import Wikipedia    # 这是一个docstore
+    from langchain.agents.react.base import DocstoreExplorer
+
+    configure_proxy()
+    docstore = Wikipedia()
+    if _docstore_use_cache:
+        from agents.docstore_cache import CachedDocstore, get_docstore_cache
+
+        # 💾 搜索结果跨题目、跨进程共享; 每个 agent 仍然有自己的 explorer,lookup 游标互不干扰
+        docstore = CachedDocstore(docstore, get_docstore_cache(), namespace="wikipedia")
+    return DocstoreExplorer(docstore=docstore) # type: ignore
+
+
+class DocstoreBackend(Enum):
+    WIKIPEDIA = "wikipedia"     # 在线访问维基百科
+    OFFLINE = "offline"         # 由数据集 context 编译的离线 docstore,见 agents/offline_docstore.py
+
+
+# 可以通过 DOCSTORE_BACKEND 环境变量或 configure_docstore 切换
+_docstore_backend: DocstoreBackend | None = None
+# 在线后端的搜索结果缓存（离线 docstore 本身就是本地 O(1) 查找,不需要缓存）
+_docstore_use_cache = True
+# Search 未命中时用本地索引（标题模糊匹配 + BM25）解析,索引由离线 docstore 的页面构建
+_docstore_use_index = False
+# Lookup 改为句子级模糊匹配（分句缓存 + 批量打分）,见 agents/lookup_engine.py
+_docstore_lookup_engine = False
+# LLM 思考期间在后台预取可能的 Search 目标,见 agents/prefetch.py（需要在线后端 + 缓存）
+_docstore_prefetch = False
+
+
+def configure_docstore(backend: DocstoreBackend, use_cache: bool = True, use_index: bool = False, lookup_engine: bool = False, prefetch: bool = False) -> None:
+    global _docstore_backend, _docstore_use_cache, _docstore_use_index, _docstore_lookup_engine, _docstore_prefetch
+    _docstore_backend = backend
+    _docstore_use_cache = use_cache
+    _docstore_use_index = use_index
+    _docstore_lookup_engine = lookup_engine
+    _docstore_prefetch = prefetch
+
+
+def get_docstore_backend() -> DocstoreBackend:
+    if _docstore_backend is not None:
+        return _docstore_backend
+    return DocstoreBackend(os.getenv("DOCSTORE_BACKEND", DocstoreBackend.WIKIPEDIA.value))
+
+
+def create_offline_docstore() -> "DocstoreExplorer":
+    from langchain.agents.react.base import DocstoreExplorer
+    from agents.offline_docstore import open_offline_docstore
+
+    # 离线 docstore 整个进程共享一份 mmap,每个 agent 只持有自己的 explorer（lookup 游标互不干扰）
+    return DocstoreExplorer(docstore=open_offline_docstore()) # type: ignore
+
+
+def create_docstore() -> "DocstoreExplorer":
+    """按当前配置的后端创建 docstore explorer"""
+    if get_docstore_backend() == DocstoreBackend.OFFLINE:
+        explorer = create_offline_docstore()
+    else:
+        explorer = create_wikipedia_docstore()
+
+    if _docstore_use_index:
+        from agents.search_index import IndexedDocstore, get_offline_search_index
+
+        # 🎯 拼写接近的 Search[...] 直接解析到最佳页面,其余未命中用索引结果作为 Similar 提示
+        explorer.docstore = IndexedDocstore(explorer.docstore, get_offline_search_index())
+
+    if _docstore_lookup_engine:
+        from agents.lookup_engine import LookupExplorer
+
+        explorer = LookupExplorer(explorer) # type: ignore
+
+    if _docstore_prefetch and _docstore_use_cache and get_docstore_backend() == DocstoreBackend.WIKIPEDIA:
+        from agents.prefetch import PrefetchingExplorer
+
+        # 🔮 离线后端本身就是 O(1) 本地查找,预取没有收益,只对在线后端启用
+        explorer = PrefetchingExplorer(explorer) # type: ignore
+    return explorer
+
+
+def fork_docstore(explorer: "DocstoreExplorer") -> "DocstoreExplorer":
+    """
+    复制 explorer 的游标状态（当前页面、Lookup 位置）,底层 docstore、缓存和索引仍然共享
+
+    包装层（LookupExplorer / PrefetchingExplorer）逐层复制,各自的 __copy__ 负责复制自己的状态。
+    """
+    forked = copy.copy(explorer)
+    inner = getattr(explorer, "explorer", None)
+    if inner is not None:
+        forked.explorer = fork_docstore(inner) # type: ignore
+    return forked
+
+
+class ActionStats:
+    """docstore 动作的耗时统计（线程池中执行,以前这些时间都会阻塞事件循环）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "offloaded_seconds": round(self.total_seconds, 3),
+            "mean_ms": round(self.total_seconds / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+action_stats = ActionStats()
+_action_executor: ThreadPoolExecutor | None = None
+_action_max_workers = 16
+_action_timeout: float | None = 30.0
+
+
+def configure_action_executor(max_workers: int = 16, timeout: float | None = 30.0) -> None:
+    """
+    设置 docstore 动作的线程池
+
+    参数:
+        max_workers: 同时进行的 Search/Lookup 数量上限,避免压垮后端
+        timeout: 单次动作的超时（秒）,None 表示不限制
+    """
+    global _action_executor, _action_max_workers, _action_timeout
+    if _action_executor is not None:
+        _action_executor.shutdown(wait=False)
+        _action_executor = None
+    _action_max_workers = max_workers
+    _action_timeout = timeout
+
+
+def get_action_executor() -> ThreadPoolExecutor:
+    global _action_executor
+    if _action_executor is None:
+        _action_executor = ThreadPoolExecutor(max_workers=_action_max_workers, thread_name_prefix="docstore")
+    return _action_executor
+
+
+def adopt_docstore_state(explorer: "DocstoreExplorer", forked: "DocstoreExplorer") -> None:
+    """
+    把分叉副本的游标状态（当前页面、Lookup 位置等）写回 explorer,与 fork_docstore 逐层对应
+
+    底层 docstore 和各层的锁保持不变; 定义了 adopt_fork 的包装层（PrefetchingExplorer）自己负责合并。
+    """
+    inner = getattr(explorer, "explorer", None)
+    if inner is not None:
+        adopt_docstore_state(inner, forked.explorer) # type: ignore
+    adopt_fork = getattr(explorer, "adopt_fork", None)
+    if adopt_fork is not None:
+        adopt_fork(forked)
+        return
+    for name, value in vars(forked).items():
+        if name not in ("explorer", "docstore", "_lock"):
+            setattr(explorer, name, value)
+
+
+async def run_docstore_action(explorer: "DocstoreExplorer", action: str, *args: Any) -> str:
+    """
+    在线程池中执行同步的 docstore 动作（search / lookup）,事件循环可以同时推进其他题目
+
+    动作在 explorer 的分叉副本上执行,只有等到结果时才在事件循环中把副本的状态写回 explorer。
+    超时（抛出 TimeoutError）或者被取消（例如超过题目的截止时间）时,已经开始的后台调用无法中断,
+    但它只会修改被丢弃的副本,不会在之后覆盖 explorer 的当前页面和 Lookup 游标。
+    """
+    forked = fork_docstore(explorer)
+    fn = getattr(forked, action)
+
+    def timed_call() -> str:
+        start = time.perf_counter()
+        error = False
+        try:
+            return fn(*args)
+        except Exception:
+            error = True
+            raise
+        finally:
+            action_stats.record(time.perf_counter() - start, error=error)
+
+    future = asyncio.get_running_loop().run_in_executor(get_action_executor(), timed_call)
+    try:
+        result = await asyncio.wait_for(future, timeout=_action_timeout)
+    except TimeoutError:
+        action_stats.timeouts += 1
+        raise
+    adopt_docstore_state(explorer, forked)
+    return result
 
 
 
@@ -1,14 +1,16 @@
 from enum import Enum
-from langchain.chat_models.base import BaseChatModel
-from langchain_core.prompts import PromptTemplate
 from utils.prompt import cot_reflect_agent_prompt, cot_reflect_instruction, COT, COT_REFLECT
-from utils.llms import local_llm
-from utils.string_utils import format_step, parse_action, format_last_attempt, format_reflections
+from utils.string_utils import format_step, parse_action, format_last_attempt, format_reflections, StepMode, split_thought_action
+from utils.judge import judge_answer
+from utils.usage import UsageTracker, llm_phase, track_usage
+from utils.deadline import within_deadline
+from utils.prompt_builder import PromptLayout, cot_prompt_builder
 from rich import print, box
 from rich.console import Console
 from rich.table import Table
 from pydantic import BaseModel
 from typing import List, Tuple, Callable, Awaitable
+import asyncio
 
 
 class CoTAgentStrategy(Enum):
@@ -34,6 +36,10 @@ class CotAgentState(BaseModel):
     max_step: int = 10
     is_correct: bool | None = None
     strategy: CoTAgentStrategy = CoTAgentStrategy.COT_ONLY
+    usage: dict = {}                  # LLM 调用的 token、耗时和费用（按 phase 分组,含每次调用明细）
+    prompt_layout: PromptLayout = PromptLayout.CLASSIC  # PREFIX_STABLE: 上下文和问题放在反思之前,提高 KV 前缀缓存命中
+    step_mode: StepMode = StepMode.SEPARATE             # FUSED: 一次补全同时生成 Thought 和 Action
+    timed_out: bool = False           # 超过截止时间被取消,只包含到期前完成的尝试
 
 async def run_cot_agent(
     question: str,
@@ -44,6 +50,9 @@ async def run_cot_agent(
     reflect_llm: Callable[[str], Awaitable[str]],
     judge_llm: Callable[[str], Awaitable[str]],
     max_step: int = 10,
+    prompt_layout: PromptLayout = PromptLayout.CLASSIC,
+    step_mode: StepMode = StepMode.SEPARATE,
+    deadline: float | None = None,  # 截止时间（事件循环时间）,到期时取消进行中的调用并返回部分状态
 ) -> CotAgentState:
     print(f"🚀 开始运行 CoT Agent - 策略: {strategy.value}")
     print(f"❓ 问题: {question}")
@@ -54,41 +63,141 @@ async def run_cot_agent(
         context=context,
         key=key,
         max_step=max_step,
-        strategy=strategy
+        strategy=strategy,
+        prompt_layout=prompt_layout,
+        step_mode=step_mode,
     )
 
-    if strategy == CoTAgentStrategy.COT_ONLY or strategy == CoTAgentStrategy.COT_GT:
-        print("📝 单次推理模式")
-        state = await step_cot_agent(state, action_llm, reflect_llm, judge_llm)
-        return state
-
-    print("🔄 多轮推理模式")
-    while not state.finished and state.step_n < max_step:
-        state = await step_cot_agent(state, action_llm, reflect_llm, judge_llm)
-        print("检查状态", state.is_correct)
-
-        # 如果答案正确，直接结束
-        if state.is_correct:
-            state.finished = True
-            break
-
-        # EPM 策略的特殊处理
-        if not state.is_correct and state.answer:
-            if strategy in [CoTAgentStrategy.COT_GT_EPM, CoTAgentStrategy.COT_GT_EPM_REFLEXION]:
-                print("🔄 错误记忆模式：重置状态并保留错误记忆")
-                # 重置状态，保留错误记忆
-                state.scratchpad = ""
-                state.finished = False
-                state.answer = ""
-                state.is_correct = None
-            elif strategy == CoTAgentStrategy.COT_REFLEXION:
-                print("🔄 纯反思模式：重置状态")
-                # 重置状态
-                state.scratchpad = ""
-                state.finished = False
-                state.answer = ""
-                state.is_correct = None
+    # 📊 收集本题所有 LLM 调用的用量
+    with track_usage() as usage_tracker:
+        state = await run_cot_trials(state, action_llm, reflect_llm, judge_llm, deadline=deadline)
+    state.usage = usage_tracker.summary()
+    return state
+
+async def run_cot_sweep(
+    question: str,
+    key: str,
+    strategies: list[CoTAgentStrategy],
+    context: str | None,
+    action_llm: Callable[[str], Awaitable[str]],
+    reflect_llm: Callable[[str], Awaitable[str]],
+    judge_llm: Callable[[str], Awaitable[str]],
+    max_step: int = 10,
+    prompt_layout: PromptLayout = PromptLayout.CLASSIC,
+    step_mode: StepMode = StepMode.SEPARATE,
+    deadline: float | None = None,
+) -> dict[CoTAgentStrategy, CotAgentState]:
+    """
+    在同一道题上运行多种策略,共享第一次尝试
+
+    第一次尝试的 prompt 只取决于是否使用 context（此时还没有反思和错误总结）,
+    因此按是否使用 context 分组,每组的第一次 思考-行动-观察 只运行一次,之后各策略从副本继续。
+    每个策略的 usage 包含共享部分的调用（与单独运行时可比）,其中 shared_calls 条由同组的 shared_by 个策略共享。
+    共享部分和所有分支使用同一个截止时间,共享的第一次尝试就已经到期时各策略都返回空的超时状态。
+    """
+    groups: dict[bool, list[CoTAgentStrategy]] = {}
+    for strategy in strategies:
+        groups.setdefault(uses_context(strategy), []).append(strategy)
+
+    async def run_group(group: list[CoTAgentStrategy]) -> list[CotAgentState]:
+        def new_state(strategy: CoTAgentStrategy) -> CotAgentState:
+            return CotAgentState(
+                question=question,
+                context=context,
+                key=key,
+                max_step=max_step,
+                strategy=strategy,
+                prompt_layout=prompt_layout,
+                step_mode=step_mode,
+            )
+
+        # 🌳 共享的第一次尝试
+        shared: CotAgentState | None = None
+        with track_usage() as shared_usage:
+            async with within_deadline(deadline) as scope:
+                shared = await attempt_cot_agent(new_state(group[0]), action_llm, judge_llm)
+
+        async def branch(strategy: CoTAgentStrategy) -> CotAgentState:
+            # 🍴 各策略从共享尝试的副本继续
+            with track_usage() as branch_usage:
+                if scope.expired:
+                    state = new_state(strategy).model_copy(update={"timed_out": True, "finished": True})
+                else:
+                    state = await run_cot_trials(new_state(strategy), action_llm, reflect_llm, judge_llm, first_attempt=shared, deadline=deadline)
+            combined = UsageTracker()
+            combined.calls = shared_usage.calls + branch_usage.calls
+            state.usage = {**combined.summary(), "shared_calls": len(shared_usage.calls), "shared_by": len(group)}
+            return state
+
+        return await asyncio.gather(*(branch(strategy) for strategy in group))
+
+    results: dict[CoTAgentStrategy, CotAgentState] = {}
+    for group, states in zip(groups.values(), await asyncio.gather(*(run_group(g) for g in groups.values()))):
+        results.update(zip(group, states))
+    return {strategy: results[strategy] for strategy in strategies}
+
+async def run_cot_trials(
+    state: CotAgentState,
+    action_llm: Callable[[str], Awaitable[str]],
+    reflect_llm: Callable[[str], Awaitable[str]],
+    judge_llm: Callable[[str], Awaitable[str]],
+    first_attempt: CotAgentState | None = None,
+    deadline: float | None = None,
+) -> CotAgentState:
+    """
+    运行所有轮次
+
+    first_attempt: 已经完成 思考-行动-观察 的第一次尝试（扫描模式中多个策略共享）,
+    传入时第一步只执行本策略自己的部分（错误总结 / 反思）。
+    deadline: 到期时进行中的尝试被取消,返回最后一次完成的尝试的状态并标记 timed_out。
+    """
+    strategy = state.strategy
+    max_step = state.max_step
+
+    async def next_step(state: CotAgentState) -> CotAgentState:
+        nonlocal first_attempt
+        if first_attempt is not None:
+            attempt, first_attempt = first_attempt.model_copy(deep=True, update={"strategy": strategy}), None
+            return await settle_cot_step(attempt, reflect_llm)
+        return await step_cot_agent(state, action_llm, reflect_llm, judge_llm)
 
+    async with within_deadline(deadline) as scope:
+        if strategy == CoTAgentStrategy.COT_ONLY or strategy == CoTAgentStrategy.COT_GT:
+            print("📝 单次推理模式")
+            state = await next_step(state)
+        else:
+            print("🔄 多轮推理模式")
+            while not state.finished and state.step_n < max_step:
+                state = await next_step(state)
+                print("检查状态", state.is_correct)
+
+                # 如果答案正确，直接结束
+                if state.is_correct:
+                    state.finished = True
+                    break
+
+                # EPM 策略的特殊处理
+                if not state.is_correct and state.answer:
+                    if strategy in [CoTAgentStrategy.COT_GT_EPM, CoTAgentStrategy.COT_GT_EPM_REFLEXION]:
+                        print("🔄 错误记忆模式：重置状态并保留错误记忆")
+                        # 重置状态，保留错误记忆
+                        state.scratchpad = ""
+                        state.finished = False
+                        state.answer = ""
+                        state.is_correct = None
+                    elif strategy == CoTAgentStrategy.COT_REFLEXION:
+                        print("🔄 纯反思模式：重置状态")
+                        # 重置状态
+                        state.scratchpad = ""
+                        state.finished = False
+                        state.answer = ""
+                        state.is_correct = None
+
+    # ⏰ 到期时进行中的尝试已被取消,保留最后一次完成的尝试
+    if scope.expired:
+        print("⏰ 超过截止时间,返回已完成的尝试")
+        state.timed_out = True
+        state.finished = True
     return state
 
 async def step_cot_agent(
@@ -97,25 +206,44 @@ async def step_cot_agent(
     reflect_llm: Callable[[str], Awaitable[str]],
     judge_llm: Callable[[str], Awaitable[str]],
 ) -> CotAgentState:
+    new_state = await attempt_cot_agent(state, action_llm, judge_llm)
+    return await settle_cot_step(new_state, reflect_llm)
+
+async def attempt_cot_agent(
+    state: CotAgentState,
+    action_llm: Callable[[str], Awaitable[str]],
+    judge_llm: Callable[[str], Awaitable[str]],
+) -> CotAgentState:
+    """一次 思考-行动-观察; 只依赖 prompt 的内容,不依赖策略的后续处理"""
     new_state = state.model_copy()
     new_state.step_n += 1
 
-    print("🤔 思考中...")
-    thought = await think(new_state, action_llm)
+    if state.step_mode == StepMode.FUSED:
+        print("🤔 思考并执行动作...")
+        action = await think_and_act(new_state, action_llm)
+    else:
+        print("🤔 思考中...")
+        thought = await think(new_state, action_llm)
 
-    print("🎯 执行动作...")
-    action = await act(new_state, action_llm)
+        print("🎯 执行动作...")
+        action = await act(new_state, action_llm)
 
     print("👀 观察结果...")
     observation = await observe(new_state, action, judge_llm)
+    return new_state
 
+async def settle_cot_step(
+    new_state: CotAgentState,
+    reflect_llm: Callable[[str], Awaitable[str]],
+) -> CotAgentState:
+    """按策略处理一次尝试的结果: 答错时记录错误 / 反思,并判断是否结束"""
     # 处理错误情况
     if not new_state.is_correct and new_state.answer:
-        if state.strategy in [CoTAgentStrategy.COT_GT_EPM]:
+        if new_state.strategy in [CoTAgentStrategy.COT_GT_EPM]:
             # EPM 策略：只记录错误，不反思
             print("🔄 错误记忆模式...")
             new_state = await reflect(new_state, reflect_llm)
-        elif state.strategy in [CoTAgentStrategy.COT_REFLEXION, CoTAgentStrategy.COT_GT_REFLEXION, CoTAgentStrategy.COT_GT_EPM_REFLEXION]:
+        elif new_state.strategy in [CoTAgentStrategy.COT_REFLEXION, CoTAgentStrategy.COT_GT_REFLEXION, CoTAgentStrategy.COT_GT_EPM_REFLEXION]:
             # Reflection 策略：进行反思
             print("🔄 开始反思...")
             new_state = await reflect(new_state, reflect_llm)
@@ -133,7 +261,8 @@ async def think(
 ) -> str:
     state.scratchpad += "\nThought:"
     prompt = build_agent_prompt(state)
-    thought = await llm(prompt)
+    with llm_phase("think", trial=state.step_n, step=state.step_n):
+        thought = await llm(prompt)
     state.scratchpad += " " + format_step(thought)
     print(f"💭 思考结果: {thought}")
     return thought
@@ -144,11 +273,33 @@ async def act(
 ) -> str:
     state.scratchpad += "\nAction:"
     prompt = build_agent_prompt(state)
-    action = await llm(prompt)
+    with llm_phase("act", trial=state.step_n, step=state.step_n):
+        action = await llm(prompt)
     state.scratchpad += " " + format_step(action)
     print(f"🎯 执行动作: {action}")
     return action
 
+async def think_and_act(
+    state: CotAgentState,
+    llm: Callable[[str], Awaitable[str]]
+) -> str:
+    # 融合模式: 一次补全同时生成 Thought 和 Action,解析失败时只重试 Action
+    state.scratchpad += "\nThought:"
+    prompt = build_agent_prompt(state)
+    with llm_phase("think-act", trial=state.step_n, step=state.step_n):
+        completion = await llm(prompt)
+    thought, action = split_thought_action(completion)
+    state.scratchpad += " " + thought
+    print(f"💭 思考结果: {thought}")
+
+    if action is None:
+        print(f"🔁 融合输出中没有合法的 Action,单独重试: {completion}")
+        return await act(state, llm)
+
+    state.scratchpad += "\nAction: " + action
+    print(f"🎯 执行动作: {action}")
+    return action
+
 async def observe(
     state: CotAgentState,
     action: str,
@@ -159,7 +310,8 @@ async def observe(
 
     if action_type == "Finish":
         state.answer = argument or ""
-        state.is_correct = await check_answer(state.question, state.answer, state.key, judge_llm)
+        with llm_phase("judge", trial=state.step_n, step=state.step_n):
+            state.is_correct = await check_answer(state.question, state.answer, state.key, judge_llm)
         observation = "Answer is " + ("CORRECT" if state.is_correct else "INCORRECT")
         state.scratchpad += " " + observation
         print(f"📝 回答: {state.answer}")
@@ -183,7 +335,8 @@ async def reflect(
         尝试：{state.scratchpad}
         标准答案：{state.key}
         请总结错误的关键点。"""
-        state.error_summary = await reflect_llm(error_summary_prompt)
+        with llm_phase("error-summary", trial=state.step_n, step=state.step_n):
+            state.error_summary = await reflect_llm(error_summary_prompt)
         print(f"🔍 错误总结: {state.error_summary}")
 
         # 如果是纯 EPM 策略，将错误总结添加到 reflections_str
@@ -195,7 +348,8 @@ async def reflect(
         # 反思逻辑
         state.reflections_str = format_last_attempt(state.question, state.scratchpad)
         prompt = build_reflect_prompt(state)
-        reflection = await reflect_llm(prompt)
+        with llm_phase("reflect", trial=state.step_n, step=state.step_n):
+            reflection = await reflect_llm(prompt)
         state.reflections = [format_step(reflection)]
         state.reflections_str = "\n" + format_reflections(state.reflections)
         print(f"🤔 反思结果: {reflection}")
@@ -210,18 +364,21 @@ async def check_answer(
     llm: Callable[[str], Awaitable[str]]
 ) -> bool:
     print("🔍 检查答案...")
-    judge_prompt = f"""对于给定问题，判断给定的回答是否与标准答案相同。一些问题的答案取决于具体的上下文，但是你并不了解上下文，因此你应该仅仅依据给定的标准答案来判断。你应该返回True或False。\n问题： {question}\n回答： {answer}\n标准答案： {key}"""
-    judge_result = await llm(judge_prompt)
-    result = "true" in judge_result.lower()
+    # ⚖️ 分层判题: 明显情况本地判定,其次查 verdict 缓存,只有不确定的情况才调用 judge LLM
+    result = await judge_answer(question, answer, key, llm)
     print(f"✨ 判断结果: {result}")
     return result
 
+def uses_context(strategy: CoTAgentStrategy) -> bool:
+    return strategy not in [CoTAgentStrategy.COT_ONLY, CoTAgentStrategy.COT_REFLEXION]
+
 def build_agent_prompt(state: CotAgentState) -> str:
     # 确定是否使用 context
-    use_context = state.strategy not in [CoTAgentStrategy.COT_ONLY, CoTAgentStrategy.COT_REFLEXION]
-    context = state.context if use_context else "<EMPTY>"
+    context = state.context if uses_context(state.strategy) else "<EMPTY>"
 
     # 对于 EPM 策略，reflections_str 已经包含了错误总结，不需要额外添加
+    if state.prompt_layout == PromptLayout.PREFIX_STABLE:
+        return cot_prompt_builder(COT).build(state.scratchpad, state.reflections_str, context=context or "", question=state.question)
     return cot_reflect_agent_prompt.format(
         examples=COT,
         context=context,
@@ -231,10 +388,9 @@ def build_agent_prompt(state: CotAgentState) -> str:
     )
 
 def build_reflect_prompt(state: CotAgentState) -> str:
-    use_context = state.strategy not in [CoTAgentStrategy.COT_ONLY, CoTAgentStrategy.COT_REFLEXION]
     return cot_reflect_instruction.format(
         examples=COT_REFLECT,
-        context=state.context if use_context else "<EMPTY>",
+        context=state.context if uses_context(state.strategy) else "<EMPTY>",
         question=state.question,
         scratchpad=state.scratchpad,
         reflections=state.reflections_str
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+from typing import TYPE_CHECKING, Any
+
+from agents.offline_docstore import normalize_title
+from utils.kv_store import SqliteKVStore
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+DEFAULT_DOCSTORE_CACHE_PATH = "cache/docstore_cache.sqlite"
+MISS_PREFIX = "Could not find ["
+# 缓存键格式的版本: 早期版本按 casefold 后的标题作键,大小写不同的维基百科页面会共用一条缓存
+CACHE_KEY_VERSION = 2
+
+
+def wikipedia_title(term: str) -> str:
+    """维基百科标题只有首字母不区分大小写（"Red Hat" 与 "Red hat" 是不同页面）,下划线等同于空格"""
+    title = " ".join(term.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+class DocstoreCache:
+    """
+    docstore 搜索结果的两级缓存
+
+    - 内存 LRU: 同一进程内的重复搜索（同一道题的多轮 trial、热门实体）直接命中
+    - SQLite: WAL 模式,多个 worker 进程和多次运行之间共享
+
+    缓存三类结果: 页面正文、未命中时的相似标题列表,以及其他未命中结果（负缓存,有过期时间）。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DOCSTORE_CACHE_PATH,
+        max_memory_entries: int = 4096,
+        max_bytes: int = 1024 * 1024 * 1024,
+        negative_ttl: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self._memory: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._store: SqliteKVStore | None = None
+        # docstore 动作在线程池中执行,内存层需要加锁
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    @property
+    def store(self) -> SqliteKVStore:
+        # 第一次读写时才打开数据库文件
+        if self._store is None:
+            self._store = SqliteKVStore(self.path, max_bytes=self.max_bytes, table="docstore_search")
+        return self._store
+
+    @staticmethod
+    def make_key(namespace: str, term: str) -> str:
+        # 离线 docstore 的标题索引本身不区分大小写,其余（维基百科）按精确标题作键
+        title = normalize_title(term) if namespace == "offline" else wikipedia_title(term)
+        return f"{namespace}:v{CACHE_KEY_VERSION}:{title}"
+
+    def _remember(self, key: str, entry: dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return entry["kind"] != "page" and time.time() - entry.get("cached_at", 0) > self.negative_ttl
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        value = self.store.get(key)
+        if value is not None:
+            entry = json.loads(value)
+            if not self._expired(entry):
+                self._remember(key, entry)
+                self.store_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: dict[str, Any]) -> None:
+        entry = {**entry, "cached_at": time.time()}
+        self._remember(key, entry)
+        self.store.set(key, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.memory_hits + self.store_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.store_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "store_entries": len(self.store),
+        }
+
+
+class CachedDocstore:
+    """
+    在任意 docstore 外面加一层搜索结果缓存
+
+    只缓存 search 的结果,lookup 的游标状态仍然保存在每个 agent 自己的 DocstoreExplorer 中。
+    搜索抛出的异常（网络错误等）不缓存。
+    """
+
+    def __init__(self, docstore: Any, cache: DocstoreCache, namespace: str):
+        self.docstore = docstore
+        self.cache = cache
+        self.namespace = namespace
+
+    def search(self, search: str) -> "str | Document":
+        from langchain_core.documents import Document
+
+        key = DocstoreCache.make_key(self.namespace, search)
+        entry = self.cache.get(key)
+        if entry is None:
+            result = self.docstore.search(search)
+            if isinstance(result, Document):
+                entry = {"kind": "page", "content": result.page_content, "metadata": result.metadata}
+            elif result.startswith(MISS_PREFIX) and "]. Similar: " in result:
+                # 相似标题列表与搜索词的大小写写法无关,取出时按本次的搜索词重新拼接
+                entry = {"kind": "similar", "similar": result.split("]. Similar: ", 1)[1]}
+            else:
+                entry = {"kind": "miss", "message": result}
+            self.cache.put(key, entry)
+
+        if entry["kind"] == "page":
+            return Document(page_content=entry["content"], metadata=entry.get("metadata") or {})
+        if entry["kind"] == "similar":
+            return f"{MISS_PREFIX}{search}]. Similar: {entry['similar']}"
+        return entry["message"]
+
+
+@cache
+def get_docstore_cache(path: str = DEFAULT_DOCSTORE_CACHE_PATH) -> DocstoreCache:
+    """同一进程内所有 agent 共享一个缓存实例"""
+    return DocstoreCache(path)
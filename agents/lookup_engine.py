@@ -0,0 +1,137 @@
+"""
+Lookup 引擎: 页面只分句、归一化一次,所有句子一次批量打分
+
+- 分句结果按页面内容缓存（LRU）,同一页面的多次 Lookup、多个 agent 之间共享
+- 打分用 rapidfuzz 的 process.cdist,所有句子在一次 C 调用里完成,不再逐句循环
+- LookupExplorer 保持 "下一个匹配" 的游标语义: 同一个关键词连续 Lookup 依次返回后续匹配
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain.agents.react.base import DocstoreExplorer
+
+# 句末标点后的空白; 用 finditer 一次扫描切分（比带后行断言的 re.split 快一倍）
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"[.!?]\s+")
+
+
+@dataclass(frozen=True)
+class SegmentedPage:
+    sentences: tuple[str, ...]
+    normalized: tuple[str, ...]     # 小写后的句子,用于匹配
+
+
+@lru_cache(maxsize=1024)
+def segment_page(document: str) -> SegmentedPage:
+    """分句并归一化（按页面内容缓存）,切分结果与原来的 re.split(r'(?<=[.!?])\s+', document) 相同"""
+    sentences: list[str] = []
+    start = 0
+    for m in SENTENCE_BOUNDARY_PATTERN.finditer(document):
+        # 句末标点保留在句子里,之后的空白丢弃; 没有句末标点的换行不是句子边界
+        sentences.append(document[start:m.start() + 1])
+        start = m.end()
+    sentences.append(document[start:])
+    return SegmentedPage(tuple(sentences), tuple(s.lower() for s in sentences))
+
+
+def score_sentences(page: SegmentedPage, term: str, score_cutoff: int = 0) -> np.ndarray:
+    """
+    关键词与每个句子的 partial_ratio 分数（0~100）,一次批量计算; 低于 score_cutoff 的记为 0
+
+    分数保留小数（float32）: 取整会让相差不到 1 分的句子打平,最佳句子的选择就和逐句打分不同了
+    """
+    from rapidfuzz import fuzz, process
+
+    if not page.normalized:
+        return np.zeros(0, dtype=np.float32)
+    return process.cdist([term.lower()], page.normalized, scorer=fuzz.partial_ratio, dtype=np.float32, score_cutoff=score_cutoff)[0]
+
+
+def find_matches(page: SegmentedPage, term: str, score_threshold: int = 60) -> list[int]:
+    """
+    查找匹配的句子
+
+    返回:
+        list[int]: 按文档顺序排列的句子下标; 包含关键词原文的句子总是匹配,其余按模糊分数过滤
+    """
+    term_lower = term.lower()
+    scores = score_sentences(page, term, score_threshold)
+    exact = np.fromiter((term_lower in s for s in page.normalized), dtype=bool, count=len(page.normalized))
+    return np.flatnonzero(exact | (scores >= score_threshold)).tolist()
+
+
+def context_window(page: SegmentedPage, index: int, before: int = 2, after: int = 2, max_length: int = 400) -> str:
+    """取匹配句子前后若干句作为上下文,超长时在句子边界处截断"""
+    start = max(0, index - before)
+    context = " ".join(page.sentences[start:index + after + 1])
+    if len(context) <= max_length:
+        return context
+    last_sentence_end = max(context.rfind(".", 0, max_length), context.rfind("!", 0, max_length), context.rfind("?", 0, max_length))
+    if last_sentence_end != -1:
+        return context[:last_sentence_end + 1]
+    return context[:max_length] + "..."
+
+
+class LookupExplorer:
+    """
+    包装 DocstoreExplorer,Lookup 改为句子级的模糊匹配
+
+    与 prompt 中的描述一致: Lookup[keyword] 返回上一次成功 Search 的页面中下一个包含关键词的句子。
+    Search 以及其他属性全部交给被包装的 explorer。
+    """
+
+    def __init__(self, explorer: "DocstoreExplorer", score_threshold: int = 60):
+        self.explorer = explorer
+        self.score_threshold = score_threshold
+        self.lookup_str = ""
+        self.lookup_index = 0
+        self._matches: list[int] = []
+
+    @property
+    def docstore(self) -> Any:
+        return self.explorer.docstore
+
+    @docstore.setter
+    def docstore(self, docstore: Any) -> None:
+        self.explorer.docstore = docstore
+
+    @property
+    def document(self) -> Any:
+        return self.explorer.document
+
+    def __copy__(self) -> "LookupExplorer":
+        forked = LookupExplorer(self.explorer, self.score_threshold)
+        forked.lookup_str = self.lookup_str
+        forked.lookup_index = self.lookup_index
+        forked._matches = list(self._matches)
+        return forked
+
+    def search(self, term: str) -> str:
+        result = self.explorer.search(term)
+        self.lookup_str = ""
+        self.lookup_index = 0
+        self._matches = []
+        return result
+
+    def lookup(self, term: str) -> str:
+        if self.explorer.document is None:
+            raise ValueError("Cannot lookup without a successful search first")
+
+        page = segment_page(self.explorer.document.page_content)
+        if term.lower() != self.lookup_str:
+            # 新关键词: 匹配结果只算一次,之后的 Lookup 只移动游标
+            self.lookup_str = term.lower()
+            self.lookup_index = 0
+            self._matches = find_matches(page, term, self.score_threshold)
+        else:
+            self.lookup_index += 1
+
+        if not self._matches:
+            return "No Results"
+        if self.lookup_index >= len(self._matches):
+            return "No More Results"
+        return f"(Result {self.lookup_index + 1}/{len(self._matches)}) {page.sentences[self._matches[self.lookup_index]].strip()}"
@@ -0,0 +1,227 @@
+"""
+离线 docstore: 把 HotpotQA distractor 的 context 编译成内存映射的 标题→段落 文件
+
+目录结构:
+    pages.bin   所有页面依次拼接（UTF-8 标题 + 正文,不含分隔符）
+    index.bin   开放寻址哈希表,每个槽位记录 (标题哈希, 偏移, 标题长度, 正文长度)
+    meta.json   格式版本、页面数、哈希表容量和数据来源（最后写入,作为构建完成的标志）
+
+两个文件都以只读 mmap 打开,多个 worker 进程共享操作系统的页缓存,不需要各自复制一份。
+search 遵循 langchain Docstore 的约定: 命中返回 Document,未命中返回 "Could not find [x]. Similar: [...]",
+可以直接交给 DocstoreExplorer 使用。
+"""
+import hashlib
+import json
+import mmap
+import os
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+import numpy as np
+
+from utils.dataset import HOTPOT_SAMPLE_FILE
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from langchain_core.documents import Document
+
+DOCSTORE_FORMAT_VERSION = 1
+DEFAULT_OFFLINE_DOCSTORE_DIR = "cache/offline_docstore"
+
+SLOT_DTYPE = np.dtype([("hash", "<u8"), ("offset", "<u8"), ("title_len", "<u4"), ("content_len", "<u4")])
+
+
+def normalize_title(title: str) -> str:
+    """维基百科标题不区分大小写,下划线等同于空格"""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+def title_hash(title: str) -> int:
+    # 0 表示空槽位,哈希值为 0 时改为 1
+    digest = hashlib.blake2b(normalize_title(title).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def iter_hotpot_pages(hotpot: "pd.DataFrame") -> Iterator[tuple[str, str]]:
+    """从数据集的 context 列中依次产出 (标题, 段落),段落的拼接方式与 supporting_paragraphs 一致"""
+    for context in hotpot["context"]:
+        for title, sentences in zip(context["title"], context["sentences"]):
+            yield str(title), "".join(sentences)
+
+
+def build_offline_docstore(pages: Iterable[tuple[str, str]], directory: str = DEFAULT_OFFLINE_DOCSTORE_DIR, source: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    编译离线 docstore
+
+    参数:
+        pages: (标题, 段落) 序列,同一标题（归一化后）只保留第一次出现的段落
+        directory: 输出目录
+        source: 数据来源信息,写入 meta.json 用于判断是否需要重新编译
+
+    返回:
+        dict: meta.json 的内容
+    """
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再原子替换,其他进程不会读到写了一半的文件
+    suffix = f".tmp{os.getpid()}"
+
+    entries: list[tuple[int, int, int, int]] = []
+    seen: set[str] = set()
+    offset = 0
+    with open(out / f"pages.bin{suffix}", "wb") as f:
+        for title, content in pages:
+            key = normalize_title(title)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            title_bytes, content_bytes = title.encode("utf-8"), content.encode("utf-8")
+            f.write(title_bytes)
+            f.write(content_bytes)
+            entries.append((title_hash(title), offset, len(title_bytes), len(content_bytes)))
+            offset += len(title_bytes) + len(content_bytes)
+
+    # 装载因子不超过 0.5,线性探测平均 1~2 次即可命中
+    capacity = 1 << max(4, (2 * len(entries) - 1).bit_length())
+    mask = capacity - 1
+    slots = np.zeros(capacity, dtype=SLOT_DTYPE)
+    for entry in entries:
+        i = entry[0] & mask
+        while slots[i]["hash"]:
+            i = (i + 1) & mask
+        slots[i] = entry
+    slots.tofile(out / f"index.bin{suffix}")
+
+    meta = {
+        "version": DOCSTORE_FORMAT_VERSION,
+        "pages": len(entries),
+        "capacity": capacity,
+        "bytes": offset,
+        "source": source or {},
+    }
+    with open(out / f"meta.json{suffix}", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    os.replace(out / f"pages.bin{suffix}", out / "pages.bin")
+    os.replace(out / f"index.bin{suffix}", out / "index.bin")
+    os.replace(out / f"meta.json{suffix}", out / "meta.json")
+    return meta
+
+
+class OfflineDocstore:
+    """只读的离线 docstore,标题查找 O(1)"""
+
+    def __init__(self, directory: str = DEFAULT_OFFLINE_DOCSTORE_DIR):
+        path = Path(directory)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            self.meta: dict[str, Any] = json.load(f)
+        if self.meta.get("version") != DOCSTORE_FORMAT_VERSION:
+            raise ValueError(f"离线 docstore 格式版本不匹配: {self.meta.get('version')} != {DOCSTORE_FORMAT_VERSION}")
+
+        with open(path / "pages.bin", "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._pages: mmap.mmap | bytes = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._slots = np.memmap(path / "index.bin", dtype=SLOT_DTYPE, mode="r")
+        self._mask = len(self._slots) - 1
+        self._titles: list[str] | None = None
+
+    def __len__(self) -> int:
+        return self.meta["pages"]
+
+    def _read(self, slot: Any) -> tuple[str, str]:
+        start = int(slot["offset"])
+        title_end = start + int(slot["title_len"])
+        content_end = title_end + int(slot["content_len"])
+        return self._pages[start:title_end].decode("utf-8"), self._pages[title_end:content_end].decode("utf-8")
+
+    def get(self, title: str) -> tuple[str, str] | None:
+        """
+        按标题查找页面
+
+        返回:
+            (标题, 段落): 标题为收录时的原始写法; 未收录时返回 None
+        """
+        h = title_hash(title)
+        key = normalize_title(title)
+        i = h & self._mask
+        while True:
+            slot = self._slots[i]
+            slot_hash = int(slot["hash"])
+            if slot_hash == 0:
+                return None
+            if slot_hash == h:
+                page_title, content = self._read(slot)
+                if normalize_title(page_title) == key:
+                    return page_title, content
+            i = (i + 1) & self._mask
+
+    def _used_slots(self) -> np.ndarray:
+        used = np.asarray(self._slots[self._slots["hash"] != 0])
+        return used[np.argsort(used["offset"])]
+
+    def pages(self) -> Iterator[tuple[str, str]]:
+        """按写入顺序遍历所有 (标题, 段落)"""
+        for slot in self._used_slots():
+            yield self._read(slot)
+
+    def titles(self) -> list[str]:
+        """所有收录的标题（按写入顺序,首次调用时从文件中读取）"""
+        if self._titles is None:
+            self._titles = [self._read(slot)[0] for slot in self._used_slots()]
+        return self._titles
+
+    def similar(self, search: str, limit: int = 5) -> list[str]:
+        """模糊匹配最相近的标题,作为未命中时的 Similar 提示"""
+        from rapidfuzz import fuzz, process
+
+        return [title for title, _, _ in process.extract(search, self.titles(), scorer=fuzz.WRatio, limit=limit)]
+
+    def search(self, search: str) -> "str | Document":
+        from langchain_core.documents import Document
+
+        page = self.get(search)
+        if page is None:
+            return f"Could not find [{search}]. Similar: {self.similar(search)}"
+        title, content = page
+        return Document(page_content=content, metadata={"page": title})
+
+
+def _hotpot_source(data_path: str) -> dict[str, Any]:
+    stat = os.stat(data_path)
+    return {"path": str(data_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+@cache
+def open_offline_docstore(directory: str = DEFAULT_OFFLINE_DOCSTORE_DIR, data_path: str = HOTPOT_SAMPLE_FILE) -> OfflineDocstore:
+    """
+    打开离线 docstore（同一进程内共享一个实例）
+
+    目录中没有编译结果,或者数据集文件发生变化时,先从数据集的 context 重新编译。
+    """
+    meta_path = Path(directory) / "meta.json"
+    source = _hotpot_source(data_path)
+    meta = None
+    if meta_path.exists():
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    if meta is None or meta.get("version") != DOCSTORE_FORMAT_VERSION or meta.get("source") != source:
+        import joblib
+
+        print(f"📚 编译离线 docstore: {data_path} -> {directory}")
+        build_offline_docstore(iter_hotpot_pages(joblib.load(data_path)), directory, source=source)
+    return OfflineDocstore(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="从 HotpotQA context 编译离线 docstore")
+    parser.add_argument("--data", default=HOTPOT_SAMPLE_FILE)
+    parser.add_argument("--out", default=DEFAULT_OFFLINE_DOCSTORE_DIR)
+    args = parser.parse_args()
+
+    import joblib
+
+    meta = build_offline_docstore(iter_hotpot_pages(joblib.load(args.data)), args.out, source=_hotpot_source(args.data))
+    print(f"✅ 共 {meta['pages']} 个页面, {meta['bytes'] / 1024:.1f} KB, 哈希表容量 {meta['capacity']}")
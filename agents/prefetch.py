@@ -0,0 +1,289 @@
+"""
+投机预取: LLM 还在思考时,在后台提前 Search 下一步很可能用到的页面
+
+候选来源:
+    - 问题中的实体（首字母大写的词组、引号中的内容）,题目开始时预取
+    - 最新 Thought 中首字母大写的词组,Thought 生成后、Action 生成前预取
+    - Search 未命中时返回的 Similar 列表
+
+预取结果写入 docstore 缓存（agents/docstore_cache.py）,真正的 Search 直接命中缓存;
+如果对应的预取还在进行中,Search 等待它完成,不会重复请求后端。
+
+预算:
+    - 预取使用独立的小线程池,不占用 Search/Lookup 的线程池（agents/action_runner.py）
+    - 每次最多预取 max_per_round 个候选,每道题最多 max_per_question 个
+    - 全局排队中的预取超过 max_pending 时直接丢弃新的候选
+新一轮候选到来时,上一轮还没开始执行的预取会被取消（投机已经过时）; 题目结束时取消全部。
+"""
+import ast
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Iterable
+
+from agents.docstore_cache import wikipedia_title
+from agents.offline_docstore import normalize_title
+
+if TYPE_CHECKING:
+    from langchain.agents.react.base import DocstoreExplorer
+
+# 首字母大写的词组,允许中间出现 of/the/and 等小写连接词,例如 "Kingdom of the Netherlands"
+ENTITY_PATTERN = re.compile(
+    r"[A-Z][\w'’.\-]*(?:\s+(?:(?:of|the|and|de|la|von|van|du|del|for|in)\s+)*[A-Z0-9][\w'’.\-]*)*"
+)
+QUOTED_PATTERN = re.compile(r"[\"“]([^\"”]{2,80})[\"”]")
+SIMILAR_PATTERN = re.compile(r"Similar: (\[.*\])\s*$", re.S)
+# 句首常见的大写词,单独出现时不是实体
+STOP_ENTITIES = {
+    "i", "a", "an", "the", "what", "which", "who", "whom", "whose", "when", "where", "why", "how",
+    "is", "are", "was", "were", "do", "does", "did", "in", "on", "at", "of", "for", "and", "or",
+    "it", "he", "she", "they", "this", "that", "these", "those", "so", "then", "now", "since", "but",
+    "thought", "action", "observation", "search", "lookup", "finish", "answer", "question",
+    "let", "maybe", "yes", "no", "both", "there",
+}
+
+
+def extract_entities(text: str, limit: int = 8) -> list[str]:
+    """按出现顺序提取可能的维基百科标题（去重）"""
+    candidates = QUOTED_PATTERN.findall(text) + [m.group(0).rstrip(".-'’") for m in ENTITY_PATTERN.finditer(text)]
+    entities: list[str] = []
+    seen: set[str] = set()
+    for candidate in candidates:
+        key = normalize_title(candidate)
+        if not key or key in STOP_ENTITIES or key in seen:
+            continue
+        seen.add(key)
+        entities.append(candidate.strip())
+        if len(entities) >= limit:
+            break
+    return entities
+
+
+def parse_similar(observation: str) -> list[str]:
+    """从 "Could not find [x]. Similar: [...]" 中取出相似标题列表"""
+    match = SIMILAR_PATTERN.search(observation)
+    if match is None:
+        return []
+    try:
+        titles = ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        return []
+    return [str(t) for t in titles if isinstance(t, str)]
+
+
+class PrefetchStats:
+    """预取的统计（所有 agent 共享）"""
+
+    def __init__(self):
+        self.scheduled = 0      # 提交到线程池的预取
+        self.dropped = 0        # 超出预算被丢弃的候选
+        self.cancelled = 0      # 还没开始执行就被取消的预取
+        self.errors = 0
+        self.searches = 0       # 真正的 Search 次数
+        self.hits = 0           # Search 的页面已经预取完成
+        self.inflight_hits = 0  # Search 时预取还在进行,等待它完成
+        self._lock = threading.Lock()
+
+    def add(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def stats(self) -> dict[str, Any]:
+        completed = self.scheduled - self.cancelled
+        useful = self.hits + self.inflight_hits
+        return {
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "searches": self.searches,
+            "hits": self.hits,
+            "inflight_hits": self.inflight_hits,
+            # 真正的 Search 中有多少比例由预取提前完成或正在进行
+            "hit_rate": useful / self.searches if self.searches else 0.0,
+            # 实际执行的预取中有多少比例被用到（衡量对后端的额外压力）
+            "precision": useful / completed if completed else 0.0,
+        }
+
+
+prefetch_stats = PrefetchStats()
+_prefetch_executor: ThreadPoolExecutor | None = None
+_prefetch_max_workers = 4
+_prefetch_max_pending = 16
+_pending_count = 0
+_pending_lock = threading.Lock()
+
+
+def configure_prefetch(max_workers: int = 4, max_pending: int = 16) -> None:
+    """
+    设置预取线程池
+
+    参数:
+        max_workers: 同时进行的预取数量上限,控制对后端的额外压力
+        max_pending: 全局排队中的预取上限,超过时丢弃新的候选
+    """
+    global _prefetch_executor, _prefetch_max_workers, _prefetch_max_pending
+    if _prefetch_executor is not None:
+        _prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        _prefetch_executor = None
+    _prefetch_max_workers = max_workers
+    _prefetch_max_pending = max_pending
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=_prefetch_max_workers, thread_name_prefix="prefetch")
+    return _prefetch_executor
+
+
+class PrefetchingExplorer:
+    """
+    包装 DocstoreExplorer,支持在后台预取 Search 结果
+
+    预取直接调用底层 docstore 的 search（经过 docstore 缓存）,不会改变 explorer 的当前页面和 Lookup 游标。
+    底层没有缓存时预取的结果无处保存,因此只在在线后端 + 缓存的组合下启用（见 create_docstore）。
+    """
+
+    def __init__(self, explorer: "DocstoreExplorer", max_per_round: int = 3, max_per_question: int = 12, wait_timeout: float = 30.0):
+        self.explorer = explorer
+        self.max_per_round = max_per_round
+        self.max_per_question = max_per_question
+        self.wait_timeout = wait_timeout
+        self._futures: dict[str, Future] = {}
+        self._round: list[tuple[str, Future]] = []
+        self._searched: set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def docstore(self) -> Any:
+        return self.explorer.docstore
+
+    @docstore.setter
+    def docstore(self, docstore: Any) -> None:
+        self.explorer.docstore = docstore
+
+    @property
+    def document(self) -> Any:
+        return self.explorer.document
+
+    def __copy__(self) -> "PrefetchingExplorer":
+        # 分叉出来的 explorer 可以复用已经提交的预取,但各自记录自己的 Search
+        forked = PrefetchingExplorer(self.explorer, self.max_per_round, self.max_per_question, self.wait_timeout)
+        with self._lock:
+            forked._futures = dict(self._futures)
+            forked._searched = set(self._searched)
+        return forked
+
+    def adopt_fork(self, forked: "PrefetchingExplorer") -> None:
+        """
+        合并分叉副本的状态（见 agents/action_runner.py 的 adopt_docstore_state）
+
+        副本只会新增 Search 记录; 已提交的预取和本轮候选以 explorer 自己的为准,
+        否则写回后上一轮的预取就无法再被取消。
+        """
+        with self._lock:
+            self._searched |= forked._searched
+
+    def prefetch(self, terms: Iterable[str]) -> int:
+        """
+        提交一轮预取（在事件循环中调用,不阻塞）
+
+        返回:
+            int: 本轮实际提交的预取数量
+        """
+        global _pending_count
+
+        terms = list(terms)
+        keys = {wikipedia_title(term) for term in terms}
+        with self._lock:
+            # ⏹️ 新一轮投机开始,上一轮还没执行、本轮也不再需要的预取已经过时
+            self._cancel([(key, future) for key, future in self._round if key not in keys])
+
+            submitted = 0
+            for term in terms:
+                key = wikipedia_title(term)
+                if not key or key in self._futures or key in self._searched:
+                    continue
+                if submitted >= self.max_per_round or len(self._futures) >= self.max_per_question:
+                    break
+                with _pending_lock:
+                    if _pending_count >= _prefetch_max_pending:
+                        prefetch_stats.add("dropped")
+                        continue
+                    _pending_count += 1
+                future = get_prefetch_executor().submit(self._fetch, term)
+                future.add_done_callback(_release_pending)
+                self._futures[key] = future
+                self._round.append((key, future))
+                submitted += 1
+            prefetch_stats.add("scheduled", submitted)
+            return submitted
+
+    def _fetch(self, term: str) -> None:
+        try:
+            self.explorer.docstore.search(term)
+        except Exception:
+            prefetch_stats.add("errors")
+            raise
+
+    def search(self, term: str) -> str:
+        key = wikipedia_title(term)
+        with self._lock:
+            self._searched.add(key)
+            future = self._futures.get(key)
+
+        prefetch_stats.add("searches")
+        if future is not None and not future.cancelled():
+            if future.done():
+                prefetch_stats.add("hits")
+            else:
+                # ⏳ 预取正在进行,等待它写入缓存,而不是再请求一次后端
+                prefetch_stats.add("inflight_hits")
+                try:
+                    future.result(timeout=self.wait_timeout)
+                except Exception:
+                    pass
+        return self.explorer.search(term)
+
+    def lookup(self, term: str) -> str:
+        return self.explorer.lookup(term)
+
+    def cancel(self) -> None:
+        """取消所有还没开始执行的预取（题目结束时调用）"""
+        with self._lock:
+            self._cancel(list(self._futures.items()))
+
+    def _cancel(self, futures: list[tuple[str, Future]]) -> None:
+        # 被取消的候选从记录中移除,之后仍然可以再次预取
+        for key, future in futures:
+            if future.cancel():
+                prefetch_stats.add("cancelled")
+                self._futures.pop(key, None)
+        self._round = []
+
+
+def _release_pending(_: Future) -> None:
+    global _pending_count
+    with _pending_lock:
+        _pending_count -= 1
+
+
+def prefetch_question(docstore: Any, question: str) -> None:
+    if isinstance(docstore, PrefetchingExplorer):
+        docstore.prefetch(extract_entities(question))
+
+
+def prefetch_thought(docstore: Any, thought: str) -> None:
+    if isinstance(docstore, PrefetchingExplorer):
+        docstore.prefetch(extract_entities(thought))
+
+
+def prefetch_similar(docstore: Any, observation: Any) -> None:
+    if isinstance(docstore, PrefetchingExplorer) and isinstance(observation, str):
+        docstore.prefetch(parse_similar(observation))
+
+
+def cancel_prefetch(docstore: Any) -> None:
+    if isinstance(docstore, PrefetchingExplorer):
+        docstore.cancel()
@@ -1,16 +1,18 @@
-from ast import Tuple
 from pydantic import BaseModel
-from langchain.chat_models.base import BaseChatModel
 import re
 # from agents.action_runner import search
 from utils.fewshots import WEBTHINK_SIMPLE3
 from rich import print
-from rapidfuzz import fuzz
-from typing import Awaitable, List, Tuple, Callable
-from langchain.agents.react.base import DocstoreExplorer
-# from langchain.docstore.base import Docstore
-from langchain_community.docstore.wikipedia import Wikipedia
-from agents.action_runner import create_wikipedia_docstore
+from typing import TYPE_CHECKING, Awaitable, List, Tuple, Callable
+from agents.action_runner import create_docstore, run_docstore_action
+from agents.lookup_engine import context_window, score_sentences, segment_page
+from agents.prefetch import cancel_prefetch, prefetch_question, prefetch_similar, prefetch_thought
+from utils.judge import judge_answer
+from utils.usage import llm_phase
+from utils.string_utils import StepMode, split_thought_action
+
+if TYPE_CHECKING:
+    from langchain.agents.react.base import DocstoreExplorer
 
 class ReactAgentState(BaseModel):
     question: str       # 问题
@@ -30,28 +32,36 @@ async def run_react_agent(
     key: str,
     llm: Callable[[str], Awaitable[str]],
     check_llm: Callable[[str], Awaitable[str]] | None = None,
-    agent_format_func: Callable[[ReactAgentState], str] = lambda x: format_agent(WEBTHINK_SIMPLE3, x.scratchpad, x.question)
+    agent_format_func: Callable[[ReactAgentState], str] = lambda x: format_agent(WEBTHINK_SIMPLE3, x.scratchpad, x.question),
+    step_mode: StepMode = StepMode.SEPARATE,
+    action_llm: Callable[[str], Awaitable[str]] | None = None,  # 生成 Action 的调用器（例如出现 Action 即停止的流式调用器）,默认与 llm 相同
 ) -> str:
     # 初始化状态
     state = ReactAgentState(question=question, key=key)
-    docstore = create_wikipedia_docstore()
+    docstore = create_docstore()
+    # 🔮 第一次思考期间预取问题中的实体
+    prefetch_question(docstore, question)
     print(f"[blue]📝 初始化状态: {state}[/blue]")
     while not state.finished:
         print("="*50)
         print(f"[blue]📝 进入循环[/blue]")
-        state = await step_react_agent(state, llm, check_llm or llm, docstore=docstore, agent_format_func=agent_format_func)
+        state = await step_react_agent(state, llm, check_llm or llm, docstore=docstore, agent_format_func=agent_format_func, step_mode=step_mode, action_llm=action_llm)
         print("="*50)
         # print(f"[blue]📝 完成一轮: {state}[/blue]")
         # break
+    cancel_prefetch(docstore)
     return state.answer
 
 async def step_react_agent(
     state: ReactAgentState,
     llm: Callable[[str], Awaitable[str]],
     check_llm: Callable[[str], Awaitable[str]],
-    docstore: DocstoreExplorer,
-    agent_format_func: Callable[[ReactAgentState], str]
+    docstore: "DocstoreExplorer",
+    agent_format_func: Callable[[ReactAgentState], str],
+    step_mode: StepMode = StepMode.SEPARATE,
+    action_llm: Callable[[str], Awaitable[str]] | None = None,
 ) -> ReactAgentState:
+    action_llm = action_llm or llm
     new_state = state.model_copy()
     new_state.step_n += 1
 
@@ -60,9 +70,14 @@ async def step_react_agent(
     try:
         # 🤔 执行思考-行动-观察循环
 
-        await think(new_state, llm=llm, agent_format_func=agent_format_func)
+        if step_mode == StepMode.FUSED:
+            action = await think_and_act(new_state, llm=action_llm, agent_format_func=agent_format_func)
+        else:
+            thought = await think(new_state, llm=llm, agent_format_func=agent_format_func)
+            # 🔮 生成 Action 期间预取 Thought 中提到的实体
+            prefetch_thought(docstore, thought)
 
-        action = await act(new_state, llm=llm, agent_format_func=agent_format_func)
+            action = await act(new_state, llm=action_llm, agent_format_func=agent_format_func)
 
         observation, is_finish = await observe(new_state, action, llm, check_answer, check_llm=check_llm, docstore=docstore)
 
@@ -74,7 +89,7 @@ async def step_react_agent(
         print(f"[red]📝 动作执行错误: {e}[/red]")
         state.error = str(e)
         state.step_n += 1
-        return await step_react_agent(state, llm, check_llm, docstore, agent_format_func)
+        return await step_react_agent(state, llm, check_llm, docstore, agent_format_func, step_mode, action_llm)
 
 # 🧠 新增的辅助函数
 async def think(state: ReactAgentState, llm: Callable[[str], Awaitable[str]], agent_format_func: Callable[[ReactAgentState], str] = lambda x: format_agent(WEBTHINK_SIMPLE3, x.scratchpad, x.question)) -> str:
@@ -82,7 +97,8 @@ async def think(state: ReactAgentState, llm: Callable[[str], Awaitable[str]], ag
     state.scratchpad += f"\nThought {state.step_n}:"
     prompt = agent_format_func(state)
     # print(f"[blue]📝 Thought 输入: [italic]{prompt}[/italic][/blue]")
-    thought = await llm(prompt +"\n(Note: Write down your thoughts in one line without Thought prefix.)")
+    with llm_phase("think", trial=getattr(state, "trials_count", None), step=state.step_n):
+        thought = await llm(prompt +"\n(Note: Write down your thoughts in one line without Thought prefix.)")
     print(f"[green]📝 Thought 输出: {thought}[/green]")
     state.scratchpad += thought
     return thought
@@ -92,12 +108,32 @@ async def act(state: ReactAgentState, llm: Callable[[str], Awaitable[str]], agen
     state.scratchpad += f"\nAction {state.step_n}:"
     prompt = agent_format_func(state)
     # print(f"[blue]📝 Action 输入: [italic]{prompt}[/italic][/blue]")
-    action = await llm(prompt)
+    with llm_phase("act", trial=getattr(state, "trials_count", None), step=state.step_n):
+        action = await llm(prompt)
     print(f"[green]📝 Action 输出: {action}[/green]")
     state.scratchpad += action
     return action
 
-async def observe(state: ReactAgentState, action: str , llm: Callable[[str], Awaitable[str]], check_func: Callable[[str, str, str, Callable[[str], Awaitable[str]]], Awaitable[bool]], check_llm: Callable[[str], Awaitable[str]], docstore: DocstoreExplorer) -> Tuple[str, bool]:
+async def think_and_act(state: ReactAgentState, llm: Callable[[str], Awaitable[str]], agent_format_func: Callable[[ReactAgentState], str] = lambda x: format_agent(WEBTHINK_SIMPLE3, x.scratchpad, x.question)) -> str:
+    """融合的思考-行动阶段：一次补全同时生成 Thought 和 Action,解析失败时只重试 Action"""
+    state.scratchpad += f"\nThought {state.step_n}:"
+    prompt = agent_format_func(state)
+    with llm_phase("think-act", trial=getattr(state, "trials_count", None), step=state.step_n):
+        completion = await llm(prompt + f"\n(Note: Write down your thoughts in one line without Thought prefix, then write \"Action {state.step_n}:\" followed by the action on the next line.)")
+    thought, action = split_thought_action(completion)
+    print(f"[green]📝 Thought 输出: {thought}[/green]")
+    state.scratchpad += " " + thought
+
+    if action is None:
+        # 🔁 没有解析出合法的动作,只单独重试 Action
+        print(f"[yellow]📝 融合输出中没有合法的 Action,单独重试: {completion}[/yellow]")
+        return await act(state, llm=llm, agent_format_func=agent_format_func)
+
+    print(f"[green]📝 Action 输出: {action}[/green]")
+    state.scratchpad += f"\nAction {state.step_n}: {action}"
+    return action
+
+async def observe(state: ReactAgentState, action: str , llm: Callable[[str], Awaitable[str]], check_func: Callable[[str, str, str, Callable[[str], Awaitable[str]]], Awaitable[bool]], check_llm: Callable[[str], Awaitable[str]], docstore: "DocstoreExplorer") -> Tuple[str, bool]:
     """观察阶段：执行行动并观察结果"""
 
     action_type, argument = parse_action(action)
@@ -108,7 +144,8 @@ async def observe(state: ReactAgentState, action: str , llm: Callable[[str], Awa
     # return observation, is_finish
 
     if is_finish:
-        is_correct = await check_func(state.question, observation, state.key, check_llm)
+        with llm_phase("judge", trial=getattr(state, "trials_count", None), step=state.step_n):
+            is_correct = await check_func(state.question, observation, state.key, check_llm)
 
         observation = f"Answer is {'CORRECT' if is_correct else 'INCORRECT'}."
         state.is_correct = is_correct
@@ -119,15 +156,13 @@ async def observe(state: ReactAgentState, action: str , llm: Callable[[str], Awa
     return observation, is_finish
 
 async def check_answer(question: str, answer: str, key: str, llm: Callable[[str], Awaitable[str]]) -> bool:
+    # ⚖️ 分层判题: 明显情况本地判定,其次查 verdict 缓存,只有不确定的情况才调用 judge LLM
+    is_correct = await judge_answer(question, answer, key, llm)
+    print(f"[green]📝 Judge 输出: {is_correct}[/green]")
+    return is_correct
 
-    judge_prompt = f"""对于给定问题，判断给定的回答是否与标准答案相同。一些问题的答案取决于具体的上下文，但是你并不了解上下文，因此你应该仅仅依据给定的标准答案来判断。你应该返回True或False。\n问题： {question}\n回答： {answer}\n标准答案： {key}"""
-    # print(f"[blue]📝 Judge 输入: [italic]{judge_prompt}[/italic][/blue]")
-    judge_result = await llm(judge_prompt)
-    print(f"[green]📝 Judge 输出: {judge_result}[/green]")
-    return "true" in judge_result.lower() # type: ignore
 
-
-async def run_action(action_type: str, argument: str, state: ReactAgentState, docstore: DocstoreExplorer) -> tuple[str, bool]:
+async def run_action(action_type: str, argument: str, state: ReactAgentState, docstore: "DocstoreExplorer") -> tuple[str, bool]:
     """
     运行指定的action并返回结果。
 
@@ -141,9 +176,14 @@ async def run_action(action_type: str, argument: str, state: ReactAgentState, do
     """
     if action_type == "Search":
         try:
-            content = docstore.search(argument)
+            # 🧵 同步的 docstore 调用放到线程池中执行,不阻塞事件循环
+            content = await run_docstore_action(docstore, "search", argument)
             state.previous_search_doc = content
+            # 🔮 未命中时,下一步很可能会搜索 Similar 列表中的标题
+            prefetch_similar(docstore, content)
             return content, False
+        except TimeoutError:
+            return "<SEARCH TIMEOUT, PLEASE TRY AGAIN>", False
         except Exception as e:
             return f"<CANNOT FIND THAT PAGE>", False
 
@@ -159,10 +199,12 @@ async def run_action(action_type: str, argument: str, state: ReactAgentState, do
 
         # 🎯 在文档中执行内容搜索
         try:
-            relevant_content: str = docstore.lookup(search_term)
+            relevant_content: str = await run_docstore_action(docstore, "lookup", search_term)
             if relevant_content:
                 return relevant_content, False
             return f"<NO RELEVANT CONTENT>", False
+        except TimeoutError:
+            return "<LOOKUP TIMEOUT, PLEASE TRY AGAIN>", False
         except Exception as e:
             return f"<SHOULD SEARCH FIRST>", False
     elif action_type == "Finish":
@@ -227,41 +269,11 @@ def search_in_document(
     Returns:
         str: 找到的相关内容片段
     """
-    # 🎯 核心逻辑：分段并搜索
-    sentences = re.split(r'(?<=[.!?])\s+', document)
-    matches: List[Tuple[int, str, float]] = []
-
-    # 🔍 对每个句子进行模糊匹配
-    for idx, sentence in enumerate(sentences):
-        score = fuzz.partial_ratio(search_term.lower(), sentence.lower())
-        if score >= score_threshold:
-            matches.append((idx, sentence, score))
-
-    if not matches:
+    # 🎯 分句结果按页面缓存,所有句子一次批量打分
+    page = segment_page(document)
+    scores = score_sentences(page, search_term, score_threshold)
+    if len(scores) == 0 or scores.max() < score_threshold:
         return f"<NO RELEVANT CONTENT>"
 
-    # 📝 按相关度排序
-    matches.sort(key=lambda x: x[2], reverse=True)
-    best_match_idx = matches[0][0]
-
-    # ✂️ 获取上下文窗口
-    start_idx = max(0, best_match_idx - 2)  # 往前取2句
-    end_idx = min(len(sentences), best_match_idx + 3)  # 往后取2句
-
-    context = ' '.join(sentences[start_idx:end_idx])
-
-    # 📏 如果内容过长，进行裁剪
-    if len(context) > context_length:
-        # 找到最后一个完整句子的位置
-        last_sentence_end = max(
-            context.rfind('.', 0, context_length),
-            context.rfind('!', 0, context_length),
-            context.rfind('?', 0, context_length)
-        )
-        if last_sentence_end != -1:
-            context = context[:last_sentence_end + 1]
-        else:
-            # 如果找不到句子结束，直接截断并添加省略号
-            context = context[:context_length] + '...'
-
-    return context
+    # ✂️ 取分数最高的句子前后各 2 句作为上下文,过长时在句子边界处裁剪
+    return context_window(page, int(scores.argmax()), max_length=context_length)
@@ -1,15 +1,22 @@
 from enum import Enum
-from typing import Awaitable, Callable
+from typing import TYPE_CHECKING, Awaitable, Callable
 import uuid
-from agents.react_agent import ReactAgentState, act, check_answer, observe, think
-from langchain.chat_models.base import BaseChatModel
+from agents.react_agent import ReactAgentState, act, check_answer, observe, think, think_and_act
 
 from utils.fewshots import REFLECTIONS, WEBTHINK_SIMPLE3
 from utils.prompt import LAST_ATTEMPT_HEADER, REACT_REFLECT_INSTRUCTION, REFLECT_INSTRUCTION, REFLECTION_AFTER_LAST_TRIAL_HEADER, REFLECTION_HEADER
 from pydantic import BaseModel
-from langchain.agents.react.base import DocstoreExplorer
-from agents.action_runner import create_wikipedia_docstore
+import asyncio
+from agents.action_runner import create_docstore, fork_docstore
+from agents.prefetch import cancel_prefetch, prefetch_question, prefetch_thought
 from rich import print
+from utils.usage import UsageTracker, llm_phase, track_usage
+from utils.deadline import within_deadline
+from utils.prompt_builder import PromptLayout, react_prompt_builder
+from utils.string_utils import StepMode
+
+if TYPE_CHECKING:
+    from langchain.agents.react.base import DocstoreExplorer
 
 class ReflectionType(Enum):
     NONE = "base"
@@ -33,6 +40,8 @@ class ReactReflectRecord(BaseModel):
     reflections: list[str]  # 记录每一次反思，如果这一轮没有反思，则记录空字符串
     step_n: int = 0         # 记录总共运行了多少步
     trials_count: int = 0   # 记录总共尝试了多少次
+    usage: dict = {}        # 记录 LLM 调用的 token、耗时和费用（按 phase 分组,含每次调用明细）
+    timed_out: bool = False # 超过截止时间被取消,记录只包含到期前完成的步骤
     # searchs: list[str]     # 记录每一次搜索的参数
     # searchs_results: str   # 记录每一次搜索的结果
 
@@ -46,6 +55,10 @@ async def run_react_reflect_agent(
     max_steps: int = 6,  # 每轮最多执行步数,超过触发反思    # 这里的step是指每轮执行的最多步数
     trials_n: int = 5,   # 最大尝试次数,包含反思        # 这里的trials是指反思的次数
     id: str | None = None,
+    prompt_layout: PromptLayout = PromptLayout.CLASSIC,
+    step_mode: StepMode = StepMode.SEPARATE,
+    deadline: float | None = None,  # 截止时间（事件循环时间）,到期时取消进行中的调用并返回部分记录
+    action_llm: Callable[[str], Awaitable[str]] | None = None,  # 生成 Action 的调用器（例如出现 Action 即停止的流式调用器）,默认与 llm 相同
 ) -> ReactReflectRecord:
     # 🏃‍♂️ 初始化状态和记录
     state = ReactReflectAgentState(question=question, key=key)
@@ -61,83 +74,209 @@ async def run_react_reflect_agent(
     if id is not None:
         record.id = id
 
-    docstore = create_wikipedia_docstore()
-
-    # 🔄 主循环 - 最多尝试trials_n次
-    while state.trials_count < trials_n:
-        try:
-            # 📝 每轮开始前重置状态
-            if state.error:
-                state.scratchpad += "\n" + state.error + "\n"
-                state.error = None
-                state.step_n = 0
-
-
-            # 如果不是第一次尝试，则需要对之前的步骤进行反思
-            if state.trials_count > 0:
-                await reflect(state, llm, strategy)
-                state.scratchpad = ""
-
-            # 🎯 执行当前轮次
-            while True:
-                # not state.finished and state.step_n < max_steps:
-                state = await step_react_reflect_agent(
-                    state,
-                    llm,
-                    docstore,
-                    check_llm,
-                    strategy,
-                )
-
-                # 📝 更新记录
-                if state.answer:
-                    record.answers.append(state.answer)
-                    state.answer = ""
-                record.step_n = state.step_n
-                record.is_correct = state.is_correct
-                record.trials_count = state.trials_count
-
-                if state.finished or state.step_n >= max_steps:
-                    break
-
-            # ✅ 如果答案正确或达到最大尝试次数,结束循环
-            if state.is_correct or state.trials_count >= trials_n:
-                break
-
-            # 🔄 否则进入下一轮尝试
-            state.trials_count += 1
-            state.step_n = 0
-            state.finished = False
+    docstore = create_docstore()
+    # 🔮 第一次思考期间预取问题中的实体
+    prefetch_question(docstore, question)
+    agent_format_func = select_agent_format(prompt_layout)
 
-        except Exception as e:
-            # print(f"[red]❌ 步骤执行出错: {str(e)}[/red]")
-            state.error = "<ERROR, PLEASE OUTPUT ACCORDING TO THE EXAMPLES>"
-            continue
+    # 📊 收集本题所有 LLM 调用的用量
+    with track_usage() as usage_tracker:
+        state = await run_react_reflect_trials(state, record, llm, docstore, check_llm, strategy, max_steps, trials_n, agent_format_func, step_mode, deadline, action_llm)
 
     # 🎯 完成运行
     state.finished = True
+    cancel_prefetch(docstore)
+    record.usage = usage_tracker.summary()
     # print("[green]🎉 结束[/green]")
     # print(f"[blue]📝 运行了 {state.step_n} 步, {state.trials_count} 轮[/blue]")
 
     return record
 
 
+async def run_react_reflect_sweep(
+    question: str,
+    key: str,
+    llm: Callable[[str], Awaitable[str]],
+    check_llm: Callable[[str], Awaitable[str]] | None = None,
+    strategies: list[ReflectionType] = list(ReflectionType),
+    max_steps: int = 6,
+    trials_n: int = 5,
+    id: str | None = None,
+    prompt_layout: PromptLayout = PromptLayout.CLASSIC,
+    step_mode: StepMode = StepMode.SEPARATE,
+    deadline: float | None = None,
+    action_llm: Callable[[str], Awaitable[str]] | None = None,
+) -> dict[ReflectionType, ReactReflectRecord]:
+    """
+    在同一道题上运行多种反思策略,共享第一轮
+
+    还没有任何反思时,各策略第一轮的 prompt 完全相同。共享部分（到第一次答错,或第一轮步数用完为止）只运行一次,
+    之后复制 agent 状态、记录和 docstore 游标,各策略在自己的副本上继续; LLM 调用器和 docstore 缓存全部共享。
+
+    每个策略的 usage 包含共享部分的调用（与单独运行时可比）,其中 shared_calls 条由 shared_by 个策略共享,只实际花费了一次。
+    共享部分和所有分支使用同一个截止时间,共享部分就已经到期时各策略都返回共享部分的记录。
+    """
+    state = ReactReflectAgentState(question=question, key=key)
+    record = ReactReflectRecord(question=question, key=key, answers=[], is_correct=None, reflections=[], step_n=0, trials_count=0)
+    if id is not None:
+        record.id = id
+
+    docstore = create_docstore()
+    prefetch_question(docstore, question)
+    agent_format_func = select_agent_format(prompt_layout)
+
+    # 🌳 共享的第一轮: 不反思,答错即停
+    with track_usage() as shared_usage:
+        state = await run_react_reflect_trials(state, record, llm, docstore, check_llm, ReflectionType.NONE, max_steps, 1, agent_format_func, step_mode, deadline, action_llm)
+
+    async def branch(strategy: ReflectionType) -> ReactReflectRecord:
+        # 🍴 分叉: 每个策略拿到状态、记录和 docstore 游标的独立副本
+        branch_state = state.model_copy(deep=True)
+        branch_record = record.model_copy(deep=True)
+        branch_docstore = fork_docstore(docstore)
+        with track_usage() as branch_usage:
+            if not branch_state.is_correct and strategy != ReflectionType.NONE and not branch_record.timed_out:
+                in_trial = False
+                if branch_state.finished:
+                    # 与 step_react_reflect_agent 一致: 答错后立即反思,在本轮剩余的步数内继续
+                    async with within_deadline(deadline) as scope:
+                        try:
+                            await reflect(branch_state, llm, strategy)
+                        except Exception:
+                            branch_state.error = "<ERROR, PLEASE OUTPUT ACCORDING TO THE EXAMPLES>"
+                    branch_record.timed_out = scope.expired
+                    branch_state.finished = False
+                    in_trial = branch_state.step_n < max_steps
+                if not branch_record.timed_out and (in_trial or next_trial(branch_state, trials_n, strategy)):
+                    branch_state = await run_react_reflect_trials(
+                        branch_state, branch_record, llm, branch_docstore, check_llm, strategy, max_steps, trials_n, agent_format_func, step_mode, deadline, action_llm,
+                    )
+        cancel_prefetch(branch_docstore)
+
+        combined = UsageTracker()
+        combined.calls = shared_usage.calls + branch_usage.calls
+        branch_record.usage = {**combined.summary(), "shared_calls": len(shared_usage.calls), "shared_by": len(strategies)}
+        return branch_record
+
+    records = await asyncio.gather(*(branch(strategy) for strategy in strategies))
+    cancel_prefetch(docstore)
+    return dict(zip(strategies, records))
+
+
+def select_agent_format(prompt_layout: PromptLayout) -> Callable[[ReactReflectAgentState], str]:
+    # 🧱 PREFIX_STABLE: 问题放在反思之前,同一道题的所有 trial/step 共享更长的 KV 前缀
+    return format_agent_prefix_stable_state if prompt_layout == PromptLayout.PREFIX_STABLE else format_agent_state
+
+
+async def run_react_reflect_trials(
+    state: ReactReflectAgentState,
+    record: ReactReflectRecord,
+    llm: Callable[[str], Awaitable[str]],
+    docstore: "DocstoreExplorer",
+    check_llm: Callable[[str], Awaitable[str]] | None,
+    strategy: ReflectionType,
+    max_steps: int,
+    trials_n: int,
+    agent_format_func: Callable[[ReactReflectAgentState], str],
+    step_mode: StepMode,
+    deadline: float | None = None,
+    action_llm: Callable[[str], Awaitable[str]] | None = None,
+) -> ReactReflectAgentState:
+    """
+    从当前状态继续运行,直到答对、尝试次数用完（NONE 策略只有一轮）或者到达截止时间
+
+    state 可以是一轮进行到一半的状态（扫描模式从共享的第一轮分叉出来时）,会从当前步继续。
+    到达截止时间时进行中的步骤被取消,返回最后一个完成的步骤的状态,record.timed_out 置为 True。
+    """
+    async with within_deadline(deadline) as scope:
+        # 🔄 主循环 - 最多尝试trials_n次
+        while state.trials_count < trials_n:
+            try:
+                # 📝 每轮开始前重置状态
+                if state.error:
+                    state.scratchpad += "\n" + state.error + "\n"
+                    state.error = None
+                    state.step_n = 0
+
+
+                # 如果不是第一次尝试，则需要对之前的步骤进行反思
+                if state.trials_count > 0:
+                    await reflect(state, llm, strategy)
+                    state.scratchpad = ""
+
+                # 🎯 执行当前轮次
+                while True:
+                    # not state.finished and state.step_n < max_steps:
+                    state = await step_react_reflect_agent(
+                        state,
+                        llm,
+                        docstore,
+                        check_llm,
+                        strategy,
+                        agent_format_func,
+                        step_mode,
+                        action_llm,
+                    )
+
+                    # 📝 更新记录
+                    if state.answer:
+                        record.answers.append(state.answer)
+                        state.answer = ""
+                    record.step_n = state.step_n
+                    record.is_correct = state.is_correct
+                    record.trials_count = state.trials_count
+
+                    if state.finished or state.step_n >= max_steps:
+                        break
+
+                # ✅ 如果答案正确、达到最大尝试次数,或者没有反思策略（不反思的重试只会重复同样的轨迹）,结束循环
+                if not next_trial(state, trials_n, strategy):
+                    break
+
+            except Exception as e:
+                # print(f"[red]❌ 步骤执行出错: {str(e)}[/red]")
+                state.error = "<ERROR, PLEASE OUTPUT ACCORDING TO THE EXAMPLES>"
+                continue
+
+    # ⏰ 到期时进行中的步骤已被取消,记录保留到期前完成的步骤
+    record.timed_out = record.timed_out or scope.expired
+    return state
+
+
+def next_trial(state: ReactReflectAgentState, trials_n: int, strategy: ReflectionType) -> bool:
+    """一轮结束后决定是否进入下一轮; 进入时重置轮内状态"""
+    if state.is_correct or state.trials_count >= trials_n or strategy == ReflectionType.NONE:
+        return False
+    state.trials_count += 1
+    state.step_n = 0
+    state.finished = False
+    return True
+
+
 async def step_react_reflect_agent(
     state: ReactReflectAgentState,
     llm: Callable[[str], Awaitable[str]],
-    docstore: DocstoreExplorer,
+    docstore: "DocstoreExplorer",
     check_llm: Callable[[str], Awaitable[str]] | None = None,
     reflection_type: ReflectionType = ReflectionType.NONE,
-    agent_format_func: Callable[[ReactReflectAgentState], str] = lambda x: format_agent(WEBTHINK_SIMPLE3, x.scratchpad, x.question, x.reflections_str),
+    agent_format_func: Callable[[ReactReflectAgentState], str] = lambda x: format_agent_state(x),
+    step_mode: StepMode = StepMode.SEPARATE,
+    action_llm: Callable[[str], Awaitable[str]] | None = None,
 ) -> ReactReflectAgentState:
-
+    """执行一步: think / reflect 使用 llm,生成 Action 的调用使用 action_llm（默认与 llm 相同）"""
+    action_llm = action_llm or llm
     new_state = state.model_copy()
     new_state.step_n += 1
 
     print(f"[blue]📝 进入第 {new_state.step_n} 步[/blue]")
     # 🤖 执行核心步骤
-    await think(new_state, llm, agent_format_func) # type: ignore
-    action = await act(new_state, llm, agent_format_func) # type: ignore
+    if step_mode == StepMode.FUSED:
+        action = await think_and_act(new_state, action_llm, agent_format_func) # type: ignore
+    else:
+        thought = await think(new_state, llm, agent_format_func) # type: ignore
+        # 🔮 生成 Action 期间预取 Thought 中提到的实体
+        prefetch_thought(docstore, thought)
+        action = await act(new_state, action_llm, agent_format_func) # type: ignore
     observation, is_finish = await observe(new_state, action, llm, check_func=check_answer, check_llm=check_llm or llm, docstore=docstore)
 
     if is_finish and not new_state.is_correct and reflection_type != ReflectionType.NONE:
@@ -156,14 +295,16 @@ async def reflect(state: ReactReflectAgentState, llm: Callable[[str], Awaitable[
 
     elif strategy == ReflectionType.REFLEXION:
         prompt = build_reflextion_prompt(state.question, state.scratchpad)
-        reflection = await llm(prompt +"\n(Note: Write down your reflection in one line without Reflection prefix.)")
+        with llm_phase("reflect", trial=state.trials_count, step=state.step_n):
+            reflection = await llm(prompt +"\n(Note: Write down your reflection in one line without Reflection prefix.)")
         state.reflections = [reflection]
         state.reflections_str = format_reflection(state.reflections)
 
     elif strategy == ReflectionType.LAST_ATTEMPT_AND_REFLEXION:
         state.reflections_str = format_last_attempt(state.question, state.scratchpad)
         prompt = build_reflextion_prompt(state.question, state.scratchpad)
-        reflection = await llm(prompt +"\n(Note: Write down your reflection in one line without Reflection prefix.)")
+        with llm_phase("reflect", trial=state.trials_count, step=state.step_n):
+            reflection = await llm(prompt +"\n(Note: Write down your reflection in one line without Reflection prefix.)")
         state.reflections = [reflection]
         state.reflections_str += "\n" + format_reflection(state.reflections, header=REFLECTION_AFTER_LAST_TRIAL_HEADER)
     else:
@@ -189,4 +330,16 @@ def format_step(step: str):
 
 
 def format_agent(react_examples: str, scraptchpad: str, question: str, reflections: str)-> str:
-    return REACT_REFLECT_INSTRUCTION.format(examples=react_examples, reflections=reflections, question=question, scratchpad=scraptchpad)
\ No newline at end of file
+    return REACT_REFLECT_INSTRUCTION.format(examples=react_examples, reflections=reflections, question=question, scratchpad=scraptchpad)
+
+
+def format_agent_prefix_stable(react_examples: str, scratchpad: str, question: str, reflections: str) -> str:
+    return react_prompt_builder(react_examples).build(scratchpad, reflections, question=question)
+
+
+def format_agent_state(state: ReactReflectAgentState) -> str:
+    return format_agent(WEBTHINK_SIMPLE3, state.scratchpad, state.question, state.reflections_str)
+
+
+def format_agent_prefix_stable_state(state: ReactReflectAgentState) -> str:
+    return format_agent_prefix_stable(WEBTHINK_SIMPLE3, state.scratchpad, state.question, state.reflections_str)
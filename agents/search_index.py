@@ -0,0 +1,272 @@
+"""
+本地搜索索引: Search 未命中时的模糊标题解析 + BM25 正文检索
+
+- 标题: 归一化后完全相同直接命中; 否则用标题的字符 3-gram 倒排表选出少量候选,
+  再用 rapidfuzz 对候选打分,拼写接近的 Search[...] 一步解析到正确的页面
+- 正文: BM25 倒排索引,每个倒排项的 BM25 权重在构建时预先算好,查询只需要拼接和求和
+
+倒排表都是 numpy 数组,查询只触及查询词对应的少量倒排项,几十万标题的语料也能在亚毫秒级返回。
+"""
+import re
+import threading
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Any, Iterable
+
+import numpy as np
+
+from agents.offline_docstore import DEFAULT_OFFLINE_DOCSTORE_DIR, OfflineDocstore, normalize_title
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def title_trigrams(normalized: str) -> set[str]:
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _build_postings(postings: dict[str, list[int]]) -> tuple[dict[str, int], list[np.ndarray]]:
+    vocab: dict[str, int] = {}
+    arrays: list[np.ndarray] = []
+    for term, ids in postings.items():
+        vocab[term] = len(arrays)
+        arrays.append(np.asarray(ids, dtype=np.int32))
+    return vocab, arrays
+
+
+@dataclass
+class SearchHit:
+    title: str
+    score: float        # 0~100
+    source: str         # exact / title / bm25
+
+
+class SearchIndex:
+    """
+    标题 + 正文的本地检索索引
+
+    参数:
+        titles: 页面标题
+        texts: 与标题一一对应的正文,为 None 时只建标题索引
+        max_trigram_df: 出现在超过该比例标题中的 3-gram 不参与候选召回（类似停用词）
+        max_term_df: 出现在超过该比例页面中的词不参与 BM25 打分
+        max_query_trigrams: 查询时只用最稀有的若干个 3-gram 召回候选
+    """
+
+    def __init__(
+        self,
+        titles: list[str],
+        texts: Iterable[str] | None = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_trigram_df: float = 0.05,
+        max_term_df: float = 0.2,
+        max_query_trigrams: int = 12,
+    ):
+        self.titles = titles
+        self.max_query_trigrams = max_query_trigrams
+        self.normalized = [normalize_title(t) for t in titles]
+        self.exact: dict[str, int] = {}
+        for i, key in enumerate(self.normalized):
+            self.exact.setdefault(key, i)
+
+        n = len(titles)
+        # 🔤 标题 3-gram 倒排表
+        trigram_postings: dict[str, list[int]] = {}
+        for i, key in enumerate(self.normalized):
+            for gram in title_trigrams(key):
+                trigram_postings.setdefault(gram, []).append(i)
+        max_df = max(1, int(n * max_trigram_df))
+        self._trigram_vocab, self._trigram_postings = _build_postings(
+            {gram: ids for gram, ids in trigram_postings.items() if len(ids) <= max_df}
+        )
+
+        # 📚 BM25 倒排表,倒排项直接存 BM25 权重
+        self._term_vocab: dict[str, int] = {}
+        self._term_docs: list[np.ndarray] = []
+        self._term_weights: list[np.ndarray] = []
+        if texts is not None:
+            self._build_bm25(texts, k1, b, max(1, int(n * max_term_df)))
+
+    def _build_bm25(self, texts: Iterable[str], k1: float, b: float, max_df: int) -> None:
+        term_postings: dict[str, tuple[list[int], list[int]]] = {}
+        doc_lens: list[int] = []
+        for doc_id, text in enumerate(texts):
+            # 标题也算作正文的一部分
+            tokens = tokenize(self.titles[doc_id]) + tokenize(text)
+            doc_lens.append(len(tokens))
+            counts: dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                ids, tfs = term_postings.setdefault(token, ([], []))
+                ids.append(doc_id)
+                tfs.append(tf)
+
+        lens = np.asarray(doc_lens, dtype=np.float32)
+        avg_len = float(lens.mean()) if len(lens) else 1.0
+        n = len(doc_lens)
+        for term, (ids, tfs) in term_postings.items():
+            if len(ids) > max_df:
+                continue
+            doc_ids = np.asarray(ids, dtype=np.int32)
+            tf = np.asarray(tfs, dtype=np.float32)
+            idf = np.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            weights = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lens[doc_ids] / avg_len))
+            self._term_vocab[term] = len(self._term_docs)
+            self._term_docs.append(doc_ids)
+            self._term_weights.append(weights.astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def title_candidates(self, query: str, limit: int = 32) -> np.ndarray:
+        """按共享 3-gram 数量召回候选标题"""
+        grams = [self._trigram_postings[self._trigram_vocab[g]] for g in title_trigrams(normalize_title(query)) if g in self._trigram_vocab]
+        if not grams:
+            return np.empty(0, dtype=np.int32)
+        # 只用最稀有的若干个 3-gram 召回: 区分度最高,倒排表也最短
+        grams.sort(key=len)
+        ids, counts = np.unique(np.concatenate(grams[:self.max_query_trigrams]), return_counts=True)
+        if len(ids) > limit:
+            ids = ids[np.argpartition(-counts, limit)[:limit]]
+        return ids
+
+    def match_titles(self, query: str, limit: int = 5) -> list[SearchHit]:
+        """模糊标题匹配"""
+        from rapidfuzz import fuzz, process
+
+        key = normalize_title(query)
+        exact = self.exact.get(key)
+        if exact is not None:
+            return [SearchHit(self.titles[exact], 100.0, "exact")]
+
+        candidates = self.title_candidates(query)
+        if len(candidates) == 0:
+            return []
+        ids = candidates.tolist()
+        return [
+            SearchHit(self.titles[ids[j]], float(score), "title")
+            for _, score, j in process.extract(key, [self.normalized[i] for i in ids], scorer=fuzz.WRatio, limit=limit)
+        ]
+
+    def bm25(self, query: str, limit: int = 5) -> list[SearchHit]:
+        """BM25 正文检索,分数按本次结果的最高分归一化到 0~100"""
+        terms = [self._term_vocab[t] for t in set(tokenize(query)) if t in self._term_vocab]
+        if not terms:
+            return []
+        doc_ids = np.concatenate([self._term_docs[t] for t in terms])
+        weights = np.concatenate([self._term_weights[t] for t in terms])
+        ids, inverse = np.unique(doc_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        top = np.argsort(-scores)[:limit]
+        best = float(scores[top[0]])
+        return [SearchHit(self.titles[ids[i]], float(scores[i]) / best * 100, "bm25") for i in top]
+
+    def search(self, query: str, limit: int = 5, confident_score: float = 90.0) -> list[SearchHit]:
+        """标题匹配足够确定时直接返回; 否则与 BM25 结果合并,按分数排序（去重）"""
+        hits = self.match_titles(query, limit)
+        if hits and hits[0].score >= confident_score:
+            return hits
+        merged: dict[str, SearchHit] = {}
+        for hit in sorted(hits + self.bm25(query, limit), key=lambda h: h.score, reverse=True):
+            merged.setdefault(hit.title, hit)
+        return list(merged.values())[:limit]
+
+
+class IndexStats:
+    """索引解析的统计（所有 agent 共享）"""
+
+    def __init__(self):
+        self.misses = 0         # 底层 docstore 未命中
+        self.resolved = 0       # 由索引直接解析到页面
+        self.suggested = 0      # 用索引结果替换 Similar 列表
+        self._lock = threading.Lock()
+
+    def record(self, resolved: bool = False, suggested: bool = False) -> None:
+        """记录一次未命中（Search 在线程池中执行,多个线程同时更新）"""
+        with self._lock:
+            self.misses += 1
+            self.resolved += int(resolved)
+            self.suggested += int(suggested)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "misses": self.misses,
+            "resolved": self.resolved,
+            "suggested": self.suggested,
+            "resolve_rate": self.resolved / self.misses if self.misses else 0.0,
+        }
+
+
+index_stats = IndexStats()
+
+
+class IndexedDocstore:
+    """
+    Search 未命中时用本地索引解析
+
+    标题模糊匹配分数达到 resolve_score 时,直接返回最佳页面（省掉一轮 think/act/observe）;
+    否则用索引结果（标题 + BM25）替换 Similar 列表。
+
+    索引只保存在包装层上,进程共享的离线 docstore 不会被修改; 包装离线 docstore 时只按标题查找,
+    未命中时不再全量扫描标题生成马上会被替换的 Similar 列表。
+    """
+
+    def __init__(self, docstore: Any, index: SearchIndex, resolve_score: float = 90.0, similar_limit: int = 5):
+        self.docstore = docstore
+        self.index = index
+        self.resolve_score = resolve_score
+        self.similar_limit = similar_limit
+
+    def _lookup(self, search: str) -> "str | Document | None":
+        """底层 docstore 的查找; 离线 docstore 未命中时返回 None（不生成 Similar 提示）"""
+        from langchain_core.documents import Document
+
+        if not isinstance(self.docstore, OfflineDocstore):
+            return self.docstore.search(search)
+        page = self.docstore.get(search)
+        if page is None:
+            return None
+        title, content = page
+        return Document(page_content=content, metadata={"page": title})
+
+    def search(self, search: str) -> "str | Document":
+        from langchain_core.documents import Document
+
+        result = self._lookup(search)
+        if isinstance(result, Document):
+            return result
+
+        hits = self.index.search(search, self.similar_limit, confident_score=self.resolve_score)
+        if hits and hits[0].source != "bm25" and hits[0].score >= self.resolve_score:
+            resolved = self._lookup(hits[0].title)
+            if isinstance(resolved, Document):
+                index_stats.record(resolved=True)
+                return resolved
+        if not hits:
+            index_stats.record()
+            # 索引没有结果: 回退到底层 docstore 自己的 Similar 提示
+            return result if result is not None else self.docstore.search(search)
+        index_stats.record(suggested=True)
+        return f"Could not find [{search}]. Similar: {[hit.title for hit in hits[:self.similar_limit]]}"
+
+
+@cache
+def get_offline_search_index(directory: str = DEFAULT_OFFLINE_DOCSTORE_DIR) -> SearchIndex:
+    """从离线 docstore 的全部页面构建索引（同一进程内共享）"""
+    from agents.offline_docstore import open_offline_docstore
+
+    docstore = open_offline_docstore(directory)
+    titles, texts = [], []
+    for title, content in docstore.pages():
+        titles.append(title)
+        texts.append(content)
+    return SearchIndex(titles, texts)
@@ -0,0 +1,55 @@
+"""
+测量各模块的导入耗时
+
+每个模块在独立的子进程中导入,避免模块缓存影响结果。
+
+用法:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py utils.llms agents.react_agent
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = [
+    "utils.llms",
+    "utils.dataset",
+    "agents.action_runner",
+    "agents.react_agent",
+    "agents.react_reflect_agent",
+    "agents.cot_agent",
+    "run_hotpot_react",
+    "run_hotpot_cot",
+]
+
+CHILD_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ("langchain_openai", "langchain_community", "pandas", "joblib") if m in sys.modules)
+print(f"{{elapsed * 1000:.1f}}\\t{{','.join(heavy) or '-'}}")
+"""
+
+
+def measure(module: str) -> tuple[float, str]:
+    """在子进程中导入模块,返回 (耗时毫秒, 导入时被加载的重量级依赖)"""
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE.format(module=module)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, heavy = result.stdout.strip().splitlines()[-1].split("\t")
+    return float(elapsed), heavy
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    print(f"{'module':<30}{'import ms':>12}  heavy deps loaded")
+    for module in modules:
+        elapsed, heavy = measure(module)
+        print(f"{module:<30}{elapsed:>12.1f}  {heavy}")
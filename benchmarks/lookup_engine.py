@@ -0,0 +1,112 @@
+"""
+Lookup 引擎与原逐句循环实现的对比
+
+用 HotpotQA 样本的段落拼出长页面（默认约 1500 句,相当于一篇长维基百科条目）,
+对同一页面重复 Lookup 不同关键词,比较:
+    - baseline: 每次重新正则分句、逐句 lower + fuzz.partial_ratio
+    - cold:     清空分句缓存后的第一次查询（分句 + 批量打分）
+    - warm:     分句已缓存,只做批量打分
+
+用法:
+    python benchmarks/lookup_engine.py --sentences 1500 --queries 200
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from rapidfuzz import fuzz  # noqa: E402
+
+from agents.lookup_engine import context_window, score_sentences, segment_page  # noqa: E402
+
+
+def baseline_search_in_document(document: str, search_term: str, context_length: int = 400, score_threshold: int = 60) -> str:
+    """优化前 agents/react_agent.py:search_in_document 的实现"""
+    sentences = re.split(r'(?<=[.!?])\s+', document)
+    matches = []
+    for idx, sentence in enumerate(sentences):
+        score = fuzz.partial_ratio(search_term.lower(), sentence.lower())
+        if score >= score_threshold:
+            matches.append((idx, sentence, score))
+    if not matches:
+        return "<NO RELEVANT CONTENT>"
+    matches.sort(key=lambda x: x[2], reverse=True)
+    best_match_idx = matches[0][0]
+    start_idx = max(0, best_match_idx - 2)
+    end_idx = min(len(sentences), best_match_idx + 3)
+    context = ' '.join(sentences[start_idx:end_idx])
+    if len(context) > context_length:
+        last_sentence_end = max(context.rfind('.', 0, context_length), context.rfind('!', 0, context_length), context.rfind('?', 0, context_length))
+        context = context[:last_sentence_end + 1] if last_sentence_end != -1 else context[:context_length] + '...'
+    return context
+
+
+def engine_search_in_document(document: str, search_term: str, context_length: int = 400, score_threshold: int = 60) -> str:
+    page = segment_page(document)
+    scores = score_sentences(page, search_term, score_threshold)
+    if len(scores) == 0 or scores.max() < score_threshold:
+        return "<NO RELEVANT CONTENT>"
+    return context_window(page, int(scores.argmax()), max_length=context_length)
+
+
+def long_page(n_sentences: int) -> str:
+    try:
+        from utils.dataset import load_hotpot
+        paragraphs = list(load_hotpot()["supporting_paragraphs"])
+    except Exception:
+        paragraphs = [f"Sentence {i} talks about topic {i % 37} in the year {1800 + i % 200}." for i in range(200)]
+    sentences: list[str] = []
+    i = 0
+    while len(sentences) < n_sentences:
+        sentences.extend(s for s in re.split(r'(?<=[.!?])\s+', paragraphs[i % len(paragraphs)]) if s)
+        i += 1
+    return " ".join(sentences[:n_sentences])
+
+
+def timed(fn, document: str, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(document, query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    print(f"{name:<9} mean={statistics.mean(latencies) * 1e3:.3f}ms p50={statistics.median(latencies) * 1e3:.3f}ms max={max(latencies) * 1e3:.3f}ms")
+
+
+def main(args: argparse.Namespace) -> None:
+    document = long_page(args.sentences)
+    rng = random.Random(0)
+    words = [w for w in re.findall(r"[A-Za-z]{5,}", document)]
+    queries = [rng.choice(words) for _ in range(args.queries)]
+    print(f"page chars={len(document)} sentences={len(segment_page(document).sentences)} queries={len(queries)}")
+
+    report("baseline", timed(baseline_search_in_document, document, queries))
+    cold = []
+    for query in queries[:20]:
+        segment_page.cache_clear()
+        cold.extend(timed(engine_search_in_document, document, [query]))
+    report("cold", cold)
+    report("warm", timed(engine_search_in_document, document, queries))
+
+    mismatches = sum(baseline_search_in_document(document, q) != engine_search_in_document(document, q) for q in queries)
+    print(f"results differing from baseline: {mismatches}/{len(queries)}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Lookup 引擎基准")
+    parser.add_argument("--sentences", type=int, default=1500)
+    parser.add_argument("--queries", type=int, default=200)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,264 @@
+"""
+本地 OpenAI 兼容的模拟推理服务
+
+实现 /v1/chat/completions（含 stream=True 的 SSE 输出）,用于在没有网络、不花钱的情况下
+压测 runner 的并发参数,以及测量 agent 自身的调度开销和尾延迟。
+
+可配置:
+    - 首 token 延迟分布（对数正态,中位数 + sigma）
+    - 生成速度（tokens/sec）
+    - 429 / 5xx 注入概率
+    - 按 prompt 类型（Thought / Action / Reflection / judge）返回的 ReAct 格式脚本化回复
+
+用法:
+    python benchmarks/mock_llm_server.py --port 8000 --ttft-median 0.3 --tokens-per-sec 80 --rate-429 0.02
+    # 然后将 .env 中的 OPENAI_LLM_BASE_URL / LOCAL_LLM_BASE_URL 指向 http://127.0.0.1:8000/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class MockScript:
+    """
+    脚本化回复
+
+    actions 按 ReAct 的步数依次使用,{entity} 会替换为问题中第一个大写开头的词组。
+    超出长度时使用最后一个动作。
+    """
+    thought: str = "I need to search {entity} and find the answer."
+    actions: list[str] = field(default_factory=lambda: ["Finish[{entity}]"])
+    reflection: str = "I should search the key entities in the question first and answer with a short phrase."
+    judge: str = "True"
+    cot_thought: str = "Based on the context, the answer is {entity}."
+    cot_action: str = "Finish[{entity}]"
+
+
+@dataclass
+class MockConfig:
+    ttft_median: float = 0.2        # 首 token 延迟中位数（秒）
+    ttft_sigma: float = 0.5         # 对数正态分布的 sigma,越大尾延迟越长
+    tokens_per_sec: float = 100.0   # 生成速度
+    rate_429: float = 0.0           # 返回 429 的概率
+    rate_5xx: float = 0.0           # 返回 500/503 的概率
+    model: str = "mock-llm"
+    script: MockScript = field(default_factory=MockScript)
+
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.streamed = 0
+        self.injected_429 = 0
+        self.injected_5xx = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.completion_tokens = 0
+        self.disconnected = 0   # 客户端提前断开（提前停止生效）
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+QUESTION_PATTERN = re.compile(r"Question: (.*)")
+ENTITY_PATTERN = re.compile(r"(?:[A-Z][\w'.-]*)(?:\s+[A-Z][\w'.-]*)*")
+STEP_PATTERN = re.compile(r"(Thought|Action) (\d+):\s*(?:\n\(Note:[^\n]*\))?\s*$")
+
+
+def extract_entity(prompt: str) -> str:
+    # 取最后一个 Question: 行（前面的是 few-shot 示例）中第一个大写开头的词组
+    questions = QUESTION_PATTERN.findall(prompt)
+    question = questions[-1] if questions else prompt[-200:]
+    for match in ENTITY_PATTERN.finditer(question):
+        if match.group(0) not in ("What", "Which", "Who", "Where", "When", "How", "Is", "Are", "Were", "Was", "The", "In"):
+            return match.group(0)
+    return "unknown"
+
+
+def script_reply(prompt: str, script: MockScript) -> str:
+    """根据 prompt 的结尾判断当前所处阶段,返回对应的脚本化回复"""
+    entity = extract_entity(prompt)
+    stripped = prompt.rstrip()
+
+    if "标准答案" in prompt:
+        return script.judge
+    if stripped.endswith("Reflection:") or stripped.endswith("反思：") or "without Reflection prefix" in stripped:
+        return script.reflection
+
+    match = STEP_PATTERN.search(prompt)
+    if match:
+        kind, step = match.group(1), int(match.group(2))
+        action = script.actions[min(step - 1, len(script.actions) - 1)].format(entity=entity)
+        if kind == "Thought":
+            thought = script.thought.format(entity=entity)
+            if f'"Action {step}:"' in prompt[-300:]:
+                # 融合模式: 同一次补全中继续写出 Action,并像真实模型一样编造 Observation（由停止词或本地解析截断）
+                return f"{thought}\nAction {step}: {action}\nObservation {step}: {entity} is a mock page."
+            return thought
+        return action
+
+    if stripped.endswith("Thought:"):
+        return script.cot_thought.format(entity=entity)
+    if stripped.endswith("Action:"):
+        return script.cot_action.format(entity=entity)
+    return script.thought.format(entity=entity)
+
+
+def apply_stop(text: str, stop: list[str] | str | None) -> str:
+    if not stop:
+        return text
+    for s in [stop] if isinstance(stop, str) else stop:
+        idx = text.find(s)
+        if idx != -1:
+            text = text[:idx]
+    return text
+
+
+def create_app(config: MockConfig) -> web.Application:
+    stats = MockStats()
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stats.requests += 1
+
+        # 💥 错误注入
+        roll = random.random()
+        if roll < config.rate_429:
+            stats.injected_429 += 1
+            return web.json_response({"error": {"message": "rate limited", "type": "rate_limit"}}, status=429, headers={"Retry-After": "1"})
+        if roll < config.rate_429 + config.rate_5xx:
+            stats.injected_5xx += 1
+            return web.json_response({"error": {"message": "server error", "type": "server_error"}}, status=random.choice([500, 503]))
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        text = apply_stop(script_reply(prompt, config.script), body.get("stop"))
+        tokens = TOKEN_PATTERN.findall(text) or [""]
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        stats.inflight += 1
+        stats.max_inflight = max(stats.max_inflight, stats.inflight)
+        try:
+            await asyncio.sleep(random.lognormvariate(0, config.ttft_sigma) * config.ttft_median)
+
+            if not body.get("stream"):
+                await asyncio.sleep(len(tokens) / config.tokens_per_sec)
+                stats.completion_tokens += len(tokens)
+                return web.json_response({
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": body.get("model", config.model),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+                })
+
+            stats.streamed += 1
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+
+            def chunk(delta: dict, finish_reason: str | None = None, usage: dict | None = None) -> bytes:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", config.model),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+                }
+                if usage is not None:
+                    payload["usage"] = usage
+                return f"data: {json.dumps(payload)}\n\n".encode()
+
+            try:
+                await response.write(chunk({"role": "assistant", "content": ""}))
+                for token in tokens:
+                    await response.write(chunk({"content": token}))
+                    stats.completion_tokens += 1
+                    await asyncio.sleep(1 / config.tokens_per_sec)
+                await response.write(chunk({}, finish_reason="stop"))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    await response.write(chunk({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}))
+                await response.write(b"data: [DONE]\n\n")
+                await response.write_eof()
+            except ConnectionResetError:
+                # 客户端命中停止条件后主动断开,停止生成
+                stats.disconnected += 1
+            except asyncio.CancelledError:
+                stats.disconnected += 1
+                raise
+            return response
+        finally:
+            stats.inflight -= 1
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats.to_dict())
+
+    async def list_models(request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": config.model, "object": "model"}]})
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/v1/models", list_models)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """
+    在当前事件循环中启动模拟服务
+
+    返回:
+        (runner, base_url): 用 runner.cleanup() 关闭服务; base_url 形如 http://127.0.0.1:12345/v1
+    """
+    runner = web.AppRunner(create_app(config), handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+    return runner, f"http://{host}:{bound_port}/v1"
+
+
+def load_script(path: str | None) -> MockScript:
+    if path is None:
+        return MockScript()
+    with open(path, encoding="utf-8") as f:
+        return MockScript(**json.load(f))
+
+
+def parse_args(argv: list[str] | None = None) -> tuple[argparse.Namespace, MockConfig]:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟推理服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft-median", type=float, default=0.2)
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--script", default=None, help="JSON 文件,字段同 MockScript")
+    args = parser.parse_args(argv)
+    config = MockConfig(
+        ttft_median=args.ttft_median,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        script=load_script(args.script),
+    )
+    return args, config
+
+
+if __name__ == "__main__":
+    args, config = parse_args()
+    web.run_app(create_app(config), host=args.host, port=args.port)
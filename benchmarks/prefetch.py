@@ -0,0 +1,105 @@
+"""
+投机预取的收益: 模拟慢速 docstore + 模拟 LLM 服务,对比开启/关闭预取时的单题延迟
+
+docstore 每次 Search 固定延迟 --docstore-latency 秒（模拟在线维基百科）。
+脚本化的 agent 先搜索一个不存在的标题（返回 Similar 列表）,再搜索正确的标题,最后 Finish,
+三类候选来源（问题实体 / Thought / Similar）都会用到。
+
+用法:
+    python benchmarks/prefetch.py --questions 100 --concurrency 20 --docstore-latency 0.5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mock_llm_server import MockConfig, MockScript, start_server  # noqa: E402
+
+from agents.docstore_cache import CachedDocstore, DocstoreCache  # noqa: E402
+from agents.prefetch import PrefetchingExplorer, cancel_prefetch, prefetch_question, prefetch_stats  # noqa: E402
+from agents.react_reflect_agent import ReactReflectAgentState, step_react_reflect_agent  # noqa: E402
+from utils.llms import create_llm_invoker  # noqa: E402
+
+
+class SlowDocstore:
+    """固定延迟的 docstore: 以 " Inc" 结尾的标题不存在,返回去掉后缀的 Similar 提示"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search(self, search: str):
+        from langchain_core.documents import Document
+
+        time.sleep(self.latency)
+        if search.endswith(" Inc"):
+            return f"Could not find [{search}]. Similar: ['{search[:-4]}', '{search} (disambiguation)']"
+        return Document(page_content=f"{search} is a mock company founded in 1990.", metadata={"page": search})
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_questions(args: argparse.Namespace, invoker, prefetch: bool, cache_path: str) -> list[float]:
+    from langchain.agents.react.base import DocstoreExplorer
+
+    cache = DocstoreCache(cache_path)
+    backend = SlowDocstore(args.docstore_latency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            explorer = DocstoreExplorer(docstore=CachedDocstore(backend, cache, namespace="mock"))  # type: ignore
+            docstore = PrefetchingExplorer(explorer) if prefetch else explorer
+            question = f"What is the founding year of Mock Company N{i}?"
+            state = ReactReflectAgentState(question=question, key=f"Mock Company N{i}")
+            start = time.perf_counter()
+            prefetch_question(docstore, question)
+            while not state.finished and state.step_n < args.max_steps:
+                state = await step_react_reflect_agent(state, invoker, docstore, invoker)  # type: ignore
+            cancel_prefetch(docstore)
+            latencies.append(time.perf_counter() - start)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(i) for i in range(args.questions)))
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    from langchain_openai import ChatOpenAI
+
+    script = MockScript(actions=["Search[{entity} Inc]", "Search[{entity}]", "Finish[{entity}]"])
+    server, base_url = await start_server(MockConfig(ttft_median=args.ttft_median, ttft_sigma=0.3, script=script))
+    llm = ChatOpenAI(api_key="EMPTY", base_url=base_url, model="mock-llm", max_retries=0)  # type: ignore
+    invoker = create_llm_invoker(llm)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for prefetch in (False, True):
+            latencies = await run_questions(args, invoker, prefetch, f"{tmp}/cache_{prefetch}.sqlite")
+            print(f"prefetch={prefetch!s:<5} p50={percentile(latencies, 0.5):.3f}s p90={percentile(latencies, 0.9):.3f}s mean={statistics.mean(latencies):.3f}s")
+    print(f"prefetch {prefetch_stats.stats()}")
+    await server.cleanup()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="投机预取基准")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-steps", type=int, default=7)
+    parser.add_argument("--docstore-latency", type=float, default=0.5)
+    parser.add_argument("--ttft-median", type=float, default=0.3)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
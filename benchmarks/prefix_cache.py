@@ -0,0 +1,194 @@
+"""
+对比 CLASSIC 与 PREFIX_STABLE 两种 prompt 布局的 KV 前缀缓存命中率
+
+按 ReAct-Reflexion 的真实调用顺序生成 prompt 序列: 每道题 trials 轮,每轮 steps 步
+（CoT 每轮只有一步）,每步一次 think 和一次 act,每轮结束后追加一条反思。
+CoT 的上下文段落较长,CLASSIC 布局下反思位于上下文之前,每换一轮都要重新计算整段上下文。
+
+两种模式:
+    - 离线模拟（默认）: 按 vLLM 的方式把 prompt 切成固定大小的块,块哈希链式依赖前面所有内容,
+      统计在 LRU 块缓存下命中的 token 比例
+    - --vllm-url: 把同样的 prompt 发给本地 vLLM（max_tokens=1）,从 /metrics 读取服务端前缀缓存命中率
+
+用法:
+    python benchmarks/prefix_cache.py --agent react --questions 50 --trials 3 --steps 5
+    python benchmarks/prefix_cache.py --agent cot --questions 50 --trials 3
+    python benchmarks/prefix_cache.py --vllm-url http://127.0.0.1:8000 --model Qwen2.5-7B-Instruct
+"""
+import argparse
+import hashlib
+import re
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterator
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.fewshots import WEBTHINK_SIMPLE3  # noqa: E402
+from utils.prompt import COT, REACT_REFLECT_INSTRUCTION, cot_reflect_agent_prompt  # noqa: E402
+from utils.prompt_builder import PromptLayout, cot_prompt_builder, react_prompt_builder  # noqa: E402
+
+CHARS_PER_TOKEN = 4
+
+
+# 与 agents 中的 format_agent / build_agent_prompt 保持一致,避免为了拿模板导入整个 agent 依赖链
+FORMATTERS: dict[tuple[str, PromptLayout], Callable[[str, str, str, str], str]] = {
+    ("react", PromptLayout.CLASSIC): lambda question, context, scratchpad, reflections: REACT_REFLECT_INSTRUCTION.format(
+        examples=WEBTHINK_SIMPLE3, reflections=reflections, question=question, scratchpad=scratchpad),
+    ("react", PromptLayout.PREFIX_STABLE): lambda question, context, scratchpad, reflections: react_prompt_builder(WEBTHINK_SIMPLE3).build(
+        scratchpad, reflections, question=question),
+    ("cot", PromptLayout.CLASSIC): lambda question, context, scratchpad, reflections: cot_reflect_agent_prompt.format(
+        examples=COT, reflections=reflections, context=context, question=question, scratchpad=scratchpad),
+    ("cot", PromptLayout.PREFIX_STABLE): lambda question, context, scratchpad, reflections: cot_prompt_builder(COT).build(
+        scratchpad, reflections, context=context, question=question),
+}
+
+
+def load_questions(n: int) -> list[tuple[str, str]]:
+    """优先使用数据集中的 (问题, 支撑段落),数据集不可用时生成合成数据"""
+    try:
+        from utils.dataset import load_hotpot
+        hotpot = load_hotpot()
+        return list(zip(hotpot["question"][:n], hotpot["supporting_paragraphs"][:n]))
+    except Exception:
+        return [
+            (f"What year was the company founded by the author of Synthetic Book {i}?", f"Synthetic Book {i} is a novel. " * 60)
+            for i in range(n)
+        ]
+
+
+def trajectory(question: str, context: str, trials: int, steps: int) -> Iterator[tuple[str, str, str, str]]:
+    """按调用顺序产出 (question, context, scratchpad, reflections)"""
+    reflections: list[str] = []
+    for trial in range(1, trials + 1):
+        reflections_str = ""
+        if reflections:
+            reflections_str = "You have attempted to answer following question before and failed. The following reflection(s) give a plan to avoid failing to answer the question in the same way you did previously.\nReflections:\n" + "\n".join(f"- {r}" for r in reflections)
+        scratchpad = ""
+        for step in range(1, steps + 1):
+            scratchpad += f"\nThought {step}:"
+            yield question, context, scratchpad, reflections_str
+            scratchpad += f" I need to search entity {step} of trial {trial}.\nAction {step}:"
+            yield question, context, scratchpad, reflections_str
+            scratchpad += f" Search[Entity {step}]\nObservation {step}: Entity {step} is a synthetic page used for trial {trial}."
+        reflections.append(f"In trial {trial} I searched the wrong entities; next time I will search the bridge entity first.")
+
+
+class BlockPrefixCache:
+    """模拟 vLLM 的 automatic prefix caching: 块哈希 = hash(前一个块哈希, 当前块内容),LRU 淘汰"""
+
+    def __init__(self, block_chars: int, capacity_blocks: int):
+        self.block_chars = block_chars
+        self.capacity_blocks = capacity_blocks
+        self.blocks: OrderedDict[bytes, None] = OrderedDict()
+        self.query_tokens = 0
+        self.hit_tokens = 0
+
+    def query(self, prompt: str) -> None:
+        parent = b""
+        hit = True
+        # 只有完整的块才能被缓存,最后不满一块的部分总要重新计算
+        full = len(prompt) - len(prompt) % self.block_chars
+        for start in range(0, full, self.block_chars):
+            parent = hashlib.blake2b(parent + prompt[start:start + self.block_chars].encode(), digest_size=16).digest()
+            if hit and parent in self.blocks:
+                self.blocks.move_to_end(parent)
+                self.hit_tokens += self.block_chars // CHARS_PER_TOKEN
+            else:
+                hit = False
+                self.blocks[parent] = None
+                if len(self.blocks) > self.capacity_blocks:
+                    self.blocks.popitem(last=False)
+        self.query_tokens += len(prompt) // CHARS_PER_TOKEN
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hit_tokens / self.query_tokens if self.query_tokens else 0.0
+
+
+def interleaved_prompts(args: argparse.Namespace, layout: PromptLayout, questions: list[tuple[str, str]]) -> Iterator[str]:
+    """按 runner 的并发方式交错产出多道题的 prompt"""
+    fmt = FORMATTERS[(args.agent, layout)]
+    steps = 1 if args.agent == "cot" else args.steps
+    for batch_start in range(0, len(questions), args.concurrency):
+        batch = questions[batch_start:batch_start + args.concurrency]
+        iters = [trajectory(question, context, args.trials, steps) for question, context in batch]
+        while iters:
+            for it in list(iters):
+                item = next(it, None)
+                if item is None:
+                    iters.remove(it)
+                else:
+                    yield fmt(*item)
+
+
+def simulate(args: argparse.Namespace, questions: list[tuple[str, str]]) -> None:
+    for layout in PromptLayout:
+        cache = BlockPrefixCache(args.block_tokens * CHARS_PER_TOKEN, args.cache_blocks)
+        calls = 0
+        for prompt in interleaved_prompts(args, layout, questions):
+            cache.query(prompt)
+            calls += 1
+        print(f"{layout.value:<14} calls={calls} prompt_tokens={cache.query_tokens} cached_tokens={cache.hit_tokens} hit_rate={cache.hit_rate:.1%}")
+
+
+METRIC_PATTERN = re.compile(r"^(vllm:[a-z_]+)(?:\{[^}]*\})?\s+([0-9.eE+-]+)$", re.MULTILINE)
+
+
+def scrape_metrics(base_url: str) -> dict[str, float]:
+    import requests
+    text = requests.get(f"{base_url}/metrics", timeout=10).text
+    metrics: dict[str, float] = {}
+    for name, value in METRIC_PATTERN.findall(text):
+        metrics[name] = metrics.get(name, 0.0) + float(value)
+    return metrics
+
+
+def run_vllm(args: argparse.Namespace, questions: list[tuple[str, str]]) -> None:
+    import requests
+
+    for layout in PromptLayout:
+        before = scrape_metrics(args.vllm_url)
+        calls = 0
+        with requests.Session() as session:
+            for prompt in interleaved_prompts(args, layout, questions):
+                session.post(
+                    f"{args.vllm_url}/v1/completions",
+                    json={"model": args.model, "prompt": prompt, "max_tokens": 1, "temperature": 0},
+                    timeout=60,
+                ).raise_for_status()
+                calls += 1
+        after = scrape_metrics(args.vllm_url)
+
+        # vLLM V1 暴露 token 级计数器; 旧版本只有瞬时的 gpu_prefix_cache_hit_rate
+        queries = after.get("vllm:prefix_cache_queries_total", 0.0) - before.get("vllm:prefix_cache_queries_total", 0.0)
+        hits = after.get("vllm:prefix_cache_hits_total", 0.0) - before.get("vllm:prefix_cache_hits_total", 0.0)
+        if queries:
+            print(f"{layout.value:<14} calls={calls} query_tokens={queries:.0f} hit_tokens={hits:.0f} hit_rate={hits / queries:.1%}")
+        else:
+            print(f"{layout.value:<14} calls={calls} gpu_prefix_cache_hit_rate={after.get('vllm:gpu_prefix_cache_hit_rate', float('nan')):.1%}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="prompt 布局的 KV 前缀缓存命中率对比")
+    parser.add_argument("--agent", default="react", choices=["react", "cot"])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=5, help="ReAct 每轮的步数（CoT 固定为 1）")
+    parser.add_argument("--concurrency", type=int, default=10, help="同时交错进行的题目数")
+    parser.add_argument("--block-tokens", type=int, default=16, help="模拟的 KV 块大小（token）")
+    parser.add_argument("--cache-blocks", type=int, default=20000, help="模拟的 KV 缓存容量（块）")
+    parser.add_argument("--vllm-url", default=None, help="本地 vLLM 地址,例如 http://127.0.0.1:8000")
+    parser.add_argument("--model", default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    questions = load_questions(args.questions)
+    if args.vllm_url:
+        run_vllm(args, questions)
+    else:
+        simulate(args, questions)
@@ -0,0 +1,146 @@
+"""
+用本地模拟服务压测完整的 ReAct-Reflexion agent 循环
+
+在同一个事件循环里启动 mock_llm_server,然后以给定并发跑 N 道题,
+统计整体吞吐、单题延迟分位数,以及 agent 自身的调度开销（单题耗时 - LLM 调用耗时）。
+
+用法:
+    python benchmarks/react_load.py --questions 300 --concurrency 100 --ttft-median 0.2 --rate-429 0.02
+    python benchmarks/react_load.py --search-steps 2 --step-mode fused
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mock_llm_server import MockConfig, MockScript, start_server  # noqa: E402
+
+from agents.react_reflect_agent import ReflectionType, run_react_reflect_agent  # noqa: E402
+from utils.llms import create_llm_invoker  # noqa: E402
+from utils.rate_limit import EndpointLimiter  # noqa: E402
+from utils.string_utils import StepMode  # noqa: E402
+from utils.loop_monitor import LoopLagMonitor  # noqa: E402
+from agents.action_runner import action_stats  # noqa: E402
+
+# 当前题目内累计的 LLM 调用耗时（每个题目在独立的 task 中运行,contextvar 互不干扰）
+llm_time: contextvars.ContextVar[list[float]] = contextvars.ContextVar("llm_time")
+
+
+def timed(invoker):
+    async def ainvoke(prompt: str) -> str:
+        start = time.perf_counter()
+        try:
+            return await invoker(prompt)
+        finally:
+            llm_time.get().append(time.perf_counter() - start)
+    return ainvoke
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    from langchain_openai import ChatOpenAI
+
+    script = MockScript(
+        actions=["Search[{entity}]"] * args.search_steps + ["Finish[{entity}]"],
+        judge="True" if args.judge_correct else "False",
+    )
+    config = MockConfig(
+        ttft_median=args.ttft_median,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        script=script,
+    )
+    server, base_url = await start_server(config)
+
+    llm = ChatOpenAI(api_key="EMPTY", base_url=base_url, model="mock-llm", max_retries=0)  # type: ignore
+    limiter = EndpointLimiter(initial_concurrency=args.concurrency, max_retries=8, backoff_base=0.2) if args.limiter else None
+    invoker = timed(create_llm_invoker(llm, limiter=limiter))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    overheads: list[float] = []
+    calls: list[int] = []
+    failures = 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            llm_time.set([])
+            start = time.perf_counter()
+            try:
+                await run_react_reflect_agent(
+                    question=f"What is the founding year of Mock Company {i}?",
+                    # 与脚本回答不同的标准答案会绕过本地判题,走 judge LLM
+                    key="Mock Company" if args.judge_correct else "Another Answer",
+                    llm=invoker,
+                    check_llm=invoker,
+                    strategy=ReflectionType(args.strategy),
+                    max_steps=args.max_steps,
+                    trials_n=args.trials,
+                    step_mode=StepMode(args.step_mode),
+                )
+            except Exception:
+                failures += 1
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            overheads.append(elapsed - sum(llm_time.get()))
+            calls.append(len(llm_time.get()))
+
+    loop_monitor = LoopLagMonitor().start()
+    start = time.perf_counter()
+    # agent 内部大量 rich 打印,压测时默认丢弃
+    with contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext():
+        await asyncio.gather(*(one(i) for i in range(args.questions)))
+    wall = time.perf_counter() - start
+    await loop_monitor.stop()
+
+    server_stats = server.app["stats"].to_dict()
+    await server.cleanup()
+
+    print(f"questions={args.questions} concurrency={args.concurrency} wall={wall:.2f}s throughput={args.questions / wall:.1f} q/s failures={failures}")
+    print(f"latency  p50={percentile(latencies, 0.5):.3f}s p90={percentile(latencies, 0.9):.3f}s p99={percentile(latencies, 0.99):.3f}s max={max(latencies):.3f}s")
+    print(f"overhead mean={statistics.mean(overheads) * 1000:.1f}ms p99={percentile(overheads, 0.99) * 1000:.1f}ms (单题耗时 - LLM 耗时)")
+    print(f"llm calls per question mean={statistics.mean(calls):.1f}")
+    print(f"server {server_stats}")
+    if limiter is not None:
+        print(f"limiter {limiter.stats()}")
+    print(f"docstore actions {action_stats.stats()}")
+    print(f"event loop lag {loop_monitor.stats()}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ReAct agent 本地压测")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--strategy", default=ReflectionType.REFLEXION.value, choices=[t.value for t in ReflectionType])
+    parser.add_argument("--max-steps", type=int, default=7)
+    parser.add_argument("--step-mode", default=StepMode.SEPARATE.value, choices=[m.value for m in StepMode])
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--search-steps", type=int, default=0, help="Finish 之前的 Search 步数（会访问 docstore）")
+    parser.add_argument("--judge-correct", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--ttft-median", type=float, default=0.2)
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--limiter", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--quiet", action=argparse.BooleanOptionalAction, default=True)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
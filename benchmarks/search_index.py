@@ -0,0 +1,103 @@
+"""
+本地搜索索引的构建耗时和查询延迟
+
+默认生成一个几十万标题的合成语料（标题由随机词组成,正文包含标题词和随机词）,
+分别测量 精确标题 / 拼写错误的标题 / 只有正文关键词 三类查询的延迟,以及拼写错误查询的解析准确率。
+--dataset 时改用 HotpotQA 样本 context 编译的离线 docstore。
+
+用法:
+    python benchmarks/search_index.py --titles 300000 --queries 2000
+    python benchmarks/search_index.py --dataset
+"""
+import argparse
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agents.search_index import SearchIndex  # noqa: E402
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> tuple[list[str], list[str]]:
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(20000)]
+    titles, texts = [], []
+    seen: set[str] = set()
+    while len(titles) < n:
+        title = " ".join(w.capitalize() for w in rng.sample(words, rng.randint(1, 4)))
+        if title in seen:
+            continue
+        seen.add(title)
+        titles.append(title)
+        texts.append(f"{title} is " + " ".join(rng.choices(words, k=60)) + ".")
+    return titles, texts
+
+
+def typo(text: str, rng: random.Random) -> str:
+    i = rng.randrange(len(text))
+    op = rng.choice(["drop", "swap", "replace"])
+    if op == "drop":
+        return text[:i] + text[i + 1:]
+    if op == "swap" and i + 1 < len(text):
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+def measure(fn, queries: list[str]) -> tuple[list[float], list]:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def report(name: str, latencies: list[float]) -> None:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+    print(f"{name:<8} mean={statistics.mean(latencies) * 1e3:.3f}ms p50={statistics.median(latencies) * 1e3:.3f}ms p99={p99 * 1e3:.3f}ms")
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.dataset:
+        from agents.offline_docstore import open_offline_docstore
+
+        pages = list(open_offline_docstore().pages())
+        titles, texts = [t for t, _ in pages], [c for _, c in pages]
+    else:
+        titles, texts = synthetic_corpus(args.titles)
+
+    start = time.perf_counter()
+    index = SearchIndex(titles, texts)
+    print(f"titles={len(index)} build={time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(1)
+    sample = rng.sample(range(len(titles)), min(args.queries, len(titles)))
+    exact_queries = [titles[i].lower() for i in sample]
+    typo_queries = [typo(titles[i], rng) for i in sample]
+    # 正文中的两个随机词（不含标题词）
+    body_queries = [" ".join(rng.sample(texts[i].split()[-60:], 2)) for i in sample]
+
+    report("exact", measure(index.search, exact_queries)[0])
+    latencies, results = measure(index.search, typo_queries)
+    report("typo", latencies)
+    resolved = sum(1 for i, hits in zip(sample, results) if hits and hits[0].title == titles[i])
+    print(f"typo top-1 accuracy={resolved / len(sample):.1%}")
+    report("bm25", measure(index.bm25, body_queries)[0])
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="本地搜索索引基准")
+    parser.add_argument("--titles", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dataset", action="store_true", help="使用 HotpotQA 样本编译的离线 docstore")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
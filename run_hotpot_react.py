@@ -1,59 +1,133 @@
-import joblib
-import pandas as pd
-import numpy as np
-
-import json
-from pathlib import Path
+from functools import cache
 import asyncio
-
-
-from agents.react_reflect_agent import ReflectionType, run_react_reflect_agent
-from utils.llms import create_llm_invoker, local_llm, openai_llm
+from typing import Any, Awaitable, Callable
+
+
+from agents.react_reflect_agent import ReflectionType, run_react_reflect_agent, run_react_reflect_sweep
+from agents.action_runner import DocstoreBackend, configure_docstore
+from agents.docstore_cache import get_docstore_cache
+from agents.action_runner import action_stats
+from agents.search_index import index_stats
+from agents.prefetch import prefetch_stats
+from utils.dataset import HOTPOT_SAMPLE_FILE
+from utils.llms import create_llm_invoker, get_local_llm, get_openai_llm
+from utils.llm_cache import LLMCache
+from utils.singleflight import SingleFlight
+from utils.rate_limit import EndpointLimiter
+from utils.judge import JudgeConfig, VerdictCache, configure_judge
+from utils.sharding import ShardChannel
+from utils.runner import HotpotRunner, RunnerConfig
+from utils.prompt_builder import PromptLayout
+from utils.string_utils import StepMode
+from utils.streaming import StreamReport
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 max_steps = 7
 trials_n = 5
 strategy = ReflectionType.LAST_ATTEMPT_AND_REFLEXION
+# 🧱 PREFIX_STABLE: 按变化频率排列 prompt 各部分,提高服务端 KV 前缀缓存命中率
+prompt_layout = PromptLayout.CLASSIC
+# 🔗 FUSED: 每步一次补全同时生成 Thought 和 Action（配合 use_stream_stop 在 Observation 处停止生成）
+step_mode = StepMode.SEPARATE
+# 📚 OFFLINE: 使用数据集 context 编译的离线 docstore,不访问维基百科（结果可复现,适合离线评测）
+docstore_backend = DocstoreBackend.WIKIPEDIA
+# 💾 在线搜索结果缓存到 cache/docstore_cache.sqlite,跨题目、跨 trial、跨进程复用
+# 🎯 use_index: Search 未命中时用本地索引（标题模糊匹配 + BM25）直接解析或给出更准确的 Similar 列表
+docstore_use_index = False
+# 🔎 lookup_engine: Lookup 返回下一个匹配关键词的句子（分句缓存 + 批量模糊打分）
+docstore_lookup_engine = False
+# 🔮 prefetch: LLM 思考期间在后台预取问题实体 / Thought 实体 / Similar 列表（只对在线后端生效）
+docstore_prefetch = False
+configure_docstore(docstore_backend, use_cache=True, use_index=docstore_use_index, lookup_engine=docstore_lookup_engine, prefetch=docstore_prefetch)
+
+# 🍴 扫描模式: 非空时在同一进程中运行这些策略（忽略 strategy）,共享 LLM 客户端、缓存和 docstore;
+# 每道题的第一轮（到第一次答错为止）只运行一次,之后再按策略分叉
+sweep_strategies: list[ReflectionType] = []
+run_strategies = sweep_strategies or [strategy]
+
+
+def output_file(s: ReflectionType, suffix: str) -> str:
+    return f"output/hotpot_react_reflexion_{s.value}_4o_mini_nostop{suffix}"
+
+
+log_file = output_file(strategy, ".log") if not sweep_strategies else "output/hotpot_react_reflexion_sweep_4o_mini_nostop.log"
+# 以下按策略区分（路径由 output_file 给出）: records_file（.json）为最终导出的 JSON 数组,
+# 📝 results_file（.jsonl）每完成一道题追加一行 JSONL（批量 fsync）,运行结束时再导出为 records_file; 用量汇总写入 _usage.json
+# ⏯️ 续跑: 跳过所有策略的 results_file 中都已经成功完成的题目 id; 设为 False 则清空重跑
+resume = True
+# 📖 也可以是官方发布的 HotpotQA .json / .jsonl,此时边流式读取边运行,不加载整个数据集
+hotpot_sample_file = HOTPOT_SAMPLE_FILE
+# 🧩 多进程: 大于 1 时把待运行的题目交错分片到 num_processes 个子进程,每个子进程有自己的事件循环和 worker_num 个工作者协程,
+# 端点配额（RPM/TPM/并发上限）按进程数均分; 结果发回主进程统一写入
+num_processes = 1
+worker_num = 10
+# 🗃️ 持久化任务队列: 设置后题目写入这个 SQLite 文件（可以放在共享存储上）,任意多个 runner 进程 / 节点可以同时领取。
+# 每道题领取时持有租约并定期续期,进程退出后租约过期的题目由其他进程接手,最多尝试 job_max_attempts 次;
+# 结果随任务一起保存在队列文件中,所有题目结束后导出 records_file（此时不使用 results_file 和 num_processes）
+job_queue_file: str | None = None
+job_lease_seconds = 300
+job_max_attempts = 3
+# ⏰ 每道题的截止时间（秒,从开始运行这道题算起,包括 run_row 的重试）; 到期时取消进行中的 LLM / docstore 调用,
+# 记录已完成的部分并标记 timed_out（续跑时、任务队列中重新运行）,工作者继续下一道题; None 表示不限制（默认）
+question_timeout: float | None = None
+# ⏱️ 调度: "lpt" 先开始预测成本最高的题目,难题不会拖到最后才开始,缩短整个 run 的长尾; "fifo" 按数据集顺序。
+# 成本来自 schedule_history 中历史输出的 step_n / trials_count,没有历史的题目按问题长度和支持文章数估计;
+# 流式读取数据集时在最多 schedule_window 道题的滑动窗口内挑选成本最高的题目,读满第一个窗口后就开始分发
+# （多进程时按预测成本均衡分配到各进程）
+schedule = "lpt"
+schedule_window = 256
+schedule_history = ["output/hotpot_react_*.json", "output/hotpot_react_*.jsonl"]
+# runner 用到的数据集列
+hotpot_columns = ["id", "question", "answer", "n_supporting_titles"]
+
+# 💾 LLM 补全缓存,重跑时已经见过的 prompt 直接命中本地缓存
+llm_cache = LLMCache("cache/llm_cache.sqlite")
+# 🔀 合并并发中的相同 prompt（例如重复出现的 judge prompt）
+local_singleflight = SingleFlight()
+openai_singleflight = SingleFlight()
+# 🚦 每个端点独立限流：托管接口受 RPM/TPM 配额约束,本地 vLLM 只做自适应并发
+openai_limiter = EndpointLimiter(requests_per_minute=500, tokens_per_minute=200_000, initial_concurrency=10)
+local_limiter = EndpointLimiter(initial_concurrency=16)
+# ⚖️ 分层判题: 归一化后完全相同等明显情况本地判定,judge 结论持久化缓存
+configure_judge(JudgeConfig(verdict_cache=VerdictCache("cache/judge_verdicts.sqlite")))
+
+# ✂️ 流式提前停止: 出现 Observation（生成 Action 的调用还包括完整的 Action[...]）后立即关闭请求,不再为多余的生成付费
+use_stream_stop = False
+stream_report = StreamReport()
+
+
+@cache
+def get_llm_invokers() -> tuple[Callable[[str], Awaitable[str]], Callable[[str], Awaitable[str]], Callable[[str], Awaitable[str]]]:
+    """
+    创建 LLM 调用器(首次调用时才创建客户端)
 
-log_file = f"output/hotpot_react_reflexion_{strategy.value}_4o_mini_nostop.log"
-records_file = f"output/hotpot_react_reflexion_{strategy.value}_4o_mini_nostop.json"
-
-# alocal_llm = create_llm_invoker(local_llm, stop=["\n"])
-# aopenai_llm = create_llm_invoker(openai_llm, stop=["\n"])
-alocal_llm = create_llm_invoker(local_llm)
-aopenai_llm = create_llm_invoker(openai_llm)
-
-
-inference_llm = aopenai_llm
-check_llm = alocal_llm
-
-
-
-
-
-
-hotpot_sample_file = "data/hotpot-qa-distractor-sample.joblib"
-hotpot: pd.DataFrame = joblib.load(hotpot_sample_file).reset_index(drop=True)
-print("len(hotpot):", len(hotpot))
-hotpot['supporting_paragraphs'] = None
-for ind, row in hotpot.iterrows():
-    # 获取支持性文章标题和上下文信息
-    supporting_articles = row['supporting_facts']['title']  # 支持性文章标题列表
-    articles = row['context']['title']                     # 所有文章标题
-    sentences = row['context']['sentences']                # 所有文章句子
-
-    # 🎯 提取支持段落
-    # 对每个支持性文章,找到对应的句子并拼接成段落
-    supporting_paragraphs = []
-    for article in supporting_articles:
-        # 使用numpy where找到文章对应的句子位置
-        # 拼接该文章的所有句子形成段落
-        supporting_paragraph = ''.join(sentences[np.where(articles == article)][0])
-        supporting_paragraphs.append(supporting_paragraph)
-
-    # 用换行符连接多个支持段落
-    supporting_paragraphs = '\n\n'.join(supporting_paragraphs)
-    hotpot.at[ind, 'supporting_paragraphs'] = supporting_paragraphs
+    返回:
+        (inference_llm, action_llm, check_llm): think / reflect 使用 inference_llm,生成 Action 的调用使用 action_llm
+    """
+    alocal_llm = create_llm_invoker(get_local_llm(), cache=llm_cache, singleflight=local_singleflight, limiter=local_limiter)
+    if use_stream_stop:
+        aopenai_llm = create_llm_invoker(
+            get_openai_llm(),
+            stop=["\nObservation"],
+            stream_report=stream_report,
+            cache=llm_cache,
+            singleflight=openai_singleflight,
+            limiter=openai_limiter,
+        )
+        # 🛑 只有生成 Action 的调用在出现第一个完整的 Action[...] 时提前停止,think / reflect 只按停止词停止
+        aaction_llm = create_llm_invoker(
+            get_openai_llm(),
+            stop=["\nObservation"],
+            stop_on_action=True,
+            stream_report=stream_report,
+            cache=llm_cache,
+            singleflight=openai_singleflight,
+            limiter=openai_limiter,
+        )
+    else:
+        aopenai_llm = create_llm_invoker(get_openai_llm(), cache=llm_cache, singleflight=openai_singleflight, limiter=openai_limiter)
+        aaction_llm = aopenai_llm
+    return aopenai_llm, aaction_llm, alocal_llm
 
 
 
@@ -71,106 +145,108 @@ for ind, row in hotpot.iterrows():
     # 重试全部失败后返回None和error信息
     retry_error_callback=lambda retry_state: (None, str(retry_state.outcome))
 )
-async def run_row(row: pd.Series, ind: int):
+async def run_row(row: dict[str, Any], ind: int, deadline: float | None = None):
+    inference_llm, action_llm, check_llm = get_llm_invokers()
     # try:
     print("--------------------------------")
     print(f"🧠 问题 {ind+1} : {row['question']}") # type: ignore
     question = row['question']
     key = row['answer']
-    record = await run_react_reflect_agent(
-        id=row['id'],
-        question=question,
-        key=key,
-        llm=inference_llm,
-        check_llm=check_llm,
-        strategy=strategy,
-        max_steps=max_steps,
-        trials_n=trials_n
-    )
+    if sweep_strategies:
+        records = await run_react_reflect_sweep(
+            id=row['id'],
+            question=question,
+            key=key,
+            llm=inference_llm,
+            action_llm=action_llm,
+            check_llm=check_llm,
+            strategies=sweep_strategies,
+            max_steps=max_steps,
+            trials_n=trials_n,
+            prompt_layout=prompt_layout,
+            step_mode=step_mode,
+            deadline=deadline,
+        )
+    else:
+        records = {strategy: await run_react_reflect_agent(
+            id=row['id'],
+            question=question,
+            key=key,
+            llm=inference_llm,
+            action_llm=action_llm,
+            check_llm=check_llm,
+            strategy=strategy,
+            max_steps=max_steps,
+            trials_n=trials_n,
+            prompt_layout=prompt_layout,
+            step_mode=step_mode,
+            deadline=deadline,
+        )}
 
     log_info = ""
     log_info += f"🧠 问题 {ind+1} : {question}\n"
     log_info += f"🧠 问题 {ind+1} 的答案: {key}\n"
-    log_info += f"🧠 问题 {ind+1} 的回答: {record.answers}\n"
-    log_info += f"🧠 回答是否正确: {record.is_correct}\n"
-    log_info += f"🧠 步数: {record.step_n}\n"
-    log_info += f"🧠 反思: {record.reflections}\n"
+    for s, record in records.items():
+        prefix = f"[{s.value}] " if sweep_strategies else ""
+        log_info += f"🧠 {prefix}问题 {ind+1} 的回答: {record.answers}\n"
+        log_info += f"🧠 {prefix}回答是否正确: {record.is_correct}\n"
+        log_info += f"🧠 {prefix}步数: {record.step_n}\n"
+        if record.timed_out:
+            log_info += f"⏰ {prefix}超过截止时间,只记录了到期前完成的步骤\n"
+        log_info += f"🧠 {prefix}反思: {record.reflections}\n"
+        log_info += f"🧠 {prefix}用量: {record.usage.get('prompt_tokens')} prompt tokens, {record.usage.get('completion_tokens')} completion tokens, ${record.usage.get('cost_usd', 0):.5f}\n"
     log_info += "\n"
-    return record, log_info
-
-async def worker(worker_id: int,
-                queue: asyncio.Queue,
-                answer_records: list,
-                all_logs: list,
-                records_file: str):
-    """
-    🤖 工作者协程
-    """
-    while True:
-        try:
-            # 从队列获取任务
-            ind, row = await queue.get()
-
-            # 处理任务
-            record, log_info = await run_row(row, ind)
-
-            # 更新结果
-            answer_records.append(record)
-            all_logs.append(log_info)
-
-            # 保存进度
-            records_json = [r.model_dump() if r is not None else {"error": "处理失败"}
-                          for r in answer_records]
-            with open(records_file, "w", encoding="utf-8") as f:
-                json.dump(records_json, f, ensure_ascii=False, indent=2)
-
-            print(f"[green]✅ 工作者{worker_id}完成第{ind+1}条数据[/green]")
-
-            # 标记任务完成
-            queue.task_done()
+    return records, log_info
 
-        except asyncio.CancelledError:
-            break
-
-async def run_all():
+def print_docstore_stats(prefix: str = ""):
     """
-    🎯 主控制流程
+    打印 docstore 和流式提前停止的统计（由 runner.print_process_stats 调用）
     """
-    output_dir = Path("output")
-
-    # 共享状态
-    answer_records = []
-    all_logs = []
-
-    # 创建任务队列
-    queue = asyncio.Queue()
-
-    # 创建工作者
-    workers = []
-    worker_num = 10
-    for i in range(worker_num):
-        worker_task = asyncio.create_task(
-            worker(i, queue, answer_records, all_logs, records_file)
-        )
-        workers.append(worker_task)
-
-    # 添加所有任务到队列
-    for ind, row in hotpot.iterrows():
-        queue.put_nowait((ind, row))
-
-    # 等待所有任务完成
-    await queue.join()
+    print(f"🧵 {prefix}docstore 动作统计: {action_stats.stats()}")
+    if docstore_use_index:
+        print(f"🎯 {prefix}搜索索引统计: {index_stats.stats()}")
+    if docstore_prefetch:
+        print(f"🔮 {prefix}预取统计: {prefetch_stats.stats()}")
+    if docstore_backend == DocstoreBackend.WIKIPEDIA:
+        print(f"📚 {prefix}docstore 缓存统计: {get_docstore_cache().stats()}")
+    if use_stream_stop:
+        print(f"✂️ {prefix}流式提前停止统计: {stream_report.stats()}")
+
+
+runner = HotpotRunner(
+    RunnerConfig(
+        log_file=log_file,
+        max_steps=max_steps,
+        hotpot_sample_file=hotpot_sample_file,
+        hotpot_columns=hotpot_columns,
+        resume=resume,
+        num_processes=num_processes,
+        worker_num=worker_num,
+        job_queue_file=job_queue_file,
+        job_lease_seconds=job_lease_seconds,
+        job_max_attempts=job_max_attempts,
+        question_timeout=question_timeout,
+        schedule=schedule,
+        schedule_window=schedule_window,
+        schedule_history=schedule_history,
+    ),
+    strategies=run_strategies,
+    run_row=run_row,
+    output_file=output_file,
+    # 记录转成 dict,既可以直接写入结果文件,也可以发回主进程
+    to_record=lambda record: record.model_dump(),
+    llm_cache=llm_cache,
+    singleflights={"local": local_singleflight, "openai": openai_singleflight},
+    limiters={"local": local_limiter, "openai": openai_limiter},
+    extra_stats=print_docstore_stats,
+    sweep=bool(sweep_strategies),
+)
 
-    # 取消所有工作者
-    for w in workers:
-        w.cancel()
-    await asyncio.gather(*workers, return_exceptions=True)
 
-    # 保存最终日志
-    with open(log_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(all_logs))
-    print(f"[green]✅ 已保存log到{log_file}[/green]")
+def run_shard(shard_id: int, inds: list[int], channel: ShardChannel):
+    """🧩 子进程入口（spawn 启动时按名字导入,转调 runner.run_shard）"""
+    runner.run_shard(shard_id, inds, channel)
 
 
 if __name__ == "__main__":
-    asyncio.run(run_all())
+    asyncio.run(runner.run_all(run_shard))
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# 与 benchmarks 一致: 从仓库根目录导入 agents / utils
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+from utils.dataset import iter_json_array, lean_record, stream_hotpot
+
+ITEMS = [
+    {"id": "1", "text": "plain"},
+    {"id": "2", "text": "brackets ] [ and braces } { inside a string"},
+    {"id": "3", "text": "escaped \" quote, comma and \\ backslash", "nested": [1, [2, {"a": []}]]},
+    {"id": "4", "text": "unicode 中文 ✅"},
+    [],
+    "string item",
+    42,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 1 << 20])
+def test_items_split_across_chunks(chunk_size):
+    text = json.dumps(ITEMS, ensure_ascii=False, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+def test_compact_and_whitespace_heavy_layouts(chunk_size):
+    compact = json.dumps(ITEMS, separators=(",", ":"), ensure_ascii=False)
+    spaced = " \n[ \n" + " ,\n\t ".join(json.dumps(item) for item in ITEMS) + " \n]\n "
+    assert list(iter_json_array(io.StringIO(compact), chunk_size=chunk_size)) == ITEMS
+    assert list(iter_json_array(io.StringIO(spaced), chunk_size=chunk_size)) == ITEMS
+
+
+def test_number_split_at_chunk_boundary_is_not_truncated():
+    # 数字在块边界处看起来已经"完整",必须等到下一个分隔符才能确定
+    assert list(iter_json_array(io.StringIO("[12345,6]"), chunk_size=3)) == [12345, 6]
+
+
+def test_empty_array():
+    assert list(iter_json_array(io.StringIO("[]"), chunk_size=1)) == []
+
+
+@pytest.mark.parametrize("text,error", [
+    ('{"id": 1}', "顶层不是数组"),
+    ('[{"id": 1},', "不完整"),
+    ("", "不完整"),
+])
+def test_invalid_input(text, error):
+    with pytest.raises(ValueError, match=error):
+        list(iter_json_array(io.StringIO(text), chunk_size=4))
+
+
+def test_truncated_item_raises_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"id": "1", "te'), chunk_size=4))
+
+
+OFFICIAL = {
+    "_id": "5a8b57f25542995d1e6f1371",
+    "question": "Were Scott Derrickson and Ed Wood of the same nationality?",
+    "answer": "yes",
+    "type": "comparison",
+    "level": "hard",
+    "supporting_facts": [["Scott Derrickson", 0], ["Ed Wood", 0], ["Ed Wood", 1]],
+    "context": [
+        ["Ed Wood", ["Edward Davis Wood Jr. was an American filmmaker.", " He was born in 1924."]],
+        ["Scott Derrickson", ["Scott Derrickson is an American director."]],
+        ["Unrelated", ["Not used."]],
+    ],
+}
+
+
+def test_lean_record_official_format():
+    record = lean_record(OFFICIAL)
+    assert record["id"] == OFFICIAL["_id"]
+    assert record["n_supporting_titles"] == 2
+    assert record["supporting_paragraphs"] == (
+        "Scott Derrickson is an American director.\n\n"
+        "Edward Davis Wood Jr. was an American filmmaker. He was born in 1924.\n\n"
+        "Edward Davis Wood Jr. was an American filmmaker. He was born in 1924."
+    )
+    assert "context" not in record
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl"])
+def test_stream_hotpot_json_and_jsonl(tmp_path, suffix):
+    path = tmp_path / f"hotpot{suffix}"
+    second = {**OFFICIAL, "_id": "second"}
+    if suffix == ".json":
+        path.write_text(json.dumps([OFFICIAL, second]), encoding="utf-8")
+    else:
+        path.write_text(json.dumps(OFFICIAL) + "\n\n" + json.dumps(second) + "\n", encoding="utf-8")
+    assert [record["id"] for record in stream_hotpot(str(path))] == [OFFICIAL["_id"], "second"]
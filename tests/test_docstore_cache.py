@@ -0,0 +1,48 @@
+from agents.docstore_cache import CACHE_KEY_VERSION, CachedDocstore, DocstoreCache, wikipedia_title
+
+
+def test_wikipedia_title_only_first_letter_is_case_insensitive():
+    assert wikipedia_title("red Hat") == "Red Hat"
+    assert wikipedia_title("  Red_hat  ") == "Red hat"
+    assert wikipedia_title("") == ""
+
+
+def test_wikipedia_keys_keep_case_beyond_first_letter():
+    assert DocstoreCache.make_key("wikipedia", "Red Hat") == f"wikipedia:v{CACHE_KEY_VERSION}:Red Hat"
+    assert DocstoreCache.make_key("wikipedia", "red_Hat") == DocstoreCache.make_key("wikipedia", "Red Hat")
+    assert DocstoreCache.make_key("wikipedia", "Red hat") != DocstoreCache.make_key("wikipedia", "Red Hat")
+
+
+def test_offline_keys_are_case_insensitive():
+    assert DocstoreCache.make_key("offline", "Red_HAT") == f"offline:v{CACHE_KEY_VERSION}:red hat"
+    assert DocstoreCache.make_key("offline", "red hat") == DocstoreCache.make_key("offline", "Red Hat")
+
+
+def test_namespaces_do_not_share_keys():
+    assert DocstoreCache.make_key("offline", "Nile") != DocstoreCache.make_key("wikipedia", "Nile")
+
+
+class FakeDocstore:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def search(self, search: str) -> str:
+        self.calls.append(search)
+        return f"Could not find [{search}]. Similar: ['Nile River']"
+
+
+def test_cached_docstore_hits_and_rebuilds_similar_message(tmp_path):
+    cache = DocstoreCache(str(tmp_path / "docstore.sqlite"))
+    docstore = FakeDocstore()
+    cached = CachedDocstore(docstore, cache, "offline")
+
+    assert cached.search("nile") == "Could not find [nile]. Similar: ['Nile River']"
+    # 离线 namespace 不区分大小写: 命中缓存,提示中使用本次的搜索词
+    assert cached.search("NILE") == "Could not find [NILE]. Similar: ['Nile River']"
+    assert docstore.calls == ["nile"]
+
+    # 新的实例（另一个进程）从 SQLite 层命中
+    fresh = CachedDocstore(docstore, DocstoreCache(str(tmp_path / "docstore.sqlite")), "offline")
+    fresh.search("Nile")
+    assert docstore.calls == ["nile"]
+    assert fresh.cache.stats()["store_hits"] == 1
@@ -0,0 +1,109 @@
+import pytest
+
+from utils import job_queue
+from utils.job_queue import SqliteJobQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可以手动拨动的墙上时钟（租约过期按 time.time() 判断）"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(job_queue.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "queue" / "jobs.sqlite")
+
+
+def open_queue(path: str, owner: str, **kwargs) -> SqliteJobQueue:
+    return SqliteJobQueue(path, lease_seconds=kwargs.pop("lease_seconds", 60), max_attempts=kwargs.pop("max_attempts", 2), owner=owner, **kwargs)
+
+
+def test_enqueue_is_idempotent(path):
+    jobs = open_queue(path, "a")
+    assert jobs.enqueue([("1", {"n": 1}), ("2", {"n": 2})]) == 2
+    assert jobs.enqueue([("2", {"n": 20}), ("3", {"n": 3})]) == 1
+    leased = jobs.lease(10)
+    assert [(job.id, job.payload) for job in leased] == [("1", {"n": 1}), ("2", {"n": 2}), ("3", {"n": 3})]
+
+
+def test_lease_is_exclusive_between_owners(path, clock):
+    a, b = open_queue(path, "a"), open_queue(path, "b")
+    a.enqueue([("1", {}), ("2", {})])
+    assert [job.id for job in a.lease(1)] == ["1"]
+    assert [job.id for job in b.lease(5)] == ["2"]
+    assert a.lease(1) == [] and b.lease(1) == []
+    assert not a.drained()
+
+
+def test_expired_lease_is_taken_over(path, clock):
+    a, b = open_queue(path, "a"), open_queue(path, "b")
+    a.enqueue([("1", {})])
+    assert a.lease(1)[0].attempts == 1
+
+    clock[0] += 30
+    assert b.lease(1) == []     # 租约未过期
+    clock[0] += 31
+    job = b.lease(1)[0]
+    assert (job.id, job.attempts) == ("1", 2)
+    assert b.expired == 1
+
+    # 原持有者的结果不再写入,以新的持有者为准
+    assert not a.complete("1", {"from": "a"})
+    assert b.complete("1", {"from": "b"})
+    assert list(a.results()) == [("1", "done", {"from": "b"}, None)]
+    assert a.drained()
+
+
+def test_heartbeat_extends_lease(path, clock):
+    a, b = open_queue(path, "a"), open_queue(path, "b")
+    a.enqueue([("1", {})])
+    a.lease(1)
+    clock[0] += 50
+    assert a.heartbeat() == 1
+    clock[0] += 50
+    assert b.lease(1) == []
+    clock[0] += 11
+    assert [job.id for job in b.lease(1)] == ["1"]
+
+
+def test_expired_lease_without_attempts_left_fails(path, clock):
+    a, b = open_queue(path, "a", max_attempts=1), open_queue(path, "b", max_attempts=1)
+    a.enqueue([("1", {})])
+    a.lease(1)
+    clock[0] += 61
+    assert b.lease(1) == []
+    assert list(b.results()) == [("1", "failed", None, "lease expired")]
+    assert b.drained()
+
+
+def test_fail_requeues_until_attempts_run_out(path, clock):
+    jobs = open_queue(path, "a", max_attempts=2)
+    jobs.enqueue([("1", {})])
+    jobs.lease(1)
+    assert jobs.fail("1", "boom") is False
+    assert jobs.counts()["pending"] == 1
+    jobs.lease(1)
+    assert jobs.fail("1", "boom again", {"partial": True}) is True
+    assert list(jobs.results()) == [("1", "failed", {"partial": True}, "boom again")]
+
+    assert jobs.retry_failed() == 1
+    assert jobs.lease(1)[0].attempts == 1
+
+
+def test_fail_by_non_owner_is_ignored(path, clock):
+    a, b = open_queue(path, "a"), open_queue(path, "b")
+    a.enqueue([("1", {})])
+    a.lease(1)
+    assert b.fail("1", "not mine") is False
+    assert a.counts()["leased"] == 1
+
+
+def test_results_follow_enqueue_order(path, clock):
+    jobs = open_queue(path, "a")
+    jobs.enqueue([(str(i), {}) for i in range(3)])
+    for job in reversed(jobs.lease(3)):
+        jobs.complete(job.id, int(job.id))
+    assert [(id, result) for id, _, result, _ in jobs.results()] == [("0", 0), ("1", 1), ("2", 2)]
@@ -0,0 +1,71 @@
+import pytest
+
+from utils import kv_store
+from utils.kv_store import SqliteKVStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """单调递增的访问时间,LRU 顺序不依赖系统时钟精度"""
+    now = [0.0]
+
+    def tick() -> float:
+        now[0] += 1.0
+        return now[0]
+
+    monkeypatch.setattr(kv_store.time, "time", tick)
+    return now
+
+
+def test_get_set_delete(tmp_path):
+    store = SqliteKVStore(str(tmp_path / "kv" / "store.sqlite"))
+    assert store.get("a") is None
+    store.set("a", b"1")
+    store.set("a", b"22")
+    assert store.get("a") == b"22"
+    assert len(store) == 1
+    store.delete("a")
+    assert store.get("a") is None and store.size_bytes == 0
+
+
+def test_evicts_least_recently_accessed_down_to_90_percent(tmp_path, clock):
+    store = SqliteKVStore(str(tmp_path / "store.sqlite"), max_bytes=100)
+    for key in "abcde":
+        store.set(key, b"x" * 20)
+    # 读取 a 之后,最久未访问的是 b
+    assert store.get("a") is not None
+    store.set("f", b"x" * 20)
+
+    assert store.get("b") is None and store.get("c") is None
+    assert all(store.get(key) is not None for key in "adef")
+    assert store.size_bytes == 80 <= 90
+
+
+def test_overwriting_a_key_does_not_inflate_size(tmp_path, clock):
+    store = SqliteKVStore(str(tmp_path / "store.sqlite"), max_bytes=100)
+    store.set("other", b"x" * 40)
+    for _ in range(20):
+        store.set("k", b"y" * 40)
+    assert store.size_bytes == 80
+    # 反复覆盖不会提前触发淘汰
+    assert store.get("other") is not None
+    store.set("k", b"y" * 10)
+    assert store.size_bytes == 50 == store._total_size()
+
+
+def test_tables_are_independent(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    first, second = SqliteKVStore(path, table="first"), SqliteKVStore(path, table="second")
+    first.set("k", b"1")
+    assert second.get("k") is None
+
+
+def test_size_survives_reopen(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    SqliteKVStore(path).set("k", b"12345")
+    assert SqliteKVStore(path).size_bytes == 5
+
+
+def test_invalid_table_name(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteKVStore(str(tmp_path / "store.sqlite"), table="kv; DROP TABLE kv")
@@ -0,0 +1,95 @@
+import re
+
+import pytest
+from rapidfuzz import fuzz
+
+from agents.lookup_engine import LookupExplorer, context_window, find_matches, segment_page
+from agents.react_agent import search_in_document
+
+PAGE = (
+    "Milhouse Mussolini Van Houten is a recurring character in The Simpsons. "
+    "He is voiced by Pamela Hayden.\nMilhouse was named after U.S. president Richard Nixon, "
+    "whose middle name was Milhous! Is he Bart's best friend? Yes.  Trailing text"
+)
+
+
+@pytest.mark.parametrize("document", [
+    PAGE,
+    "",
+    "   ",
+    "No punctuation at all",
+    "Ends with punctuation. ",
+    "Line one\nline two.\n\nNext paragraph!\tTabbed? done",
+    "Multiple... dots. And ?! marks",
+])
+def test_segmentation_matches_baseline_split(document):
+    assert list(segment_page(document).sentences) == re.split(r"(?<=[.!?])\s+", document)
+
+
+def test_search_in_document_returns_context_around_best_match():
+    result = search_in_document(PAGE, "named after", context_length=1000)
+    assert "Milhouse was named after U.S." in result
+    assert result.startswith("Milhouse Mussolini")
+
+
+def baseline_search_in_document(document: str, search_term: str, score_threshold: int = 60) -> int | None:
+    """原来的实现: 逐句 partial_ratio,按分数稳定排序后取第一个"""
+    sentences = re.split(r"(?<=[.!?])\s+", document)
+    matches = [(idx, score) for idx, sentence in enumerate(sentences)
+               if (score := fuzz.partial_ratio(search_term.lower(), sentence.lower())) >= score_threshold]
+    matches.sort(key=lambda x: x[1], reverse=True)
+    return matches[0][0] if matches else None
+
+
+def test_search_in_document_breaks_near_ties_like_baseline():
+    # 两句的分数分别约为 93.75 和 94.12,取整后相同; 必须选中分数更高的第二句
+    document = "Intro. Name afer nixon he niksen. Was named after nixo president afer president. Outro one. Outro two. Outro three."
+    best = baseline_search_in_document(document, "named after nixon")
+    assert best == 2
+    sentences = re.split(r"(?<=[.!?])\s+", document)
+    assert search_in_document(document, "named after nixon") == " ".join(sentences[best - 2:best + 3])
+
+
+def test_search_in_document_no_match():
+    assert search_in_document(PAGE, "xyzzy quux") == "<NO RELEVANT CONTENT>"
+
+
+def test_context_window_truncates_at_sentence_end():
+    page = segment_page("One two three. Four five six. Seven eight nine.")
+    assert context_window(page, 0, max_length=20) == "One two three."
+    assert context_window(page, 0, max_length=5) == "One t..."
+
+
+def test_find_matches_includes_exact_substrings_in_document_order():
+    page = segment_page(PAGE)
+    assert find_matches(page, "milhouse", score_threshold=100) == [0, 2]
+
+
+class FakeDocument:
+    def __init__(self, page_content: str):
+        self.page_content = page_content
+
+
+class FakeExplorer:
+    def __init__(self):
+        self.document: FakeDocument | None = None
+        self.docstore = object()
+
+    def search(self, term: str) -> str:
+        self.document = FakeDocument(PAGE)
+        return PAGE
+
+
+def test_lookup_explorer_cursor():
+    explorer = LookupExplorer(FakeExplorer(), score_threshold=100)
+    with pytest.raises(ValueError):
+        explorer.lookup("Milhouse")
+    explorer.search("Milhouse")
+    assert explorer.lookup("Milhouse").startswith("(Result 1/2) Milhouse Mussolini")
+    assert explorer.lookup("milhouse").startswith("(Result 2/2) Milhouse was named after")
+    assert explorer.lookup("Milhouse") == "No More Results"
+    assert explorer.lookup("xyzzy") == "No Results"
+
+    # 新的 Search 重置游标
+    explorer.search("Milhouse")
+    assert explorer.lookup("Milhouse").startswith("(Result 1/2)")
@@ -0,0 +1,51 @@
+import pytest
+
+from agents import offline_docstore
+from agents.offline_docstore import OfflineDocstore, build_offline_docstore, normalize_title
+
+PAGES = [
+    ("Ed Wood", "Edward Davis Wood Jr. was an American filmmaker."),
+    ("Scott Derrickson", "Scott Derrickson is an American director."),
+    ("ed_wood", "A duplicate title, ignored."),
+    ("Nile", "The Nile is a river in Africa."),
+    ("Doctor Strange (2016 film)", "A superhero film."),
+]
+
+
+def test_normalize_title():
+    assert normalize_title("  Doctor_Strange  (2016 film) ") == "doctor strange (2016 film)"
+
+
+def test_lookup_is_case_and_underscore_insensitive(tmp_path):
+    meta = build_offline_docstore(PAGES, str(tmp_path))
+    docstore = OfflineDocstore(str(tmp_path))
+    assert meta["pages"] == len(docstore) == 4
+    assert docstore.get("ED_WOOD") == PAGES[0]
+    assert docstore.get("doctor strange (2016 film)") == PAGES[4]
+    assert docstore.get("Missing Page") is None
+    assert docstore.titles() == ["Ed Wood", "Scott Derrickson", "Nile", "Doctor Strange (2016 film)"]
+
+
+@pytest.mark.parametrize("colliding_hash", [1, 15, 2**64 - 1])
+def test_linear_probing_with_colliding_hashes(tmp_path, monkeypatch, colliding_hash):
+    # 所有标题的哈希相同: 全部落在同一个槽位,查找依赖线性探测和标题比较（包括从表尾回绕到表头）
+    monkeypatch.setattr(offline_docstore, "title_hash", lambda title: colliding_hash)
+    build_offline_docstore(PAGES, str(tmp_path))
+    docstore = OfflineDocstore(str(tmp_path))
+    for title, content in [PAGES[0], PAGES[1], PAGES[3], PAGES[4]]:
+        assert docstore.get(title) == (title, content)
+    assert docstore.get("Missing Page") is None
+
+
+def test_load_factor_at_most_half(tmp_path):
+    pages = [(f"Page {i}", "x") for i in range(100)]
+    meta = build_offline_docstore(pages, str(tmp_path))
+    assert meta["capacity"] >= 2 * meta["pages"]
+    assert meta["capacity"] & (meta["capacity"] - 1) == 0
+
+
+def test_empty_docstore(tmp_path):
+    build_offline_docstore([], str(tmp_path))
+    docstore = OfflineDocstore(str(tmp_path))
+    assert len(docstore) == 0
+    assert docstore.get("Anything") is None
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import Future
+
+from agents import prefetch
+from agents.action_runner import run_docstore_action
+from agents.prefetch import PrefetchingExplorer, PrefetchStats
+
+
+class PendingExecutor:
+    """提交的预取永远不开始执行,之后总是可以取消"""
+
+    def submit(self, fn, *args) -> Future:
+        return Future()
+
+
+class FakeDocstore:
+    def search(self, term: str) -> str:
+        return f"page {term}"
+
+
+class FakeExplorer:
+    def __init__(self):
+        self.docstore = FakeDocstore()
+        self.document = None
+
+    def search(self, term: str) -> str:
+        self.document = term
+        return self.docstore.search(term)
+
+    def lookup(self, term: str) -> str:
+        return "No Results"
+
+
+def test_search_between_prefetch_rounds_keeps_round_bookkeeping(monkeypatch):
+    monkeypatch.setattr(prefetch, "prefetch_stats", PrefetchStats())
+    monkeypatch.setattr(prefetch, "get_prefetch_executor", PendingExecutor)
+    explorer = PrefetchingExplorer(FakeExplorer())
+
+    assert explorer.prefetch(["Alpha", "Beta"]) == 2
+    # Search 在分叉副本上执行,写回时不能丢掉上一轮的预取记录
+    assert asyncio.run(run_docstore_action(explorer, "search", "Gamma")) == "page Gamma"
+    assert explorer.document == "Gamma"
+    assert explorer._searched == {"Gamma"}
+
+    # 新一轮候选只有 Delta: 上一轮还没执行的 Alpha 和 Beta 被取消
+    assert explorer.prefetch(["Delta", "Gamma"]) == 1
+    assert prefetch.prefetch_stats.cancelled == 2
+    assert list(explorer._futures) == ["Delta"]
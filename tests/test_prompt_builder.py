@@ -0,0 +1,71 @@
+from collections import Counter
+
+import pytest
+
+from agents.cot_agent import CotAgentState, CoTAgentStrategy, build_agent_prompt
+from agents.react_reflect_agent import ReactReflectAgentState, format_agent_prefix_stable_state, format_agent_state
+from utils.prompt import COT, cot_reflect_agent_prompt
+from utils.prompt_builder import PromptLayout
+
+SCRATCHPAD = "\nThought 1: I need to search Milhouse.\nAction 1: Search[Milhouse]\nObservation 1: Milhouse Mussolini Van Houten is a recurring character."
+REFLECTIONS = "You have attempted to answer following question before and failed.\nReflections:\n- Search the character first."
+
+
+def lines(prompt: str) -> Counter:
+    """两种布局的内容相同、只有顺序不同: 比较非空行的多重集合"""
+    return Counter(line for line in prompt.split("\n") if line.strip())
+
+
+@pytest.mark.parametrize("reflections", ["", REFLECTIONS])
+@pytest.mark.parametrize("scratchpad", ["", SCRATCHPAD])
+def test_react_layouts_have_same_content(reflections, scratchpad):
+    state = ReactReflectAgentState(question="Who named Milhouse?", key="Richard Nixon", scratchpad=scratchpad, reflections_str=reflections)
+    classic = format_agent_state(state)
+    prefix_stable = format_agent_prefix_stable_state(state)
+    assert lines(classic) == lines(prefix_stable)
+    assert prefix_stable.endswith(scratchpad)
+
+
+@pytest.mark.parametrize("strategy,context", [
+    (CoTAgentStrategy.COT_GT, "Milhouse was named after Richard Nixon's middle name."),
+    (CoTAgentStrategy.COT_ONLY, "Milhouse was named after Richard Nixon's middle name."),
+])
+@pytest.mark.parametrize("reflections", ["", REFLECTIONS])
+def test_cot_layouts_have_same_content(strategy, context, reflections):
+    def prompt(layout: PromptLayout) -> str:
+        state = CotAgentState(
+            question="Who named Milhouse?", context=context, key="Richard Nixon", strategy=strategy,
+            scratchpad="\nThought: Nixon.", reflections_str=reflections, prompt_layout=layout,
+        )
+        return build_agent_prompt(state)
+
+    classic, prefix_stable = prompt(PromptLayout.CLASSIC), prompt(PromptLayout.PREFIX_STABLE)
+    assert lines(classic) == lines(prefix_stable)
+
+
+@pytest.mark.parametrize("context", ["", None])
+def test_cot_empty_context_has_no_context_block_in_prefix_stable(context):
+    state = CotAgentState(question="Who named Milhouse?", context=context, key="Richard Nixon", strategy=CoTAgentStrategy.COT_GT, prompt_layout=PromptLayout.PREFIX_STABLE)
+    # few-shot 示例里也有 "Relevant Context:",只检查示例之后的部分
+    assert "Relevant Context:" not in build_agent_prompt(state).split("(End of examples)")[1]
+
+
+@pytest.mark.parametrize("context", ["", None, "Some context."])
+def test_cot_classic_layout_matches_original_template(context):
+    state = CotAgentState(
+        question="Who named Milhouse?", context=context, key="Richard Nixon", strategy=CoTAgentStrategy.COT_GT,
+        scratchpad="\nThought: Nixon.", reflections_str=REFLECTIONS,
+    )
+    expected = cot_reflect_agent_prompt.format(
+        examples=COT, context=context, reflections=REFLECTIONS, question="Who named Milhouse?", scratchpad="\nThought: Nixon.",
+    )
+    assert build_agent_prompt(state) == expected
+
+
+def test_prefix_stable_puts_question_before_reflections():
+    state = CotAgentState(
+        question="Who named Milhouse?", context="Some context.", key="Richard Nixon", strategy=CoTAgentStrategy.COT_GT,
+        reflections_str=REFLECTIONS, prompt_layout=PromptLayout.PREFIX_STABLE,
+    )
+    prompt = build_agent_prompt(state).split("(End of examples)")[1]
+    assert prompt.index("Relevant Context:") < prompt.index("Question:") < prompt.index("Reflections:")
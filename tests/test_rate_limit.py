@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from utils import rate_limit
+from utils.rate_limit import AdaptiveConcurrencyLimiter
+
+
+@pytest.fixture
+def monotonic(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def release(limiter: AdaptiveConcurrencyLimiter, latency: float | None, overloaded: bool = False) -> None:
+    limiter.inflight += 1
+    asyncio.run(limiter.release(latency, overloaded))
+
+
+def test_additive_increase_about_one_per_window():
+    limiter = AdaptiveConcurrencyLimiter(initial=4)
+    for _ in range(4):
+        release(limiter, 0.1)
+    assert 4.9 < limiter.limit < 5.0
+
+
+def test_increase_is_capped():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, max_limit=3)
+    for _ in range(100):
+        release(limiter, 0.1)
+    assert limiter.limit == 3
+
+
+def test_overload_decreases_multiplicatively_once_per_cooldown(monotonic):
+    limiter = AdaptiveConcurrencyLimiter(initial=10, decrease_factor=0.5)
+    release(limiter, None, overloaded=True)
+    assert limiter.limit == 5
+    # 同一批并发请求的失败只减一次
+    release(limiter, None, overloaded=True)
+    assert limiter.limit == 5
+    monotonic[0] += 1.0
+    release(limiter, None, overloaded=True)
+    assert limiter.limit == 2.5
+
+
+def test_decrease_respects_min_limit(monotonic):
+    limiter = AdaptiveConcurrencyLimiter(initial=2, min_limit=1, decrease_factor=0.1)
+    release(limiter, None, overloaded=True)
+    assert limiter.limit == 1
+
+
+def test_latency_spike_triggers_decrease(monotonic):
+    limiter = AdaptiveConcurrencyLimiter(initial=10, decrease_factor=0.5, latency_tolerance=2.0, latency_smoothing=0.5)
+    release(limiter, 0.1)
+    before = limiter.limit
+    release(limiter, 1.0)   # 短窗口 EWMA 0.55 > 2 × 基线
+    assert limiter.limit == before * 0.5
+
+
+def test_acquire_blocks_at_limit():
+    async def main():
+        limiter = AdaptiveConcurrencyLimiter(initial=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        await limiter.release(0.1)
+        await asyncio.wait_for(waiter, 1.0)
+        return blocked, limiter.inflight
+
+    assert asyncio.run(main()) == (True, 1)
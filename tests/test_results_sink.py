@@ -0,0 +1,57 @@
+import json
+
+from utils.results_sink import JsonlResultsSink
+
+
+def test_resume_skips_completed_but_reruns_errors_and_timeouts(tmp_path):
+    path = tmp_path / "out" / "results.jsonl"
+    sink = JsonlResultsSink(str(path))
+    sink.append({"id": "1", "answer": "a"})
+    sink.append({"id": "2", "error": "处理失败"})
+    sink.append({"id": "3", "answer": "", "timed_out": True})
+    sink.close()
+
+    resumed = JsonlResultsSink(str(path))
+    assert resumed.completed_ids() == {"1"}
+    resumed.append({"id": "2", "answer": "b"})
+    resumed.close()
+    assert resumed.completed_ids() == {"1", "2"}
+
+
+def test_resume_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"id": "1"}) + "\n" + '{"id": "2", "ans', encoding="utf-8")
+
+    sink = JsonlResultsSink(str(path))
+    sink.append({"id": "3"})
+    sink.close()
+    assert [record["id"] for record in sink.records()] == ["1", "3"]
+
+
+def test_resume_false_starts_over(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"id": "1"}) + "\n", encoding="utf-8")
+    sink = JsonlResultsSink(str(path), resume=False)
+    sink.close()
+    assert sink.completed_ids() == set()
+
+
+def test_export_keeps_latest_record_in_dataset_order(tmp_path):
+    sink = JsonlResultsSink(str(tmp_path / "results.jsonl"))
+    sink.append({"id": "b", "error": "处理失败"})
+    sink.append({"id": "a", "answer": "1"})
+    sink.append({"id": "b", "answer": "2"})
+    sink.close()
+
+    out = tmp_path / "results.json"
+    assert sink.export_json(str(out), order=["a", "b"]) == 2
+    assert json.loads(out.read_text(encoding="utf-8")) == [{"id": "a", "answer": "1"}, {"id": "b", "answer": "2"}]
+
+
+def test_fsync_is_batched(tmp_path):
+    sink = JsonlResultsSink(str(tmp_path / "results.jsonl"), fsync_every=3, fsync_interval=3600)
+    for i in range(7):
+        sink.append({"id": str(i)})
+    assert sink.fsyncs == 2
+    sink.close()
+    assert sink.fsyncs == 3
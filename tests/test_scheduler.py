@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from utils.scheduler import CostModel, QuestionScheduler, list_schedule_makespan, load_history, record_cost
+
+MAX_STEPS = 6
+
+
+def rows_with_costs(costs: list[float]) -> tuple[list[tuple[int, dict]], CostModel]:
+    rows = [(i, {"id": f"q{i}", "question": "?"}) for i in range(len(costs))]
+    return rows, CostModel({f"q{i}": cost for i, cost in enumerate(costs)})
+
+
+def test_record_cost():
+    assert record_cost({"trials_count": 1, "step_n": 3}, MAX_STEPS) == 9
+    assert record_cost({"trials_count": 1, "step_n": 3, "timed_out": True}, MAX_STEPS) == 12
+    assert record_cost({"id": "1", "error": "处理失败"}, MAX_STEPS) is None
+
+
+def test_load_history_averages_runs(tmp_path):
+    (tmp_path / "run1.json").write_text(json.dumps([{"id": "a", "trials_count": 0, "step_n": 2}]), encoding="utf-8")
+    (tmp_path / "run2.jsonl").write_text(json.dumps({"id": "a", "trials_count": 0, "step_n": 4}) + "\n", encoding="utf-8")
+    (tmp_path / "broken.json").write_text("[", encoding="utf-8")
+    assert load_history([str(tmp_path / "*.json"), str(tmp_path / "*.jsonl")], MAX_STEPS) == {"a": 3.0}
+
+
+def test_order_lpt_within_window_and_fifo():
+    rows, model = rows_with_costs([1, 5, 3, 9, 2, 8])
+    assert [ind for ind, _ in QuestionScheduler(model, "lpt", window=100).order(rows)] == [3, 5, 1, 2, 4, 0]
+    assert [ind for ind, _ in QuestionScheduler(model, "fifo", window=100).order(rows)] == [0, 1, 2, 3, 4, 5]
+
+
+def test_order_sliding_window_dispatches_before_reading_everything():
+    rows, model = rows_with_costs([1, 5, 3, 9, 2, 8])
+    read: list[int] = []
+
+    def source():
+        for ind, row in rows:
+            read.append(ind)
+            yield ind, row
+
+    order = QuestionScheduler(model, "lpt", window=2).order(source())
+    assert next(order)[0] == 1      # 窗口 {0, 1} + 新读入的 2 中成本最高的
+    assert read == [0, 1, 2]
+    assert [ind for ind, _ in order] == [3, 2, 5, 4, 0]
+
+
+def test_order_equal_costs_keep_dataset_order():
+    rows, model = rows_with_costs([2, 2, 2, 2])
+    assert [ind for ind, _ in QuestionScheduler(model, "lpt", window=3).order(rows)] == [0, 1, 2, 3]
+
+
+def test_partition_lpt_balances_predicted_cost():
+    rows, model = rows_with_costs([7, 5, 4, 3, 3, 2])
+    shards = QuestionScheduler(model, "lpt").partition(rows, 2)
+    loads = sorted(sum(model.history[f"q{ind}"] for ind in shard) for shard in shards)
+    assert loads == [12, 12]
+    assert sorted(ind for shard in shards for ind in shard) == list(range(6))
+    # 每个分片内按预测成本从高到低开始
+    for shard in shards:
+        costs = [model.history[f"q{ind}"] for ind in shard]
+        assert costs == sorted(costs, reverse=True)
+
+
+def test_partition_fifo_interleaves():
+    rows, model = rows_with_costs([1, 1, 1, 1, 1])
+    assert QuestionScheduler(model, "fifo").partition(rows, 2) == [[0, 2, 4], [1, 3]]
+
+
+def test_list_schedule_makespan():
+    assert list_schedule_makespan([3, 3, 2, 2, 2], 2) == 7
+    assert list_schedule_makespan(sorted([2, 2, 2, 3, 3], reverse=True), 2) == 7
+    assert list_schedule_makespan([1, 1, 1, 1, 4], 2) == 6
+    assert list_schedule_makespan([4, 1, 1, 1, 1], 2) == 4
+
+
+def test_linear_model_is_fitted_from_history():
+    rows = [(i, {"id": str(i), "question": "x" * (100 * i), "n_supporting_titles": 2}) for i in range(12)]
+    # 历史成本与问题长度成线性关系,没有历史的题目按拟合结果预测
+    model = CostModel({str(i): 2.0 + 3.0 * i for i in range(10)})
+    model.fit(row for _, row in rows)
+    assert model.predict(rows[11][1]) == pytest.approx(35.0)
+    assert model.stats()["linear_model"]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        QuestionScheduler(CostModel({}), "sjf")
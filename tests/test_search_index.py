@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+
+from agents import search_index
+from agents.offline_docstore import OfflineDocstore, build_offline_docstore
+from agents.search_index import IndexedDocstore, IndexStats, SearchIndex
+
+PAGES = [
+    ("Scott Derrickson", "Scott Derrickson is an American director of horror films."),
+    ("Ed Wood", "Edward Davis Wood Jr. was an American filmmaker."),
+    ("Nile", "The Nile is a river in Africa."),
+]
+
+
+def test_misspelled_search_resolves_without_touching_the_shared_docstore(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "index_stats", IndexStats())
+    build_offline_docstore(PAGES, str(tmp_path))
+    docstore = OfflineDocstore(str(tmp_path))
+    before = vars(docstore).copy()
+    indexed = IndexedDocstore(docstore, SearchIndex([t for t, _ in PAGES], [c for _, c in PAGES]))
+
+    result = indexed.search("Scot Derickson")
+    assert isinstance(result, Document) and result.metadata["page"] == "Scott Derrickson"
+    # 索引只在包装层上,底层（进程共享的）docstore 的属性不变,未命中也不会全量扫描标题
+    assert vars(docstore) == before and docstore._titles is None
+    assert search_index.index_stats.stats()["resolved"] == 1
+
+
+def test_unresolved_miss_uses_index_suggestions(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "index_stats", IndexStats())
+    build_offline_docstore(PAGES, str(tmp_path))
+    docstore = OfflineDocstore(str(tmp_path))
+    indexed = IndexedDocstore(docstore, SearchIndex([t for t, _ in PAGES], [c for _, c in PAGES]))
+
+    assert indexed.search("river in Africa").startswith("Could not find [river in Africa]. Similar: ['Nile'")
+    assert search_index.index_stats.stats() == {"misses": 1, "resolved": 0, "suggested": 1, "resolve_rate": 0.0}
+    # 没有包装的 docstore 仍然用自己的 Similar 提示
+    assert docstore.search("river in Africa").startswith("Could not find [river in Africa]. Similar: [")
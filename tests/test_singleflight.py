@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, create_singleflight_invoker
+from utils.usage import track_usage
+
+
+class SlowInvoker:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls: list[str] = []
+
+    async def __call__(self, prompt: str) -> str:
+        self.calls.append(prompt)
+        await asyncio.sleep(self.delay)
+        return f"answer to {prompt}"
+
+
+def test_concurrent_identical_calls_are_coalesced():
+    async def main():
+        group, invoker = SingleFlight(), SlowInvoker()
+        llm = create_singleflight_invoker(invoker, group, "model", {"temperature": 0.3}, ["\nObservation"])
+        results = await asyncio.gather(llm("q"), llm("q"), llm("other"))
+        return group, invoker, results
+
+    group, invoker, results = asyncio.run(main())
+    assert results == ["answer to q", "answer to q", "answer to other"]
+    assert sorted(invoker.calls) == ["other", "q"]
+    assert group.stats()["coalesced"] == 1
+
+
+def test_different_stop_or_params_are_not_coalesced():
+    async def main():
+        group, invoker = SingleFlight(), SlowInvoker()
+        plain = create_singleflight_invoker(invoker, group, "model", {"temperature": 0.3}, ["\nObservation"])
+        action = create_singleflight_invoker(invoker, group, "model", {"temperature": 0.3}, ["\nObservation", "<ACTION>"])
+        hotter = create_singleflight_invoker(invoker, group, "model", {"temperature": 1.0}, ["\nObservation"])
+        await asyncio.gather(plain("q"), action("q"), hotter("q"))
+        return group, invoker
+
+    group, invoker = asyncio.run(main())
+    assert len(invoker.calls) == 3
+    assert group.coalesced == 0
+
+
+def test_followers_record_usage_as_cached():
+    async def main():
+        llm = create_singleflight_invoker(SlowInvoker(), SingleFlight(), "model")
+        with track_usage() as tracker:
+            await asyncio.gather(llm("q"), llm("q"))
+        return tracker
+
+    tracker = asyncio.run(main())
+    # 假调用器本身不记录用量,只有被合并的那一次记录为缓存命中
+    assert [call.cached for call in tracker.calls] == [True]
+    assert tracker.calls[0].cost == 0.0
+
+
+def test_follower_reissues_when_leader_is_cancelled():
+    async def main():
+        group, invoker = SingleFlight(), SlowInvoker(delay=0.05)
+        leader = asyncio.create_task(group.do("k", lambda: invoker("q")))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(group.do("k", lambda: invoker("q")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return group, invoker, result
+
+    group, invoker, result = asyncio.run(main())
+    assert result == "answer to q"
+    assert len(invoker.calls) == 2
+    assert group.leader_cancelled == 1
+
+
+def test_cancelled_follower_does_not_cancel_leader():
+    async def main():
+        group, invoker = SingleFlight(), SlowInvoker(delay=0.05)
+        leader = asyncio.create_task(group.do("k", lambda: invoker("q")))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(group.do("k", lambda: invoker("q")))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader, invoker
+
+    result, invoker = asyncio.run(main())
+    assert result == "answer to q"
+    assert len(invoker.calls) == 1
+
+
+def test_leader_exception_is_shared():
+    async def main():
+        group = SingleFlight()
+
+        async def boom() -> str:
+            await asyncio.sleep(0.02)
+            raise RuntimeError("boom")
+
+        return await asyncio.gather(group.do("k", boom), group.do("k", boom), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
@@ -0,0 +1,100 @@
+import pytest
+
+from utils.streaming import StopMatcher, StreamReport, StreamStats
+
+
+def feed_all(matcher: StopMatcher, chunks: list[str]) -> int | None:
+    """依次喂入 chunk,返回命中停止条件时的 chunk 下标"""
+    for i, chunk in enumerate(chunks):
+        if matcher.feed(chunk):
+            return i
+    return None
+
+
+def test_no_stop_returns_full_text():
+    matcher = StopMatcher()
+    assert feed_all(matcher, ["Thought: ", "search ", "Milhouse"]) is None
+    assert matcher.result == "Thought: search Milhouse"
+    assert matcher.reason is None
+
+
+def test_stop_word_in_single_chunk():
+    matcher = StopMatcher(["\nObservation"])
+    assert feed_all(matcher, ["Search[Milhouse]\nObservation 1: ..."]) == 0
+    assert matcher.result == "Search[Milhouse]"
+    assert matcher.reason == "\nObservation"
+
+
+@pytest.mark.parametrize("split", range(1, len("\nObservation")))
+def test_stop_word_split_across_chunks(split):
+    stop = "\nObservation"
+    matcher = StopMatcher([stop])
+    assert feed_all(matcher, ["Search[Milhouse]" + stop[:split], stop[split:] + " 1: ..."]) == 1
+    assert matcher.result == "Search[Milhouse]"
+
+
+def test_stop_word_split_across_many_single_char_chunks():
+    matcher = StopMatcher(["\nObservation"])
+    assert feed_all(matcher, list("abc\nObservation 1")) == len("abc\nObservation") - 1
+    assert matcher.result == "abc"
+
+
+def test_earliest_stop_word_wins():
+    matcher = StopMatcher(["\nObservation", "\nAction"])
+    matcher.feed("I think\nAction 1: Search[x]\nObservation 1")
+    assert matcher.result == "I think"
+    assert matcher.reason == "\nAction"
+
+
+def test_empty_stop_words_are_ignored():
+    matcher = StopMatcher(["", "\nObservation"])
+    assert not matcher.feed("abc")
+    assert matcher.result == "abc"
+
+
+def test_feed_after_stop_keeps_result():
+    matcher = StopMatcher(["STOP"])
+    matcher.feed("abcSTOPdef")
+    assert matcher.feed("more")
+    assert matcher.result == "abc"
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Search[Milhouse] and more", "Search[Milhouse]"),
+    ("I should look it up.\nLookup[named after] trailing", "I should look it up.\nLookup[named after]"),
+    ("Action 2: Finish[Richard Nixon]\nObservation", "Action 2: Finish[Richard Nixon]"),
+])
+def test_stop_on_action(text, expected):
+    matcher = StopMatcher(["\nObservation"], stop_on_action=True)
+    assert matcher.feed(text)
+    assert matcher.result == expected
+    assert matcher.reason == "action"
+
+
+def test_stop_on_action_waits_for_closing_bracket_across_chunks():
+    matcher = StopMatcher(stop_on_action=True)
+    assert feed_all(matcher, ["Search[Mil", "house", "] then"]) == 2
+    assert matcher.result == "Search[Milhouse]"
+
+
+def test_action_inside_a_word_does_not_stop():
+    matcher = StopMatcher(stop_on_action=True)
+    assert not matcher.feed("I will ReSearch[this] later")
+
+
+def test_stop_word_before_action_wins():
+    matcher = StopMatcher(["\nObservation"], stop_on_action=True)
+    matcher.feed("Thought\nObservation 1: Search[x]")
+    assert matcher.result == "Thought"
+    assert matcher.reason == "\nObservation"
+
+
+def test_stream_report_aggregates():
+    report = StreamReport()
+    report.record(StreamStats(chunks=10, stopped_early=True, tokens_saved_est=246))
+    report.record(StreamStats(chunks=30))
+    stats = report.stats()
+    assert stats["calls"] == 2
+    assert stats["stopped_early"] == 1
+    assert stats["chunks"] == 40
+    assert stats["tokens_saved_est"] == 246
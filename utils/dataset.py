@@ -0,0 +1,373 @@
+"""
+HotpotQA 数据加载与预处理
+
+原始数据集（joblib 格式的 DataFrame）中 supporting_facts / context 是嵌套的数组,
+每道题都要按支持标题在 context 中查找句子并拼接。这一步只在预处理时做一次（单次遍历）,
+结果和其他派生字段一起写入按列存储的预处理目录,runner 直接内存映射读取。
+
+目录结构（cache/hotpot_prepared/<数据集文件名>/）:
+    <列名>.bin          字符串列: 所有值的 UTF-8 字节依次拼接
+    <列名>.offsets.npy  字符串列: 每个值的起始偏移（长度为 行数 + 1）
+    <列名>.npy          数值列
+    meta.json           格式版本、行数、列名和数据来源（最后写入,作为构建完成的标志）
+
+官方发布的 HotpotQA JSON（一个大数组,train 集约 9 万题、数百 MB）/ JSONL 不经过 pandas,
+用 stream_hotpot 增量解析,逐题产出只包含 runner 所需字段的精简记录,内存占用与数据集大小无关。
+"""
+import asyncio
+import json
+import mmap
+import os
+from functools import cache
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, Iterator, TextIO, TypeVar
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HOTPOT_SAMPLE_FILE = "data/hotpot-qa-distractor-sample.joblib"
+PREPARED_FORMAT_VERSION = 1
+DEFAULT_PREPARED_DIR = "cache/hotpot_prepared"
+
+# 原样保留的字符串列
+RAW_COLUMNS = ["id", "question", "answer", "type", "level"]
+# 按流式方式读取的数据集文件（其他格式按 joblib DataFrame 预处理）
+STREAMING_SUFFIXES = (".json", ".jsonl")
+
+T = TypeVar("T")
+
+
+def supporting_paragraphs(supporting_facts: dict[str, Any], context: dict[str, Any]) -> str:
+    """
+    拼接支持段落: 每个支持标题（按 supporting_facts 中的顺序,重复的标题重复拼接）对应 context 中第一篇同名文章的全部句子,
+    多个段落之间用空行分隔
+    """
+    paragraphs: dict[str, str] = {}
+    for title, sentences in zip(context["title"], context["sentences"]):
+        paragraphs.setdefault(title, "".join(sentences))
+    return "\n\n".join(paragraphs[title] for title in supporting_facts["title"] if title in paragraphs)
+
+
+def derive_columns(hotpot: "pd.DataFrame") -> dict[str, list[str] | np.ndarray]:
+    """
+    单次遍历计算所有派生字段
+
+    返回:
+        dict: 列名 → 字符串列表或数值数组,包括 RAW_COLUMNS 以及:
+            supporting_paragraphs: 支持段落
+            supporting_chars: 支持段落的字符数
+            n_supporting_facts: 支持句子数
+            n_supporting_titles: 不同的支持文章数（推理跳数）
+            n_context: context 中的文章数
+            context_chars: context 全部句子的字符数
+    """
+    n = len(hotpot)
+    paragraphs: list[str] = []
+    n_supporting_facts = np.zeros(n, dtype=np.int32)
+    n_supporting_titles = np.zeros(n, dtype=np.int32)
+    n_context = np.zeros(n, dtype=np.int32)
+    context_chars = np.zeros(n, dtype=np.int64)
+
+    for i, (facts, context) in enumerate(zip(hotpot["supporting_facts"], hotpot["context"])):
+        paragraphs.append(supporting_paragraphs(facts, context))
+        n_supporting_facts[i] = len(facts["title"])
+        n_supporting_titles[i] = len(set(facts["title"]))
+        n_context[i] = len(context["title"])
+        context_chars[i] = sum(len(sentence) for sentences in context["sentences"] for sentence in sentences)
+
+    columns: dict[str, list[str] | np.ndarray] = {name: [str(v) for v in hotpot[name]] for name in RAW_COLUMNS}
+    columns["supporting_paragraphs"] = paragraphs
+    columns["supporting_chars"] = np.fromiter((len(p) for p in paragraphs), dtype=np.int64, count=n)
+    columns["n_supporting_facts"] = n_supporting_facts
+    columns["n_supporting_titles"] = n_supporting_titles
+    columns["n_context"] = n_context
+    columns["context_chars"] = context_chars
+    return columns
+
+
+def build_prepared_hotpot(hotpot: "pd.DataFrame", directory: str, source: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    预处理数据集并写入列存储目录
+
+    参数:
+        hotpot: 原始数据集
+        directory: 输出目录
+        source: 数据来源信息,写入 meta.json 用于判断是否需要重新预处理
+
+    返回:
+        dict: meta.json 的内容
+    """
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再原子替换,其他进程不会读到写了一半的文件
+    suffix = f".tmp{os.getpid()}"
+
+    files: list[str] = []
+    kinds: dict[str, str] = {}
+    for name, values in derive_columns(hotpot).items():
+        if isinstance(values, np.ndarray):
+            kinds[name] = str(values.dtype)
+            with open(out / f"{name}.npy{suffix}", "wb") as f:
+                np.save(f, values)
+            files.append(f"{name}.npy")
+            continue
+
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(out / f"{name}.bin{suffix}", "wb") as f:
+            f.write(b"".join(encoded))
+        with open(out / f"{name}.offsets.npy{suffix}", "wb") as f:
+            np.save(f, offsets)
+        kinds[name] = "str"
+        files += [f"{name}.bin", f"{name}.offsets.npy"]
+
+    meta = {
+        "version": PREPARED_FORMAT_VERSION,
+        "rows": len(hotpot),
+        "columns": kinds,
+        "source": source or {},
+    }
+    with open(out / f"meta.json{suffix}", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    for file in files:
+        os.replace(out / f"{file}{suffix}", out / file)
+    os.replace(out / f"meta.json{suffix}", out / "meta.json")
+    return meta
+
+
+class PreparedHotpot:
+    """只读的预处理数据集,各列在第一次访问时才内存映射,取值时才解码"""
+
+    def __init__(self, directory: str):
+        self.path = Path(directory)
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            self.meta: dict[str, Any] = json.load(f)
+        if self.meta.get("version") != PREPARED_FORMAT_VERSION:
+            raise ValueError(f"预处理数据集格式版本不匹配: {self.meta.get('version')} != {PREPARED_FORMAT_VERSION}")
+        self._columns: dict[str, tuple[Any, np.ndarray] | np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.meta["columns"])
+
+    def _open(self, name: str) -> tuple[Any, np.ndarray] | np.ndarray:
+        if name not in self._columns:
+            kind = self.meta["columns"].get(name)
+            if kind is None:
+                raise KeyError(name)
+            if kind != "str":
+                self._columns[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+            else:
+                offsets = np.load(self.path / f"{name}.offsets.npy", mmap_mode="r")
+                with open(self.path / f"{name}.bin", "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+                self._columns[name] = (data, offsets)
+        return self._columns[name]
+
+    def value(self, name: str, i: int) -> Any:
+        column = self._open(name)
+        if isinstance(column, np.ndarray):
+            return column[i].item()
+        data, offsets = column
+        return data[int(offsets[i]):int(offsets[i + 1])].decode("utf-8")
+
+    def column(self, name: str) -> list[Any]:
+        column = self._open(name)
+        if isinstance(column, np.ndarray):
+            return column.tolist()
+        data, offsets = column
+        return [data[int(start):int(end)].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def row(self, i: int, columns: list[str] | None = None) -> dict[str, Any]:
+        return {name: self.value(name, i) for name in columns or self.columns}
+
+    def rows(self, columns: list[str] | None = None) -> Iterator[tuple[int, dict[str, Any]]]:
+        """按顺序产出 (行号, 行),与 DataFrame.iterrows() 的用法一致"""
+        for i in range(len(self)):
+            yield i, self.row(i, columns)
+
+    def to_frame(self, columns: list[str] | None = None) -> "pd.DataFrame":
+        import pandas as pd
+
+        return pd.DataFrame({name: self.column(name) for name in columns or self.columns})
+
+
+def hotpot_source(path: str) -> dict[str, Any]:
+    stat = os.stat(path)
+    return {"path": str(path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def prepared_dir(path: str, directory: str = DEFAULT_PREPARED_DIR) -> str:
+    """每个数据集文件对应一个预处理目录"""
+    return str(Path(directory) / Path(path).stem)
+
+
+@cache
+def open_prepared_hotpot(path: str = HOTPOT_SAMPLE_FILE, directory: str = DEFAULT_PREPARED_DIR) -> PreparedHotpot:
+    """
+    打开预处理后的数据集（同一进程内共享一个实例）
+
+    还没有预处理结果,或者格式版本 / 数据集文件发生变化时,先从原始数据集重新预处理。
+    """
+    out = prepared_dir(path, directory)
+    meta_path = Path(out) / "meta.json"
+    source = hotpot_source(path)
+    meta = None
+    if meta_path.exists():
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    if meta is None or meta.get("version") != PREPARED_FORMAT_VERSION or meta.get("source") != source:
+        import joblib
+
+        print(f"🧮 预处理数据集: {path} -> {out}")
+        build_prepared_hotpot(joblib.load(path).reset_index(drop=True), out, source=source)
+    hotpot = PreparedHotpot(out)
+    print("len(hotpot):", len(hotpot))
+    return hotpot
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    增量解析顶层为数组的 JSON 文件,逐个产出数组元素
+
+    每次读入 chunk_size 个字符,用 raw_decode 从缓冲区中解析完整的元素,元素不完整时再读入下一块,
+    缓冲区中只保留尚未解析的部分。
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    eof = not buf
+    pos = 0
+    opened = False
+    while True:
+        # 跳过空白和元素之间的逗号
+        while pos < len(buf) and (buf[pos].isspace() or (opened and buf[pos] == ",")):
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("JSON 数组不完整")
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        if not opened:
+            if buf[pos] != "[":
+                raise ValueError("JSON 文件顶层不是数组")
+            opened = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # 元素正好在缓冲区末尾结束时可能还没有读完（例如被块边界截断的数字）,读入下一块后重新解析
+            incomplete = end == len(buf) and not eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            incomplete = True
+        if incomplete:
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield item
+        pos = end
+
+
+def lean_record(raw: dict[str, Any]) -> dict[str, Any]:
+    """
+    把一道题的原始记录精简为 runner 用到的字段（丢弃 context 等大字段）
+
+    同时支持官方格式（_id; supporting_facts 为 [标题, 句子号] 列表; context 为 [标题, 句子列表] 列表）
+    和 HuggingFace datasets 格式（id; supporting_facts / context 为按字段分开的列表,与 joblib 文件相同）。
+    """
+    facts, context = raw["supporting_facts"], raw["context"]
+    if isinstance(context, list):
+        context = {"title": [title for title, _ in context], "sentences": [sentences for _, sentences in context]}
+    if isinstance(facts, list):
+        facts = {"title": [title for title, _ in facts]}
+    record = {
+        "id": str(raw["_id"] if "_id" in raw else raw["id"]),
+        "question": raw["question"],
+        "answer": raw.get("answer", ""),
+        "supporting_paragraphs": supporting_paragraphs(facts, context),
+        "n_supporting_titles": len(set(facts["title"])),
+    }
+    for name in ("type", "level"):
+        if name in raw:
+            record[name] = raw[name]
+    return record
+
+
+def stream_hotpot(path: str) -> Iterator[dict[str, Any]]:
+    """按文件中的顺序逐题产出精简记录（.jsonl 每行一题,.json 为顶层数组）"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield lean_record(json.loads(line))
+        else:
+            for raw in iter_json_array(f):
+                yield lean_record(raw)
+
+
+def iter_hotpot(path: str = HOTPOT_SAMPLE_FILE, columns: list[str] | None = None) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    按顺序产出 (行号, 行): 官方 JSON / JSONL 流式读取,joblib 文件读取预处理结果
+
+    参数:
+        path: 数据集文件
+        columns: 只保留这些字段,为 None 时保留全部
+    """
+    if not path.endswith(STREAMING_SUFFIXES):
+        yield from open_prepared_hotpot(path).rows(columns=columns)
+        return
+    for i, record in enumerate(stream_hotpot(path)):
+        yield i, record if columns is None else {name: record.get(name) for name in columns}
+
+
+async def aiter_batches(items: Iterable[T], batch_size: int = 64) -> AsyncIterator[T]:
+    """在线程中每次取出 batch_size 个元素（读文件 / 解析 JSON 不阻塞事件循环）,逐个产出"""
+    iterator = iter(items)
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(iterator, batch_size)))
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+def load_hotpot(path: str = HOTPOT_SAMPLE_FILE) -> "pd.DataFrame":
+    """
+    加载 HotpotQA 数据集（包含 supporting_paragraphs 等预处理列）
+
+    参数:
+        path: joblib 格式的数据集文件
+
+    返回:
+        pd.DataFrame: RAW_COLUMNS 加上预处理得到的派生列（不包含嵌套的 supporting_facts / context,
+        需要时直接 joblib.load 原始文件）
+    """
+    return open_prepared_hotpot(path).to_frame()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="预处理 HotpotQA 数据集（支持段落等派生字段）")
+    parser.add_argument("--data", default=HOTPOT_SAMPLE_FILE)
+    parser.add_argument("--out", default=DEFAULT_PREPARED_DIR)
+    args = parser.parse_args()
+
+    out = prepared_dir(args.data, args.out)
+    meta = build_prepared_hotpot(joblib.load(args.data).reset_index(drop=True), out, source=hotpot_source(args.data))
+    print(f"✅ 共 {meta['rows']} 道题, 列: {', '.join(meta['columns'])} -> {out}")
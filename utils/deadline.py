@@ -0,0 +1,56 @@
+"""
+单道题的截止时间与协作式取消
+
+截止时间是事件循环时间（与 loop.time() 同一时钟）,在题目开始时算一次,之后的重试、各轮 trial、
+扫描模式的各个分支都使用同一个截止时间,总耗时不会因为重试而翻倍。
+
+到期时 asyncio 取消块中正在等待的调用: LLM 请求随之关闭连接（流式请求由 aclosing 关闭上游）,
+限流器和请求合并器释放占用; 已经提交到线程池的 docstore 动作无法中断,只是不再等待它的结果。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+
+class DeadlineStats:
+    def __init__(self):
+        self.scopes = 0     # 进入截止时间范围的次数
+        self.expired = 0    # 到期被取消的次数
+
+    def stats(self) -> dict[str, Any]:
+        return {"scopes": self.scopes, "expired": self.expired}
+
+
+deadline_stats = DeadlineStats()
+
+
+class DeadlineScope:
+    def __init__(self):
+        self.expired = False
+
+
+def deadline_after(seconds: float | None) -> float | None:
+    """从现在起 seconds 秒后的截止时间,None 表示不限制"""
+    return None if seconds is None else asyncio.get_running_loop().time() + seconds
+
+
+@asynccontextmanager
+async def within_deadline(deadline: float | None) -> AsyncIterator[DeadlineScope]:
+    """
+    在截止时间之前运行块中的代码: 到期时取消块中正在等待的 LLM / docstore 调用,不向外抛出异常,
+    只把 scope.expired 置为 True,调用方保留到期前已经完成的部分结果
+
+    块中其他来源的 TimeoutError（例如单次 docstore 动作超时）照常抛出。
+    """
+    scope = DeadlineScope()
+    if deadline is not None:
+        deadline_stats.scopes += 1
+    timeout = asyncio.timeout_at(deadline)
+    try:
+        async with timeout:
+            yield scope
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        scope.expired = True
+        deadline_stats.expired += 1
@@ -0,0 +1,135 @@
+import asyncio
+import importlib.util
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import httpx
+
+
+@dataclass
+class HttpPoolConfig:
+    """单个推理端点（host）的连接池配置"""
+    max_connections: int = 64               # 同一 host 的最大连接数,超过后请求在池内排队
+    max_keepalive_connections: int = 32     # 空闲时保留的长连接数
+    keepalive_expiry: float = 30.0          # 空闲长连接的保留时间（秒）
+    http2: bool = False                     # 需要安装 h2,一条连接上多路复用多个请求
+    timeout: float = 60.0                   # 读/写/池等待超时（秒）
+    connect_timeout: float = 5.0
+
+
+_default_config = HttpPoolConfig()
+_host_configs: dict[str, HttpPoolConfig] = {}
+# 每个 host 一个客户端; AsyncClient 绑定创建时的事件循环,换循环后重新创建
+_async_clients: dict[str, tuple[asyncio.AbstractEventLoop | None, "httpx.AsyncClient"]] = {}
+_sync_clients: dict[str, "httpx.Client"] = {}
+
+
+def _host_of(base_url: str | None) -> str:
+    return urlsplit(base_url or "").netloc or "default"
+
+
+def configure_http_pool(config: HttpPoolConfig, base_url: str | None = None) -> None:
+    """
+    设置连接池配置
+
+    参数:
+        config: 连接池配置
+        base_url: 只对该 host 生效; 为 None 时修改默认配置
+    """
+    global _default_config
+    if base_url is None:
+        _default_config = config
+    else:
+        _host_configs[_host_of(base_url)] = config
+
+
+def get_pool_config(base_url: str | None = None) -> HttpPoolConfig:
+    return _host_configs.get(_host_of(base_url), _default_config)
+
+
+def _client_kwargs(config: HttpPoolConfig) -> dict[str, Any]:
+    import httpx
+
+    http2 = config.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("⚠️ 未安装 h2,HTTP/2 不可用,回退到 HTTP/1.1（pip install httpx[http2]）")
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(config.timeout, connect=config.connect_timeout),
+        "http2": http2,
+    }
+
+
+def get_async_http_client(base_url: str | None = None) -> "httpx.AsyncClient":
+    """
+    获取指定 host 共享的异步客户端（首次调用时创建）
+
+    同一 host 的所有调用共用一个连接池,几百个并发调用复用少量保持连接的 TCP/TLS 连接。
+    """
+    import httpx
+
+    host = _host_of(base_url)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    entry = _async_clients.get(host)
+    if entry is not None and not entry[1].is_closed:
+        bound_loop, client = entry
+        if bound_loop is None or loop is None or bound_loop is loop:
+            # 在事件循环外创建的客户端,第一次在循环内使用时绑定该循环
+            _async_clients[host] = (bound_loop or loop, client)
+            return client
+
+    client = httpx.AsyncClient(**_client_kwargs(get_pool_config(base_url)))
+    _async_clients[host] = (loop, client)
+    return client
+
+
+def get_http_client(base_url: str | None = None) -> "httpx.Client":
+    """获取指定 host 共享的同步客户端（首次调用时创建）"""
+    import httpx
+
+    host = _host_of(base_url)
+    client = _sync_clients.get(host)
+    if client is None or client.is_closed:
+        client = httpx.Client(**_client_kwargs(get_pool_config(base_url)))
+        _sync_clients[host] = client
+    return client
+
+
+def _pool_connections(client: Any) -> list[Any]:
+    # httpx 没有公开连接池状态,这里读取 httpcore 连接池的内部属性,取不到时返回空列表
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+def http_pool_stats() -> dict[str, dict[str, int]]:
+    """每个 host 当前的连接数和空闲连接数"""
+    stats: dict[str, dict[str, int]] = {}
+    for host, (_, client) in _async_clients.items():
+        connections = _pool_connections(client)
+        stats[host] = {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "http2": sum(1 for c in connections if "HTTP/2" in c.info()),
+        }
+    return stats
+
+
+async def aclose_http_clients() -> None:
+    """关闭所有共享客户端（程序退出前调用）"""
+    for _, client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+    for client in list(_sync_clients.values()):
+        client.close()
+    _sync_clients.clear()
@@ -0,0 +1,244 @@
+"""
+基于 SQLite 的持久化任务队列（带租约）
+
+每道题是一条任务,状态流转:
+    pending --lease--> leased --complete--> done
+                         |  --fail / 租约过期--> pending（尝试次数未用完）或 failed（已用完）
+
+- 领取任务时写入租约持有者和过期时间,持有者定期 heartbeat 续租
+- 进程退出或节点宕机后租约过期,任务重新被其他进程领取,最多尝试 max_attempts 次
+- 任务结果和完成状态在同一个事务中写入,进程崩溃不会出现"结果已写、任务未完成"的情况
+- enqueue 对已有的任务 id 不做任何修改,多个 runner 可以放心地重复入队同一批题目
+
+队列文件可以放在多个节点共享的存储上。网络文件系统上 WAL 模式不可用,因此这里使用默认的回滚日志模式;
+租约过期时间使用墙上时钟,各节点的时钟需要大致同步（误差远小于租约时长）。
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+
+@dataclass
+class Job:
+    id: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+class SqliteJobQueue:
+    """
+    参数:
+        path: SQLite 文件路径,目录不存在时会自动创建
+        lease_seconds: 租约时长,持有者需要在过期前 heartbeat
+        max_attempts: 每个任务最多被领取的次数（包括租约过期的那几次）
+        owner: 租约持有者标识,默认为 主机名:进程号:随机后缀
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3, owner: str | None = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, payload TEXT NOT NULL, "
+            "state TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "owner TEXT, lease_expires REAL, result TEXT, error TEXT, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, seq)")
+
+        self.leased = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn, self._lock)
+
+    def enqueue(self, jobs: Iterable[tuple[str, dict[str, Any]]]) -> int:
+        """
+        批量入队 (任务 id, payload),已经存在的 id 保持原状
+
+        返回:
+            int: 新加入的任务数
+        """
+        now = time.time()
+        rows = [(str(id), json.dumps(payload, ensure_ascii=False), now) for id, payload in jobs]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (id, payload, updated) VALUES (?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def lease(self, n: int = 1) -> list[Job]:
+        """
+        领取最多 n 个任务: 按入队顺序取 pending 的任务,以及租约已经过期的任务
+
+        返回:
+            list[Job]: 领取到的任务,attempts 为包括本次在内的领取次数
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # ⏰ 租约过期且尝试次数已经用完的任务直接判为失败
+            self.expired += conn.execute(
+                "UPDATE jobs SET state = 'failed', owner = NULL, error = 'lease expired', updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            ).rowcount
+            rows = conn.execute(
+                "SELECT seq, id, payload, attempts, state FROM jobs "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) ORDER BY seq LIMIT ?",
+                (now, n),
+            ).fetchall()
+            jobs = []
+            for seq, id, payload, attempts, state in rows:
+                if state == "leased":
+                    self.expired += 1
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', attempts = attempts + 1, owner = ?, lease_expires = ?, updated = ? WHERE seq = ?",
+                    (self.owner, now + self.lease_seconds, now, seq),
+                )
+                jobs.append(Job(id=id, payload=json.loads(payload), attempts=attempts + 1))
+        self.leased += len(jobs)
+        return jobs
+
+    def heartbeat(self) -> int:
+        """
+        为本持有者的所有租约续期
+
+        返回:
+            int: 续期的任务数
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE state = 'leased' AND owner = ?",
+                (now + self.lease_seconds, now, self.owner),
+            ).rowcount
+
+    def complete(self, id: str, result: Any = None) -> bool:
+        """
+        标记任务完成并保存结果
+
+        返回:
+            bool: 租约已经过期并被其他进程领走时返回 False（结果不会写入,以新的持有者为准）
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET state = 'done', owner = NULL, result = ?, error = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND owner = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), str(id), self.owner),
+            ).rowcount
+        self.completed += updated
+        return bool(updated)
+
+    def fail(self, id: str, error: str, result: Any = None) -> bool:
+        """
+        本次尝试失败: 尝试次数未用完时重新入队,否则标记为 failed
+
+        参数:
+            result: 可选的部分结果（例如超过截止时间的记录）,最终失败时随任务一起导出
+
+        返回:
+            bool: 是否已经不再重试（failed）
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND state = 'leased' AND owner = ?", (str(id), self.owner)).fetchone()
+            if row is None:
+                return False
+            state = "failed" if row[0] >= self.max_attempts else "pending"
+            conn.execute(
+                "UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL, result = ?, error = ?, updated = ? WHERE id = ?",
+                (state, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), str(id)),
+            )
+        if state == "failed":
+            self.failed += 1
+        return state == "failed"
+
+    def retry_failed(self) -> int:
+        """把所有 failed 的任务重新入队并清零尝试次数"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, updated = ? WHERE state = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({state: n for state, n in rows})
+        return counts
+
+    def drained(self) -> bool:
+        """所有任务都已经完成或失败（没有排队中的任务,也没有任何进程持有租约）"""
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def results(self) -> Iterator[tuple[str, str, Any, str | None]]:
+        """按入队顺序产出已结束的任务 (id, 状态, 结果, 错误信息)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, state, result, error FROM jobs WHERE state IN ('done', 'failed') ORDER BY seq").fetchall()
+        for id, state, result, error in rows:
+            yield id, state, json.loads(result) if result is not None else None, error
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "leased": self.leased,
+            "completed": self.completed,
+            "failed": self.failed,
+            "expired": self.expired,
+            "queue": self.counts(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE 事务: 开始时就拿到写锁,多个进程同时领取任务时不会领到同一个"""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        try:
+            self._conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self._lock.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看 / 维护持久化任务队列")
+    parser.add_argument("path")
+    parser.add_argument("--retry-failed", action="store_true", help="把 failed 的任务重新入队")
+    args = parser.parse_args()
+
+    jobs = SqliteJobQueue(args.path)
+    if args.retry_failed:
+        print(f"🔁 重新入队 {jobs.retry_failed()} 个失败的任务")
+    print(f"🗃️ {jobs.counts()}")
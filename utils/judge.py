@@ -0,0 +1,195 @@
+import hashlib
+import re
+import string
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from utils.kv_store import SqliteKVStore
+from utils.prompt import JUDGE_INSTRUCTION
+
+DEFAULT_VERDICT_CACHE_PATH = "cache/judge_verdicts.sqlite"
+PUNCTUATION = frozenset(string.punctuation)
+ARTICLES_PATTERN = re.compile(r"\b(a|an|the)\b")
+
+
+def normalize_answer(s: str) -> str:
+    """HotpotQA 官方评测的答案归一化: 小写、去标点、去冠词、合并空白"""
+    s = s.lower()
+    s = "".join(ch for ch in s if ch not in PUNCTUATION)
+    s = ARTICLES_PATTERN.sub(" ", s)
+    return " ".join(s.split())
+
+
+def f1_score(prediction: str, ground_truth: str) -> float:
+    """
+    HotpotQA 官方的 token 级 F1
+
+    yes/no/noanswer 只有完全相同时才计分。
+    """
+    normalized_prediction = normalize_answer(prediction)
+    normalized_ground_truth = normalize_answer(ground_truth)
+
+    special = ("yes", "no", "noanswer")
+    if normalized_prediction in special or normalized_ground_truth in special:
+        return float(normalized_prediction == normalized_ground_truth)
+
+    prediction_tokens = normalized_prediction.split()
+    ground_truth_tokens = normalized_ground_truth.split()
+    common = Counter(prediction_tokens) & Counter(ground_truth_tokens)
+    num_same = sum(common.values())
+    if num_same == 0:
+        return 0.0
+    precision = num_same / len(prediction_tokens)
+    recall = num_same / len(ground_truth_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+class VerdictCache:
+    """
+    judge 结论的持久化缓存
+
+    以 (问题, 归一化后的回答, 归一化后的标准答案) 为键,多轮 Reflexion 中重复给出的答案不再询问 judge。
+    """
+
+    def __init__(self, path: str = DEFAULT_VERDICT_CACHE_PATH, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store: SqliteKVStore | None = None
+
+    @property
+    def store(self) -> SqliteKVStore:
+        if self._store is None:
+            self._store = SqliteKVStore(self.path, max_bytes=self.max_bytes, table="judge_verdicts")
+        return self._store
+
+    @staticmethod
+    def make_key(question: str, answer: str, key: str) -> str:
+        payload = "\0".join((question.strip(), normalize_answer(answer), normalize_answer(key)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, answer: str, key: str) -> bool | None:
+        value = self.store.get(self.make_key(question, answer, key))
+        return None if value is None else value == b"1"
+
+    def put(self, question: str, answer: str, key: str, verdict: bool) -> None:
+        self.store.set(self.make_key(question, answer, key), b"1" if verdict else b"0")
+
+
+@dataclass
+class JudgeConfig:
+    """
+    分层判题配置
+
+    - 第一层: 本地规则,归一化后完全相同、F1 达到阈值等明显情况直接判定
+    - 第二层: 持久化的 verdict 缓存
+    - 第三层: judge LLM,只处理不确定的情况
+    """
+    exact_match: bool = True                 # 归一化后完全相同 -> 正确
+    accept_f1: float | None = 1.0            # F1 >= 阈值 -> 正确（1.0 即 token 集合相同,只是顺序不同）
+    reject_f1: float | None = None           # F1 <= 阈值 -> 错误（默认关闭,同义改写的 F1 也可能为 0）
+    reject_yes_no_mismatch: bool = True      # 标准答案是 yes/no 且回答是相反的 yes/no -> 错误
+    reject_empty: bool = True                # 归一化后为空的回答 -> 错误
+    verdict_cache: VerdictCache | None = None
+
+
+class JudgeStats:
+    def __init__(self):
+        self.local_accept = 0
+        self.local_reject = 0
+        self.cache_hits = 0
+        self.llm_calls = 0
+
+    def stats(self) -> dict[str, Any]:
+        total = self.local_accept + self.local_reject + self.cache_hits + self.llm_calls
+        return {
+            "local_accept": self.local_accept,
+            "local_reject": self.local_reject,
+            "cache_hits": self.cache_hits,
+            "llm_calls": self.llm_calls,
+            "llm_rate": self.llm_calls / total if total else 0.0,
+        }
+
+
+_judge_config = JudgeConfig()
+judge_stats = JudgeStats()
+
+
+def configure_judge(config: JudgeConfig) -> None:
+    """设置全局默认的判题配置（runner 启动时调用）"""
+    global _judge_config
+    _judge_config = config
+
+
+def get_judge_config() -> JudgeConfig:
+    return _judge_config
+
+
+def local_verdict(answer: str, key: str, config: JudgeConfig) -> bool | None:
+    """
+    第一层: 本地判定明显情况
+
+    返回:
+        bool | None: 能确定时返回结论,不确定时返回 None
+    """
+    normalized_answer = normalize_answer(answer)
+    normalized_key = normalize_answer(key)
+
+    if config.reject_empty and not normalized_answer:
+        return False
+    if config.exact_match and normalized_answer == normalized_key:
+        return True
+    if config.reject_yes_no_mismatch and normalized_key in ("yes", "no") and normalized_answer in ("yes", "no"):
+        return False
+
+    f1 = f1_score(answer, key)
+    if config.accept_f1 is not None and f1 >= config.accept_f1:
+        return True
+    if config.reject_f1 is not None and f1 <= config.reject_f1:
+        return False
+    return None
+
+
+async def judge_answer(
+    question: str,
+    answer: str,
+    key: str,
+    llm: Callable[[str], Awaitable[str]],
+    config: JudgeConfig | None = None,
+) -> bool:
+    """
+    分层判断回答是否正确
+
+    参数:
+        question: 问题
+        answer: 模型给出的回答
+        key: 标准答案
+        llm: judge LLM
+        config: 判题配置,不传则使用全局默认配置
+
+    返回:
+        bool: 回答是否正确
+    """
+    config = config or _judge_config
+
+    verdict = local_verdict(answer, key, config)
+    if verdict is not None:
+        if verdict:
+            judge_stats.local_accept += 1
+        else:
+            judge_stats.local_reject += 1
+        return verdict
+
+    if config.verdict_cache is not None:
+        verdict = config.verdict_cache.get(question, answer, key)
+        if verdict is not None:
+            judge_stats.cache_hits += 1
+            return verdict
+
+    judge_stats.llm_calls += 1
+    judge_result = await llm(JUDGE_INSTRUCTION.format(question=question, answer=answer, key=key))
+    verdict = "true" in judge_result.lower()
+
+    if config.verdict_cache is not None:
+        config.verdict_cache.put(question, answer, key, verdict)
+    return verdict
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteKVStore:
+    """
+    基于 SQLite 的本地键值存储
+
+    - WAL 模式 + 事务写入，进程崩溃后不会留下半写的数据
+    - 多个进程可以同时读写同一个文件（由 SQLite 的文件锁保证）
+    - 按总字节数进行 LRU 淘汰，超过 max_bytes 时删除最久未访问的条目
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, table: str = "kv"):
+        """
+        参数:
+            path: SQLite 文件路径，目录不存在时会自动创建
+            max_bytes: 存储的最大字节数（按 value 大小统计），超过后触发淘汰
+            table: 表名，同一个文件可以存放多张表
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed)")
+        self._size = self._total_size()
+
+    def _total_size(self) -> int:
+        row = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return int(row[0])
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (time.time(), key))
+            return bytes(row[0])
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            # 覆盖已有的键时只增加新旧大小之差,旧值的大小在同一个事务中读取
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, len(value), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._size += len(value) - (row[0] if row is not None else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._size = self._total_size()
+
+    def _evict(self) -> None:
+        """删除最久未访问的条目，直到总大小降到 max_bytes 的 90% 以下"""
+        # 其他进程也可能写入，淘汰前重新统计一次真实大小
+        self._size = self._total_size()
+        target = int(self.max_bytes * 0.9)
+        if self._size <= self.max_bytes:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed ASC")
+            to_delete = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                to_delete.append((key,))
+                self._size -= size
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", to_delete)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0])
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+from utils.kv_store import SqliteKVStore
+from utils.rate_limit import estimate_tokens
+from utils.usage import record_llm_call
+
+DEFAULT_CACHE_PATH = "cache/llm_cache.sqlite"
+
+# 参与缓存键计算的采样参数（ChatOpenAI 上的属性名）
+SAMPLING_PARAM_NAMES = (
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "seed",
+    "frequency_penalty",
+    "presence_penalty",
+    "n",
+)
+
+
+class LLMCache:
+    """
+    LLM 补全结果的持久化缓存
+
+    缓存键由 模型名 + 采样参数 + 停止词列表 + prompt 哈希 组成，
+    重跑同一批问题时，相同前缀的调用直接从本地返回，不再请求接口。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store: SqliteKVStore | None = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def store(self) -> SqliteKVStore:
+        # 第一次读写时才打开数据库文件,构造缓存对象本身没有副作用
+        if self._store is None:
+            self._store = SqliteKVStore(self.path, max_bytes=self.max_bytes, table="llm_completions")
+        return self._store
+
+    @staticmethod
+    def make_key(model: str, params: dict[str, Any], stop: list[str] | None, prompt: str) -> str:
+        """
+        计算缓存键
+
+        参数:
+            model: 模型名称
+            params: 采样参数，值为 None 的参数会被忽略
+            stop: 停止词列表
+            prompt: 输入提示词
+
+        返回:
+            str: sha256 十六进制字符串
+        """
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        payload = json.dumps(
+            {
+                "model": model,
+                "params": {k: v for k, v in params.items() if v is not None},
+                "stop": stop,
+                "prompt": prompt_hash,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        value = self.store.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode("utf-8")
+
+    def put(self, key: str, completion: str) -> None:
+        self.store.set(key, completion.encode("utf-8"))
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.store),
+            "size_bytes": self.store.size_bytes,
+        }
+
+
+def llm_cache_identity(llm: Any) -> tuple[str, dict[str, Any]]:
+    """
+    从 ChatOpenAI 实例中提取参与缓存键的模型名与采样参数
+
+    base_url 也计入参数，避免不同服务上的同名模型共用缓存。
+    """
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+    params: dict[str, Any] = {name: getattr(llm, name, None) for name in SAMPLING_PARAM_NAMES}
+    params["base_url"] = getattr(llm, "openai_api_base", None)
+    return str(model), params
+
+
+def create_cached_invoker(
+    invoker: Callable[[str], Awaitable[str]],
+    cache: LLMCache,
+    model: str,
+    params: dict[str, Any] | None = None,
+    stop: list[str] | None = None,
+) -> Callable[[str], Awaitable[str]]:
+    """
+    用持久化缓存包装一个 LLM 调用器
+
+    参数:
+        invoker: 原始调用器
+        cache: LLMCache 实例
+        model: 模型名称
+        params: 采样参数
+        stop: 停止词列表
+
+    返回:
+        Callable[[str], Awaitable[str]]: 带缓存的调用器
+    """
+    params = params or {}
+
+    async def ainvoke(prompt: str) -> str:
+        key = LLMCache.make_key(model, params, stop, prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_call(model, estimate_tokens(prompt), estimate_tokens(cached), 0.0, cached=True)
+            return cached
+        completion = await invoker(prompt)
+        cache.put(key, completion)
+        return completion
+
+    return ainvoke
@@ -1,37 +1,85 @@
-from langchain_openai import ChatOpenAI
 # from langchain_community.chat_models.openai import ChatOpenAI
 import os
-from dotenv import load_dotenv, find_dotenv
-from typing import Callable, Awaitable
-
-# 加载环境变量
-# 1. 先尝试从当前目录加载.env文件
-# 2. 如果找不到,则尝试从父目录递归查找
-print("加载环境变量...")
-dotenv_path = find_dotenv(raise_error_if_not_found=True)
-load_dotenv(dotenv_path, override=True)
-
-# 获取必需的环境变量并进行验证
-print(os.getenv("OPENAI_LLM_BASE_URL"))
-print(os.getenv("OPENAI_LLM_MODEL"))
-print(os.getenv("LOCAL_LLM_BASE_URL"))
-print(os.getenv("LOCAL_LLM_MODEL"))
+import time
+from contextlib import aclosing
+from functools import cache
+from typing import TYPE_CHECKING, Callable, Awaitable
+
+from utils.llm_cache import LLMCache, create_cached_invoker, llm_cache_identity
+from utils.singleflight import SingleFlight, create_singleflight_invoker
+from utils.rate_limit import EndpointLimiter, create_limited_invoker
+from utils.streaming import StopMatcher, StreamReport, StreamStats
+from utils.rate_limit import estimate_tokens
+from utils.usage import record_llm_call
+from utils.http_client import get_async_http_client, get_http_client
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 DEFAULT_MODEL = "gpt-4o-mini"
 
 
-# 创建本地 LLM 实例
-local_llm = ChatOpenAI(
-    api_key="EMPTY",     # type: ignore
-    base_url=os.getenv("LOCAL_LLM_BASE_URL"),
-    model=os.getenv("LOCAL_LLM_MODEL") or DEFAULT_MODEL
-)
-openai_llm = ChatOpenAI(
-    api_key=os.getenv("OPENAI_LLM_API_KEY"), # type: ignore
-    base_url=os.getenv("OPENAI_LLM_BASE_URL"),
-    model=os.getenv("OPENAI_LLM_MODEL"), # type: ignore
-    temperature=0.3,
-)
+@cache
+def load_env() -> None:
+    """加载环境变量(只在第一次调用时执行)
+
+    1. 先尝试从当前目录加载.env文件
+    2. 如果找不到,则尝试从父目录递归查找
+    """
+    from dotenv import load_dotenv, find_dotenv
+
+    print("加载环境变量...")
+    dotenv_path = find_dotenv(raise_error_if_not_found=True)
+    load_dotenv(dotenv_path, override=True)
+
+    # 获取必需的环境变量并进行验证
+    print(os.getenv("OPENAI_LLM_BASE_URL"))
+    print(os.getenv("OPENAI_LLM_MODEL"))
+    print(os.getenv("LOCAL_LLM_BASE_URL"))
+    print(os.getenv("LOCAL_LLM_MODEL"))
+
+
+@cache
+def get_local_llm() -> "ChatOpenAI":
+    """创建本地 LLM 实例(首次调用时创建,之后复用)"""
+    from langchain_openai import ChatOpenAI
+
+    load_env()
+    base_url = os.getenv("LOCAL_LLM_BASE_URL")
+    return ChatOpenAI(
+        api_key="EMPTY",     # type: ignore
+        base_url=base_url,
+        model=os.getenv("LOCAL_LLM_MODEL") or DEFAULT_MODEL,
+        # 🔌 同一 host 共用连接池,并发调用复用保持连接
+        http_async_client=get_async_http_client(base_url),
+        http_client=get_http_client(base_url),
+    )
+
+
+@cache
+def get_openai_llm() -> "ChatOpenAI":
+    """创建 OpenAI LLM 实例(首次调用时创建,之后复用)"""
+    from langchain_openai import ChatOpenAI
+
+    load_env()
+    base_url = os.getenv("OPENAI_LLM_BASE_URL")
+    return ChatOpenAI(
+        api_key=os.getenv("OPENAI_LLM_API_KEY"), # type: ignore
+        base_url=base_url,
+        model=os.getenv("OPENAI_LLM_MODEL"), # type: ignore
+        temperature=0.3,
+        http_async_client=get_async_http_client(base_url),
+        http_client=get_http_client(base_url),
+    )
+
+
+def __getattr__(name: str):
+    # 兼容旧代码的 `from utils.llms import local_llm, openai_llm`,访问时才创建客户端
+    if name == "local_llm":
+        return get_local_llm()
+    if name == "openai_llm":
+        return get_openai_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # 创建 OpenAI LLM 实例
@@ -51,24 +99,120 @@ openai_llm = ChatOpenAI(
 # import openai
 # def create__llm(base_url: str, api_key: str, model: str, stop: list[str] | None = None)
 
-def create_llm_invoker(llm: ChatOpenAI, stop: list[str] | None = None) -> Callable[[str], Awaitable[str]]:
+def create_llm_invoker(
+    llm: "ChatOpenAI",
+    stop: list[str] | None = None,
+    cache: LLMCache | None = None,
+    singleflight: SingleFlight | None = None,
+    limiter: EndpointLimiter | None = None,
+    stop_on_action: bool = False,
+    stream_report: StreamReport | None = None,
+    stream_budget_tokens: int = 256,
+) -> Callable[[str], Awaitable[str]]:
+    """创建异步 LLM 调用器
+
+    参数:
+        llm: ChatOpenAI 实例
+        stop: 停止词列表,流式输出遇到停止词(可以跨 chunk)时立即关闭请求并返回
+        stop_on_action: 流式输出出现第一个完整的 Action[...] 时立即关闭请求并返回(只用于生成 Action 的调用)
+        stream_report: 可选的流式统计汇总,记录每次调用提前停止节省的 token（按 chunk 数估计）
+        stream_budget_tokens: 未设置 max_tokens 时,用于估计节省 token 数的生成预算
+        cache: 可选的持久化缓存,命中时不再请求接口
+        singleflight: 可选的请求合并器,并发中的相同 prompt 只请求一次
+        limiter: 可选的端点限流器(RPM/TPM 令牌桶 + 自适应并发),缓存命中不占用额度
+
+    返回:
+        Callable[[str], Awaitable[str]]: 输入 prompt,返回模型回复
+    """
+    streaming = stop is not None or stop_on_action
+    model_name = getattr(llm, "model_name", None) or ""
+
     async def ainvoke(prompt: str) -> str:
-        if stop is None:
-            return (await llm.ainvoke(prompt)).content # type: ignore
-        else:
-            content = ""
-            # 🔄 修复: 移除多余的 await，因为 astream() 已经返回了一个 AsyncIterator
-            async for chunk in llm.astream(prompt):
-                # 🛑 检查是否包含停止词
-                for stop_token in stop:
-                    if stop_token in chunk.content:
-                        return content
-                content += chunk.content # type: ignore
+        start = time.perf_counter()
+        if not streaming:
+            message = await llm.ainvoke(prompt)
+            content: str = message.content # type: ignore
+            # 📊 优先使用接口返回的真实用量,拿不到时按字符数估计
+            usage = getattr(message, "usage_metadata", None) or {}
+            record_llm_call(
+                model_name,
+                usage.get("input_tokens") or estimate_tokens(prompt),
+                usage.get("output_tokens") or estimate_tokens(content),
+                time.perf_counter() - start,
+            )
             return content
-    return ainvoke
 
-def chat_completion(prompt: str, model: str = os.getenv("OPENAI_LLM_MODEL") or DEFAULT_MODEL) -> str:
-    """调用 OpenAI API 进行对话补全
+        matcher = StopMatcher(stop, stop_on_action=stop_on_action)
+        stats = StreamStats()
+        ttft: float | None = None
+        usage: dict = {}
+        # 🛑 停止词同时交给服务端; aclosing 保证提前返回时关闭上游请求,服务端停止继续生成
+        # stream_usage: 正常结束的流在最后一个 chunk 中带有服务端统计的用量
+        async with aclosing(llm.astream(prompt, stop=stop, stream_usage=True)) as stream:
+            async for chunk in stream:
+                stats.chunks += 1
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if ttft is None and chunk.content:
+                    ttft = time.perf_counter() - start
+                if matcher.feed(chunk.content): # type: ignore
+                    stats.stopped_early = True
+                    break
+
+        content = matcher.result
+        # 📊 提前关闭的流拿不到 usage,按已经收到的文本估计（一个 chunk 可能包含多个 token,也可能是空的）
+        generated_tokens = estimate_tokens(matcher.text)
+        record_llm_call(
+            model_name,
+            usage.get("input_tokens") or estimate_tokens(prompt),
+            usage.get("output_tokens") or generated_tokens,
+            time.perf_counter() - start,
+            ttft=ttft,
+        )
+        if stream_report is not None:
+            stats.stop_reason = matcher.reason
+            stats.completion_chars = len(content)
+            stats.discarded_chars = len(matcher.text) - len(content)
+            if stats.stopped_early:
+                stats.tokens_saved_est = max(0, (llm.max_tokens or stream_budget_tokens) - generated_tokens)
+            stream_report.record(stats)
+        return content
+
+    invoker: Callable[[str], Awaitable[str]] = ainvoke
+    if limiter is not None:
+        invoker = create_limited_invoker(invoker, limiter)
+    # 缓存键和合并键都区分是否在 Action 处停止
+    model, params = llm_cache_identity(llm)
+    identity_stop = [*(stop or []), "<ACTION>"] if stop_on_action else stop
+    if cache is not None:
+        invoker = create_cached_invoker(invoker, cache, model, params, identity_stop)
+    if singleflight is not None:
+        # 放在缓存外层：被合并的调用不会重复查询/写入缓存
+        invoker = create_singleflight_invoker(invoker, singleflight, model, params, identity_stop)
+    return invoker
+
+def _chat_completion_request(prompt: str, model: str | None) -> tuple[str, dict, dict]:
+    load_env()
+    model = model or os.getenv("OPENAI_LLM_MODEL") or DEFAULT_MODEL
+    headers = {
+        "Authorization": f"Bearer {os.getenv('OPENAI_LLM_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    return f"{os.getenv('OPENAI_LLM_BASE_URL')}/chat/completions", headers, data
+
+
+def _parse_chat_completion(status_code: int, body: dict) -> str:
+    if status_code == 200:
+        return body["choices"][0]["message"]["content"]
+    print(f"API 请求失败: {status_code}")
+    return ""
+
+
+def chat_completion(prompt: str, model: str | None = None) -> str:
+    """调用 OpenAI API 进行对话补全(同步版本,复用连接池)
 
     参数:
         prompt: 输入提示词
@@ -78,38 +222,33 @@ def chat_completion(prompt: str, model: str = os.getenv("OPENAI_LLM_MODEL") or D
         str: 模型的回复内容
     """
     try:
-        import requests
-
-        headers = {
-            "Authorization": f"Bearer {os.getenv('OPENAI_LLM_API_KEY')}",
-            "Content-Type": "application/json"
-        }
-
-        data = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-
-        response = requests.post(
-            f"{os.getenv('OPENAI_LLM_BASE_URL')}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30.0
-        )
+        url, headers, data = _chat_completion_request(prompt, model)
+        response = get_http_client(url).post(url, headers=headers, json=data)
+        return _parse_chat_completion(response.status_code, response.json())
+    except Exception as e:
+        print(f"OpenAI API 调用出错: {str(e)}")
+        return ""
 
-        if response.status_code == 200:
-            print(response.json())
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            print(f"API 请求失败: {response.status_code}")
-            return ""
 
+async def achat_completion(prompt: str, model: str | None = None) -> str:
+    """调用 OpenAI API 进行对话补全(异步版本,在事件循环中使用,不会阻塞其他任务)
+
+    参数:
+        prompt: 输入提示词
+        model: 模型名称,默认从环境变量获取
+
+    返回:
+        str: 模型的回复内容
+    """
+    try:
+        url, headers, data = _chat_completion_request(prompt, model)
+        response = await get_async_http_client(url).post(url, headers=headers, json=data)
+        return _parse_chat_completion(response.status_code, response.json())
     except Exception as e:
         print(f"OpenAI API 调用出错: {str(e)}")
         return ""
 
 
-
 if __name__ == "__main__":
     # print("invoke openai_llm")
     # print(openai_llm.openai_api_base, openai_llm.openai_api_key, openai_llm.model_name)
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Any
+
+
+class LoopLagMonitor:
+    """
+    事件循环阻塞监控
+
+    后台任务每隔 interval 秒醒来一次,实际醒来时间比预期晚的部分就是事件循环被同步代码占用的时间。
+    同步的 docstore 搜索、大 JSON 写盘等都会体现为延迟尖峰。
+    """
+
+    def __init__(self, interval: float = 0.05, block_threshold: float = 0.1):
+        self.interval = interval
+        self.block_threshold = block_threshold  # 超过该延迟记为一次阻塞
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.block_threshold:
+                self.blocked += 1
+                self.blocked_time += lag
+
+    def start(self) -> "LoopLagMonitor":
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "mean_lag_ms": round(self.total_lag / self.samples * 1000, 2) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "blocked": self.blocked,
+            "blocked_seconds": round(self.blocked_time, 3),
+        }
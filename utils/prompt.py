@@ -101,3 +101,6 @@ Here are some examples:
 {reflections}
 
 Question: {question}{scratchpad}"""
+
+
+JUDGE_INSTRUCTION = """对于给定问题，判断给定的回答是否与标准答案相同。一些问题的答案取决于具体的上下文，但是你并不了解上下文，因此你应该仅仅依据给定的标准答案来判断。你应该返回True或False。\n问题： {question}\n回答： {answer}\n标准答案： {key}"""
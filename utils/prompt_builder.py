@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from enum import Enum
+from functools import cache
+
+from utils.prompt import REACT_REFLECT_INSTRUCTION, cot_reflect_agent_prompt
+
+
+class PromptLayout(Enum):
+    CLASSIC = "classic"               # 原始模板顺序: 指令+示例 -> 反思 -> (上下文) -> 问题 -> scratchpad
+    PREFIX_STABLE = "prefix_stable"   # 按变化频率排序: 指令+示例 -> (上下文)+问题 -> 反思 -> scratchpad
+
+
+class PrefixStablePromptBuilder:
+    """
+    前缀稳定的 prompt 构建器
+
+    prompt 按变化频率从低到高拼接,让服务端 KV 前缀缓存尽可能命中:
+        1. 静态前缀（指令 + few-shot 示例）: 构造时编译一次,所有问题共享
+        2. 问题块（上下文 + 问题）: 每道题计算一次并缓存,同一道题的所有 trial/step 共享
+        3. 反思块: 每个 trial 变化一次
+        4. scratchpad: 每一步只在末尾追加
+
+    与 CLASSIC 布局的内容相同,只有顺序不同; 上下文为空时省略上下文块（与反思块一样）,CLASSIC 保持原模板不变。
+    """
+
+    def __init__(
+        self,
+        static_prefix: str,
+        question_template: str,
+        reflections_template: str,
+        context_template: str = "",
+        max_cached_questions: int = 1024,
+    ):
+        self.static_prefix = static_prefix
+        self.question_template = question_template
+        self.reflections_template = reflections_template
+        self.context_template = context_template
+        self.max_cached_questions = max_cached_questions
+        self._heads: OrderedDict[tuple, str] = OrderedDict()
+
+    def head(self, context: str = "", **question_fields: str) -> str:
+        """静态前缀 + 问题块（带 LRU 缓存）"""
+        key = (context, *sorted(question_fields.items()))
+        head = self._heads.get(key)
+        if head is None:
+            context_block = self.context_template.format(context=context) if context else ""
+            head = self.static_prefix + context_block + self.question_template.format(**question_fields)
+            self._heads[key] = head
+            if len(self._heads) > self.max_cached_questions:
+                self._heads.popitem(last=False)
+        else:
+            self._heads.move_to_end(key)
+        return head
+
+    def build(self, scratchpad: str, reflections: str = "", context: str = "", **question_fields: str) -> str:
+        middle = self.reflections_template.format(reflections=reflections.strip("\n")) if reflections.strip() else ""
+        return self.head(context, **question_fields) + middle + scratchpad
+
+
+@cache
+def react_prompt_builder(examples: str) -> PrefixStablePromptBuilder:
+    """ReAct(-Reflexion) 的前缀稳定构建器,复用 REACT_REFLECT_INSTRUCTION 中 {reflections} 之前的部分作为静态前缀"""
+    static_template, _ = REACT_REFLECT_INSTRUCTION.split("{reflections}")
+    return PrefixStablePromptBuilder(
+        static_prefix=static_template.format(examples=examples),
+        question_template="Question: {question}",
+        reflections_template="\n\n{reflections}\n",
+    )
+
+
+@cache
+def cot_prompt_builder(examples: str) -> PrefixStablePromptBuilder:
+    """CoT 的前缀稳定构建器,上下文与问题放在反思之前"""
+    static_template, _ = cot_reflect_agent_prompt.split("{reflections}")
+    return PrefixStablePromptBuilder(
+        static_prefix=static_template.format(examples=examples),
+        question_template="Question: {question}\n",
+        reflections_template="{reflections}\n",
+        context_template="Relevant Context:\n{context}\n\n",
+    )
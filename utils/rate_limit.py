@@ -0,0 +1,259 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数（约 4 个字符一个 token）"""
+    return max(1, len(text) // 4)
+
+
+def get_status_code(error: BaseException) -> int | None:
+    """从 openai/httpx 异常中取出 HTTP 状态码,取不到时返回 None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """429 或 5xx 视为服务端过载信号"""
+    status = get_status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "InternalServerError")
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """读取 Retry-After 响应头（秒）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    以 rate_per_minute 的速度匀速补充令牌,桶容量为 capacity。
+    consume 允许预估不足时欠账（余额为负）,之后的请求会等待补齐。
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # 单次请求超过桶容量时按容量计算,否则永远拿不到令牌
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """不等待直接扣除（用于请求完成后按真实用量补扣）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发限制
+
+    - 请求成功且延迟正常: 加性增加,每完成约 limit 个请求并发上限 +1
+    - 出现 429/5xx 或平滑后的延迟明显高于基线: 乘性减少
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        decrease_factor: float = 0.7,
+        latency_tolerance: float = 2.0,
+        latency_smoothing: float = 0.1,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_smoothing = latency_smoothing
+        self.inflight = 0
+        self.baseline_latency: float | None = None   # 长窗口延迟 EWMA（长期水平）
+        self.smoothed_latency: float | None = None   # 短窗口延迟 EWMA,单次抖动不会触发降并发
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, latency: float | None, overloaded: bool = False) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            if overloaded:
+                self._decrease()
+            elif latency is not None:
+                self._observe_latency(latency)
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency: float) -> None:
+        # 短窗口 EWMA 与长窗口 EWMA 比较: 短期延迟明显高于长期水平时视为排队拥塞
+        if self.smoothed_latency is None or self.baseline_latency is None:
+            self.smoothed_latency = self.baseline_latency = latency
+        else:
+            self.smoothed_latency += (latency - self.smoothed_latency) * self.latency_smoothing
+            self.baseline_latency += (latency - self.baseline_latency) * self.latency_smoothing / 10
+
+        if self.smoothed_latency > self.baseline_latency * self.latency_tolerance:
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self) -> None:
+        # 同一批并发请求的失败只减一次,避免并发上限瞬间塌缩
+        now = time.monotonic()
+        cooldown = self.baseline_latency or 1.0
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class EndpointLimiter:
+    """
+    单个推理端点的限流器
+
+    组合了 每分钟请求数（RPM）、每分钟 token 数（TPM）两个令牌桶和 AIMD 自适应并发。
+    遇到 429/5xx 时只重试当前这一次调用,而不是让整道题重跑。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        initial_concurrency: int = 8,
+        max_concurrency: int = 256,
+        expected_completion_tokens: int = 256,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.rpm = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tpm = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(initial=initial_concurrency, max_limit=max_concurrency)
+        self.expected_completion_tokens = expected_completion_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.requests = 0
+        self.overloaded = 0
+        self.retries = 0
+
+    async def call(self, prompt: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        在限流下执行一次调用
+
+        参数:
+            prompt: 输入提示词,用于估计 token 消耗
+            fn: 真正发起请求的函数
+
+        返回:
+            str: 调用结果
+        """
+        prompt_tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            if self.rpm is not None:
+                await self.rpm.acquire(1)
+            if self.tpm is not None:
+                await self.tpm.acquire(prompt_tokens + self.expected_completion_tokens)
+
+            await self.concurrency.acquire()
+            self.requests += 1
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                overloaded = is_overload_error(e)
+                await self.concurrency.release(None, overloaded=overloaded)
+                if not overloaded or attempt >= self.max_retries:
+                    raise
+                self.overloaded += 1
+                self.retries += 1
+                delay = get_retry_after(e) or min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                attempt += 1
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+                continue
+            except BaseException:
+                await self.concurrency.release(None)
+                raise
+
+            # 按输出 token 数归一化延迟,长回复(反思)和短回复(动作)混在一起时不会误判为拥塞
+            await self.concurrency.release((time.monotonic() - start) / estimate_tokens(result))
+            if self.tpm is not None:
+                # 按真实输出长度补扣预估差额
+                self.tpm.consume(estimate_tokens(result) - self.expected_completion_tokens)
+            return result
+
+    def partition(self, parts: int) -> None:
+        """多个进程共用同一个端点的配额时,每个进程只使用 1/parts（在发起请求之前调用）"""
+        for bucket in (self.rpm, self.tpm):
+            if bucket is not None:
+                bucket.rate /= parts
+                bucket.capacity /= parts
+                bucket.tokens = min(bucket.tokens, bucket.capacity)
+        concurrency = self.concurrency
+        concurrency.max_limit = max(concurrency.min_limit, concurrency.max_limit // parts)
+        concurrency.limit = min(concurrency.max_limit, max(concurrency.min_limit, concurrency.limit / parts))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "overloaded": self.overloaded,
+            "retries": self.retries,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "baseline_latency": self.concurrency.baseline_latency,
+        }
+
+
+def create_limited_invoker(
+    invoker: Callable[[str], Awaitable[str]],
+    limiter: EndpointLimiter,
+) -> Callable[[str], Awaitable[str]]:
+    """
+    用 EndpointLimiter 包装一个 LLM 调用器
+
+    参数:
+        invoker: 原始调用器
+        limiter: 该端点的限流器
+
+    返回:
+        Callable[[str], Awaitable[str]]: 带限流的调用器
+    """
+    async def ainvoke(prompt: str) -> str:
+        return await limiter.call(prompt, lambda: invoker(prompt))
+
+    return ainvoke
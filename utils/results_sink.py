@@ -0,0 +1,140 @@
+"""
+追加写入的 JSONL 结果文件,支持断点续跑
+
+每完成一道题只追加一行,I/O 与题目数量成线性关系（以前每道题都重写整个 JSON 数组,总开销是平方级）。
+fsync 按条数 / 时间间隔批量执行: 进程崩溃最多丢失最后一批尚未落盘的记录,这些题目下次会重新运行。
+运行结束时再统一导出为原来的 JSON 数组格式,下游的分析脚本不需要修改。
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+
+def write_json(path: str, data: Any) -> None:
+    """先写临时文件再原子替换,读取方不会看到写了一半的 JSON"""
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class JsonlResultsSink:
+    """
+    参数:
+        path: JSONL 文件路径
+        fsync_every: 每追加多少条记录执行一次 fsync
+        fsync_interval: 距离上次 fsync 超过该秒数时,下一次追加立即 fsync
+        resume: 为 False 时清空已有的文件,从头开始
+    """
+
+    def __init__(self, path: str, fsync_every: int = 32, fsync_interval: float = 5.0, resume: bool = True):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume:
+            self._repair()
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.appended = 0
+        self.fsyncs = 0
+
+    def _repair(self) -> None:
+        """崩溃时最后一行可能只写了一半,截断到最后一个完整的换行"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # 从尾部向前找到最后一个换行
+            pos = size
+            while pos > 0:
+                step = min(64 * 1024, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                idx = chunk.rfind(b"\n")
+                if idx != -1:
+                    f.truncate(pos + idx + 1)
+                    return
+            f.truncate(0)
+
+    def records(self) -> Iterator[dict[str, Any]]:
+        """读取已经写入的记录（跳过无法解析的行）"""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def latest(self) -> dict[str, dict[str, Any]]:
+        """每个 id 最后一次写入的记录（同一个 id 重跑过时以最后一次为准,顺序按第一次出现）"""
+        by_id: dict[str, dict[str, Any]] = {}
+        for record in self.records():
+            if record.get("id") is not None:
+                by_id[str(record["id"])] = record
+        return by_id
+
+    def completed_ids(self) -> set[str]:
+        """已经成功完成的题目 id（处理失败和超过截止时间的记录不算,续跑时会重新运行）"""
+        return {id for id, record in self.latest().items() if "error" not in record and not record.get("timed_out")}
+
+    def append(self, record: dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.appended += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._unsynced == 0:
+            return
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.fsyncs += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.flush()
+        self.sync()
+        self._file.close()
+
+    def export_json(self, path: str, order: list[str] | None = None) -> int:
+        """
+        导出为 JSON 数组（同一个 id 重跑过时保留最后一次的记录）
+
+        参数:
+            path: 输出文件路径
+            order: 按这个 id 顺序导出（例如数据集顺序）,与完成顺序无关; 不在其中的 id 排在最后。
+                为 None 时按第一次出现的顺序
+
+        返回:
+            int: 导出的记录数
+        """
+        anonymous = [record for record in self.records() if record.get("id") is None]
+        records = list(self.latest().values())
+        if order is not None:
+            rank = {id: i for i, id in enumerate(order)}
+            records.sort(key=lambda record: rank.get(str(record["id"]), len(rank)))
+        records += anonymous
+        write_json(path, records)
+        return len(records)
+
+    def stats(self) -> dict[str, Any]:
+        return {"appended": self.appended, "fsyncs": self.fsyncs}
@@ -0,0 +1,402 @@
+"""
+HotpotQA runner 的公共编排: 工作者协程、持久化任务队列、多进程分片、结果落盘和统计汇总
+
+run_hotpot_react.py / run_hotpot_cot.py 只负责各自的配置和 run_row（运行一道题）,
+其余流程都由 HotpotRunner 完成:
+
+    - 本地模式: 结果追加写入 JSONL（支持续跑）,单进程或多进程分片运行,最后导出 JSON 数组
+    - 任务队列模式: 题目写入 SQLite 任务队列,任意多个进程 / 节点领取运行,最后从队列导出
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from itertools import islice
+from typing import Any, Awaitable, Callable, Generic, Iterable, TypeVar
+
+from utils.dataset import HOTPOT_SAMPLE_FILE, aiter_batches, iter_hotpot
+from utils.deadline import deadline_after, deadline_stats
+from utils.http_client import aclose_http_clients, http_pool_stats
+from utils.job_queue import SqliteJobQueue
+from utils.judge import judge_stats
+from utils.llm_cache import LLMCache
+from utils.loop_monitor import LoopLagMonitor
+from utils.rate_limit import EndpointLimiter
+from utils.results_sink import JsonlResultsSink, write_json
+from utils.scheduler import create_scheduler
+from utils.sharding import ShardChannel, run_sharded
+from utils.singleflight import SingleFlight
+from utils.usage import RunUsage, SharedUsage
+
+S = TypeVar("S", bound=Enum)
+
+# run_row(row, ind, deadline) -> ({策略: 记录}, 日志); 重试全部失败时记录为 None
+RunRow = Callable[[dict[str, Any], int, float | None], Awaitable[tuple[dict[Any, Any] | None, str]]]
+# emit(ind, row_id, {策略: 记录 dict}, 日志, 耗时)
+Emit = Callable[[int, str, dict[Any, dict] | None, str, float], None]
+
+
+@dataclass
+class RunnerConfig:
+    """runner 的运行参数,取自各 runner 脚本顶部的模块级配置（含义见脚本中的注释）"""
+    log_file: str
+    max_steps: int
+    hotpot_sample_file: str = HOTPOT_SAMPLE_FILE
+    hotpot_columns: list[str] = field(default_factory=lambda: ["id", "question", "answer", "n_supporting_titles"])
+    resume: bool = True
+    num_processes: int = 1
+    worker_num: int = 10
+    job_queue_file: str | None = None
+    job_lease_seconds: float = 300
+    job_max_attempts: int = 3
+    question_timeout: float | None = None
+    schedule: str = "lpt"
+    schedule_window: int = 256
+    schedule_history: list[str] = field(default_factory=list)
+
+
+class HotpotRunner(Generic[S]):
+    """
+    参数:
+        config: 运行参数
+        strategies: 本次运行的策略（扫描模式下为多个）,每个策略有自己的结果文件和用量汇总
+        run_row: 运行一道题
+        output_file: output_file(策略, 后缀) -> 输出路径; 后缀为 .json（导出的记录）/ .jsonl（续跑用的结果）/ _usage.json（用量）
+        to_record: 把 run_row 返回的记录转成可以写入 JSON、发回主进程的 dict
+        llm_cache / singleflights / limiters: 进程内共享的组件,用于打印统计; limiters 在多进程时按进程数均分配额
+        extra_stats: 打印 runner 特有的统计（例如 docstore）,参数为前缀
+        sweep: 是否为扫描模式（打印共享第一轮省下的用量）
+    """
+
+    def __init__(
+        self,
+        config: RunnerConfig,
+        strategies: list[S],
+        run_row: RunRow,
+        output_file: Callable[[S, str], str],
+        to_record: Callable[[Any], dict] = lambda record: record,
+        llm_cache: LLMCache | None = None,
+        singleflights: dict[str, SingleFlight] | None = None,
+        limiters: dict[str, EndpointLimiter] | None = None,
+        extra_stats: Callable[[str], None] | None = None,
+        sweep: bool = False,
+    ):
+        self.config = config
+        self.strategies = strategies
+        self.run_row = run_row
+        self.output_file = output_file
+        self.to_record = to_record
+        self.llm_cache = llm_cache
+        self.singleflights = singleflights or {}
+        self.limiters = limiters or {}
+        self.extra_stats = extra_stats
+        self.sweep = sweep
+        # 按值还原策略（多进程、任务队列中按值传递）
+        self._by_value = {s.value: s for s in strategies}
+        # 📊 整个 run 的 token / 耗时 / 费用汇总（按策略）
+        self.run_usages = {s: RunUsage() for s in strategies}
+        # 🍴 扫描模式因为共享第一轮而省下的用量
+        self.shared_usage = SharedUsage()
+
+    def records_file(self, s: S) -> str:
+        return self.output_file(s, ".json")
+
+    def results_file(self, s: S) -> str:
+        return self.output_file(s, ".jsonl")
+
+    def usage_file(self, s: S) -> str:
+        return self.output_file(s, "_usage.json")
+
+    def _add_usage(self, s: S, record: dict) -> None:
+        self.run_usages[s].add(record["usage"], record["is_correct"])
+        self.shared_usage.add(record["usage"])
+
+    def collect(self, ind: int, row_id: str, records: dict[S, dict] | None, log_info: str, sinks: dict[S, JsonlResultsSink], all_logs: list):
+        """
+        📥 汇总一道题的结果（单进程时由工作者直接调用,多进程时在主进程中调用）
+        """
+        for s, sink in sinks.items():
+            record = records.get(s) if records is not None else None
+            if record is not None:
+                self._add_usage(s, record)
+            # 💾 追加一行保存进度（失败的题目也记录 id,续跑时重新运行）
+            sink.append(record if record is not None else {"id": row_id, "error": "处理失败"})
+        all_logs.append((ind, log_info))
+
+    async def worker(self, worker_id: int, queue: asyncio.Queue, emit: Emit):
+        """
+        🤖 工作者协程
+        """
+        while True:
+            try:
+                # 从队列获取任务
+                ind, row = await queue.get()
+            except asyncio.CancelledError:
+                break
+
+            start = time.perf_counter()
+            try:
+                # 处理任务（截止时间在第一次尝试前确定,重试不会延长）
+                records, log_info = await self.run_row(row, ind, deadline_after(self.config.question_timeout))
+
+                # 更新结果（记录转成 dict,既可以直接写入结果文件,也可以发回主进程）
+                emit(ind, row["id"], {s: self.to_record(record) for s, record in records.items()} if records is not None else None, log_info, time.perf_counter() - start)
+
+                print(f"[green]✅ 工作者{worker_id}完成第{ind+1}条数据[/green]")
+            except Exception as e:
+                # ❌ 重试之外的异常也记为失败,续跑时重新运行
+                print(f"[red]❌ 工作者{worker_id}处理第{ind+1}条数据失败: {e!r}[/red]")
+                emit(ind, row["id"], None, f"🧠 问题 {ind+1} 处理失败: {e!r}\n", time.perf_counter() - start)
+            finally:
+                # 标记任务完成（无论成败,否则 queue.join() 会一直等待）
+                queue.task_done()
+
+    async def queue_worker(self, worker_id: int, jobs: SqliteJobQueue):
+        """
+        🤖 从持久化任务队列领取题目的工作者协程,所有题目都结束（包括其他进程持有的）后退出
+        """
+        while True:
+            leased = await asyncio.to_thread(jobs.lease, 1)
+            if not leased:
+                if await asyncio.to_thread(jobs.drained):
+                    break
+                # ⏳ 剩下的题目都被其他进程持有,等它们完成,或者租约过期后接手
+                await asyncio.sleep(min(5.0, self.config.job_lease_seconds / 10))
+                continue
+
+            job = leased[0]
+            ind, row = job.payload["ind"], job.payload["row"]
+            start = time.perf_counter()
+            try:
+                records, log_info = await self.run_row(row, ind, deadline_after(self.config.question_timeout))
+            except Exception as e:
+                records, log_info = None, repr(e)
+
+            if records is None:
+                gave_up = await asyncio.to_thread(jobs.fail, job.id, log_info)
+                print(f"[red]❌ 工作者{worker_id}处理第{ind+1}条数据失败（第 {job.attempts} 次尝试{',不再重试' if gave_up else ''}）[/red]")
+                continue
+            dumped = {s.value: self.to_record(record) for s, record in records.items()}
+            result = {"records": dumped, "log": log_info, "seconds": time.perf_counter() - start}
+            if any(record.get("timed_out") for record in dumped.values()):
+                # ⏰ 和 JSONL 续跑一致: 超过截止时间的题目不算完成,重新入队; 不再重试时导出部分结果
+                gave_up = await asyncio.to_thread(jobs.fail, job.id, "超过截止时间", result)
+                print(f"[yellow]⏰ 工作者{worker_id}处理第{ind+1}条数据超时（第 {job.attempts} 次尝试{',不再重试' if gave_up else ''}）[/yellow]")
+                continue
+            if await asyncio.to_thread(jobs.complete, job.id, result):
+                print(f"[green]✅ 工作者{worker_id}完成第{ind+1}条数据[/green]")
+
+    async def heartbeat(self, jobs: SqliteJobQueue):
+        """
+        💓 定期为本进程持有的所有租约续期
+        """
+        while True:
+            await asyncio.sleep(self.config.job_lease_seconds / 3)
+            await asyncio.to_thread(jobs.heartbeat)
+
+    async def run_job_queue(self) -> list:
+        """
+        🗃️ 持久化任务队列模式: 入队（已有的题目保持原状）→ 领取运行直到所有题目结束 → 从队列导出结果
+
+        返回:
+            list: (行号, 日志) 列表
+        """
+        config = self.config
+        jobs = SqliteJobQueue(config.job_queue_file, lease_seconds=config.job_lease_seconds, max_attempts=config.job_max_attempts)
+        scheduler = create_scheduler(config.schedule_history, config.max_steps, config.schedule, config.schedule_window)
+        # 📥 分批入队,payload 中带上精简后的题目,领取时不需要再读数据集; 按调度顺序入队,领取顺序即入队顺序
+        rank: dict[str, int] = {}
+        added = 0
+        rows = scheduler.order(iter_hotpot(config.hotpot_sample_file, config.hotpot_columns))
+        while batch := list(islice(rows, 1000)):
+            rank.update((str(row["id"]), ind) for ind, row in batch)
+            added += await asyncio.to_thread(jobs.enqueue, [(str(row["id"]), {"ind": ind, "row": row}) for ind, row in batch])
+        print(f"🗃️ 任务队列 {config.job_queue_file}: 新增 {added} 道题, {jobs.counts()}")
+
+        beat = asyncio.create_task(self.heartbeat(jobs))
+        try:
+            await asyncio.gather(*(self.queue_worker(i, jobs) for i in range(config.worker_num)))
+        finally:
+            beat.cancel()
+        print(f"🗃️ 任务队列统计: {jobs.stats()}")
+
+        # 📝 所有节点的结果和日志都在队列里,按数据集顺序导出（每个进程导出的内容相同）
+        finished = sorted(jobs.results(), key=lambda result: rank.get(result[0], len(rank)))
+        all_logs = [(rank.get(id, len(rank)), result["log"]) for id, _, result, _ in finished if result is not None]
+        for id, state, result, _ in finished:
+            if state == "done" and id in rank and "seconds" in result:
+                scheduler.observe(rank[id], result["seconds"])
+        print(f"⏱️ 调度统计（所有节点的题目,按本进程 {config.worker_num} 个工作者模拟）: {scheduler.report(config.worker_num)}")
+        for s in self.strategies:
+            records = []
+            for id, state, result, error in finished:
+                # 最终失败但有部分结果（超过截止时间）的题目导出部分结果
+                record = result["records"].get(s.value) if result is not None else None
+                if record is not None:
+                    self._add_usage(s, record)
+                records.append(record if record is not None else {"id": id, "error": error or "处理失败"})
+            write_json(self.records_file(s), records)
+            print(f"[green]✅ 已导出 {len(records)} 条记录到{self.records_file(s)}[/green]")
+        jobs.close()
+        return all_logs
+
+    async def run_rows(self, rows: Iterable[tuple[int, dict[str, Any]]], emit: Emit):
+        """
+        在当前事件循环中用 worker_num 个工作者协程运行这些题目（rows 可以是流式读取的迭代器）
+        """
+        # 创建任务队列（有界: 工作者跟不上时暂停读取数据集,内存占用不随数据集增长）
+        queue = asyncio.Queue(maxsize=self.config.worker_num * 2)
+
+        # 创建工作者
+        workers = [asyncio.create_task(self.worker(i, queue, emit)) for i in range(self.config.worker_num)]
+
+        # 添加所有任务到队列（在线程中分批读取,第一道题读到就开始运行）
+        async for ind, row in aiter_batches(rows):
+            await queue.put((ind, row))
+
+        # 等待所有任务完成
+        await queue.join()
+
+        # 取消所有工作者
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def print_process_stats(self, prefix: str = ""):
+        """
+        打印当前进程内共享组件的统计（多进程时每个子进程各打印一次）
+        """
+        if self.llm_cache is not None:
+            print(f"💾 {prefix}LLM 缓存统计: {self.llm_cache.stats()}")
+        if self.singleflights:
+            print(f"🔀 {prefix}请求合并统计: {' '.join(f'{name}={sf.stats()}' for name, sf in self.singleflights.items())}")
+        if self.limiters:
+            print(f"🚦 {prefix}限流统计: {' '.join(f'{name}={limiter.stats()}' for name, limiter in self.limiters.items())}")
+        print(f"🔌 {prefix}连接池统计: {http_pool_stats()}")
+        if self.extra_stats is not None:
+            self.extra_stats(prefix)
+        print(f"⚖️ {prefix}判题统计: {judge_stats.stats()}")
+        if self.config.question_timeout is not None:
+            print(f"⏰ {prefix}截止时间统计: {deadline_stats.stats()}")
+
+    def run_shard(self, shard_id: int, inds: list[int], channel: ShardChannel):
+        """
+        🧩 子进程入口: 在独立的事件循环中运行分到的题目,每完成一道题就发回主进程
+
+        run_sharded 按名字导入子进程入口,runner 脚本需要用一个模块级函数转调这里。
+        """
+        config = self.config
+        # 🚦 各进程均分端点配额
+        for limiter in self.limiters.values():
+            limiter.partition(config.num_processes)
+        wanted = set(inds)
+        rows = ((ind, row) for ind, row in iter_hotpot(config.hotpot_sample_file, config.hotpot_columns) if ind in wanted)
+        if config.schedule == "lpt":
+            # ⏱️ 按主进程分配的顺序开始（需要先读出本分片的题目）
+            start_order = {ind: i for i, ind in enumerate(inds)}
+            rows = sorted(rows, key=lambda item: start_order[item[0]])
+
+        def emit(ind: int, row_id: str, records: dict[S, dict] | None, log_info: str, seconds: float):
+            # 枚举按值传递,主进程中再还原
+            channel.send((ind, row_id, {s.value: record for s, record in records.items()} if records is not None else None, log_info, seconds))
+
+        async def main():
+            await self.run_rows(rows, emit)
+            self.print_process_stats(f"[分片 {shard_id}] ")
+            await aclose_http_clients()
+
+        asyncio.run(main())
+
+    async def run_sinks(self, shard_target: Callable[[int, list[int], ShardChannel], None] | None = None) -> list:
+        """
+        📝 本地模式: 结果追加写入 results_file,单进程或多进程分片运行,最后导出 records_file
+
+        参数:
+            shard_target: 多进程时的子进程入口（转调 run_shard 的模块级函数）
+
+        返回:
+            list: (行号, 日志) 列表
+        """
+        config = self.config
+        sinks = {s: JsonlResultsSink(self.results_file(s), resume=config.resume) for s in self.strategies}
+        # 扫描模式下一道题要所有策略都完成才跳过（未全部完成的重新运行所有策略,导出时以最后一次为准）
+        completed_ids = set.intersection(*(sink.completed_ids() for sink in sinks.values())) if config.resume else set()
+        # 📊 续跑时已完成题目的用量也计入本次汇总
+        for s, sink in sinks.items():
+            for id, previous in sink.latest().items():
+                if id in completed_ids:
+                    self.run_usages[s].add(previous.get("usage") or {}, previous.get("is_correct"))
+        all_logs = []
+        scheduler = create_scheduler(config.schedule_history, config.max_steps, config.schedule, config.schedule_window)
+
+        # 📖 边读数据集边运行,顺便记录数据集中的 id 顺序用于导出
+        order: list[str] = []
+
+        def pending_rows(columns: list[str]):
+            for ind, row in iter_hotpot(config.hotpot_sample_file, columns):
+                order.append(str(row["id"]))
+                if str(row["id"]) not in completed_ids:
+                    yield ind, row
+
+        def emit(ind: int, row_id: str, records: dict[S, dict] | None, log_info: str, seconds: float):
+            self.collect(ind, row_id, records, log_info, sinks, all_logs)
+            scheduler.observe(ind, seconds)
+
+        if config.num_processes > 1:
+            if shard_target is None:
+                raise ValueError("num_processes > 1 需要提供子进程入口 shard_target")
+            # 主进程只读 id 和预测成本用到的列分配题目,子进程各自流式读取自己分到的题目
+            shards = scheduler.partition(pending_rows(["id", "question", "n_supporting_titles"]), config.num_processes)
+            total = sum(len(inds) for inds in shards)
+
+            def on_result(payload):
+                ind, row_id, records, log_info, seconds = payload
+                emit(ind, row_id, {self._by_value[s]: record for s, record in records.items()} if records is not None else None, log_info, seconds)
+                print(f"[green]🧩 已完成 {len(all_logs)}/{total}[/green]")
+
+            report = await run_sharded(shard_target, shards, on_result)
+            print(f"🧩 多进程统计: {report}")
+        else:
+            await self.run_rows(scheduler.order(pending_rows(config.hotpot_columns)), emit)
+        print(f"⏱️ 调度统计: {scheduler.report(config.worker_num * max(1, config.num_processes))}")
+        skipped = sum(1 for id in order if id in completed_ids)
+        if skipped:
+            print(f"[yellow]⏯️ 续跑: 跳过 {skipped} 道已完成的题目[/yellow]")
+
+        # 📝 落盘并统一导出为 JSON 数组（按数据集顺序,与完成顺序无关）
+        for s, sink in sinks.items():
+            sink.close()
+            exported = sink.export_json(self.records_file(s), order=order)
+            print(f"[green]✅ 已导出 {exported} 条记录到{self.records_file(s)}[/green]")
+        return all_logs
+
+    async def run_all(self, shard_target: Callable[[int, list[int], ShardChannel], None] | None = None):
+        """
+        🎯 主控制流程
+
+        参数:
+            shard_target: 多进程时的子进程入口（转调 run_shard 的模块级函数）
+        """
+        config = self.config
+        # ⏱️ 监控事件循环是否被同步代码阻塞
+        loop_monitor = LoopLagMonitor().start()
+
+        all_logs = await (self.run_job_queue() if config.job_queue_file else self.run_sinks(shard_target))
+
+        # 保存最终日志
+        with open(config.log_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(log_info for _, log_info in sorted(all_logs)))
+        print(f"[green]✅ 已保存log到{config.log_file}[/green]")
+        if config.job_queue_file or config.num_processes <= 1:
+            self.print_process_stats()
+        await loop_monitor.stop()
+        print(f"⏱️ 事件循环阻塞统计: {loop_monitor.stats()}")
+        for s, usage in self.run_usages.items():
+            with open(self.usage_file(s), "w", encoding="utf-8") as f:
+                json.dump(usage.summary(), f, ensure_ascii=False, indent=2)
+            print(f"📊 用量统计 [{s.value}]: {json.dumps(usage.summary(), ensure_ascii=False)}")
+        if self.sweep:
+            # 🍴 每个策略的用量都包含共享的第一轮,实际只调用了一次
+            print(f"🍴 扫描模式共享节省: {self.shared_usage.stats()}")
+        await aclose_http_clients()
@@ -0,0 +1,213 @@
+"""
+按预测成本调度题目: 最长处理时间优先（LPT）
+
+按数据集顺序分发时,几道 5 轮 × 7 步的难题如果排在最后才开始,整个 run 要等它们跑完,其他工作者早已空闲。
+先开始成本最高的题目,长尾就能和其他题目并行消化掉。
+
+成本预测（单位: 步数）:
+    - 历史输出（之前运行的 records / results 文件）中出现过的题目: trials_count × max_steps + step_n,多个文件取平均
+    - 其余题目: 用有历史的题目拟合 问题长度、支持文章数 → 步数 的线性模型; 有历史的题目太少时按问题长度和支持文章数估计
+流式读取数据集时用最多 window 道题的堆做滑动窗口: 读满第一个窗口后每读入一道题就分发窗口内成本最高的一道,
+内存占用有界,第一道题也不必等整个数据集读完才开始。
+"""
+import glob
+import heapq
+import json
+from itertools import count, islice
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from utils.sharding import shard
+
+# 有历史的题目少于这个数时不拟合线性模型
+MIN_FIT_SAMPLES = 8
+
+
+def record_cost(record: dict[str, Any], max_steps: int) -> float | None:
+    """一条历史记录实际运行的总步数（处理失败的记录返回 None; 超过截止时间的记录至少按当前这一轮跑满计算）"""
+    if "error" in record or record.get("step_n") is None:
+        return None
+    trials = record.get("trials_count") or 0
+    if record.get("timed_out"):
+        return (trials + 1) * max_steps
+    return trials * max_steps + record["step_n"]
+
+
+def load_history(patterns: Iterable[str], max_steps: int) -> dict[str, float]:
+    """
+    从历史输出文件（JSON 数组或 JSONL,支持通配符）中读取每道题的平均成本
+
+    返回:
+        dict: 题目 id → 平均步数
+    """
+    costs: dict[str, list[float]] = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    records = json.load(f) if path.endswith(".json") else [json.loads(line) for line in f if line.strip()]
+            except (OSError, json.JSONDecodeError):
+                continue
+            for record in records if isinstance(records, list) else []:
+                cost = record_cost(record, max_steps) if isinstance(record, dict) else None
+                if cost is not None and record.get("id") is not None:
+                    costs.setdefault(str(record["id"]), []).append(cost)
+    return {id: sum(values) / len(values) for id, values in costs.items()}
+
+
+class CostModel:
+    """题目成本预测: 优先使用历史成本,其次是线性模型,最后是先验估计"""
+
+    def __init__(self, history: dict[str, float]):
+        self.history = history
+        self.coef: np.ndarray | None = None
+        self.fitted = False
+        self.history_hits = 0
+        self.predicted = 0
+
+    @staticmethod
+    def features(row: dict[str, Any]) -> np.ndarray:
+        return np.array([1.0, len(row.get("question") or "") / 100, float(row.get("n_supporting_titles") or 2)])
+
+    def fit(self, rows: Iterable[dict[str, Any]]) -> None:
+        """用有历史成本的题目拟合线性模型（只拟合一次）"""
+        self.fitted = True
+        samples = [(self.features(row), self.history[str(row["id"])]) for row in rows if str(row["id"]) in self.history]
+        if len(samples) < MIN_FIT_SAMPLES:
+            return
+        x = np.stack([features for features, _ in samples])
+        y = np.array([cost for _, cost in samples])
+        self.coef, *_ = np.linalg.lstsq(x, y, rcond=None)
+
+    def predict(self, row: dict[str, Any]) -> float:
+        self.predicted += 1
+        cost = self.history.get(str(row["id"]))
+        if cost is not None:
+            self.history_hits += 1
+            return cost
+        features = self.features(row)
+        if self.coef is not None:
+            return max(1.0, float(features @ self.coef))
+        # 先验: 问题越长、需要的支持文章越多,推理链越长
+        return float(features @ np.array([1.0, 1.0, 1.0]))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "history": len(self.history),
+            "predicted": self.predicted,
+            "history_hits": self.history_hits,
+            "linear_model": self.coef is not None,
+        }
+
+
+def list_schedule_makespan(costs: Iterable[float], workers: int) -> float:
+    """按给定顺序把每道题交给最早空闲的工作者,返回所有题目完成的时间"""
+    finish = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+
+class QuestionScheduler:
+    """
+    参数:
+        model: 成本预测模型
+        policy: "lpt" 按预测成本从高到低; "fifo" 保持数据集顺序
+        window: 流式读取时滑动窗口（堆）的大小,越大越接近全局 LPT,第一道题开始前读入的题目也越多
+    """
+
+    def __init__(self, model: CostModel, policy: str = "lpt", window: int = 256):
+        if policy not in ("lpt", "fifo"):
+            raise ValueError(f"未知的调度策略: {policy}")
+        self.model = model
+        self.policy = policy
+        self.window = window
+        self.predicted: dict[int, float] = {}   # 行号 → 预测成本
+        self.actual: dict[int, float] = {}      # 行号 → 实际耗时（秒）
+
+    def _predict(self, batch: list[tuple[int, dict[str, Any]]]) -> list[float]:
+        if not self.model.fitted:
+            self.model.fit(row for _, row in batch)
+        costs = [self.model.predict(row) for _, row in batch]
+        for (ind, _), cost in zip(batch, costs):
+            self.predicted[ind] = cost
+        return costs
+
+    def order(self, rows: Iterable[tuple[int, dict[str, Any]]]) -> Iterator[tuple[int, dict[str, Any]]]:
+        """
+        按调度策略重新排列 (行号, 行)
+
+        lpt 时每次分发滑动窗口内预测成本最高的题目（成本相同时保持原顺序）,fifo 时保持原顺序。
+        第一个窗口同时用于拟合成本模型,之后每读入一道题就分发一道。
+        """
+        rows = iter(rows)
+        heap: list[tuple[float, int, tuple[int, dict[str, Any]]]] = []
+        seq = count()
+
+        def push(batch: list[tuple[int, dict[str, Any]]]) -> None:
+            for item, cost in zip(batch, self._predict(batch)):
+                heapq.heappush(heap, (-cost if self.policy == "lpt" else 0.0, next(seq), item))
+
+        push(list(islice(rows, self.window)))
+        for item in rows:
+            push([item])
+            yield heapq.heappop(heap)[2]
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def partition(self, rows: Iterable[tuple[int, dict[str, Any]]], parts: int) -> list[list[int]]:
+        """
+        把题目分给多个进程: lpt 时按预测成本从高到低依次分给当前总成本最低的进程,fifo 时交错分片
+
+        返回:
+            list: 每个进程的行号列表（按开始顺序）
+        """
+        rows = list(rows)
+        costs = self._predict(rows)
+        if self.policy == "fifo":
+            return shard([ind for ind, _ in rows], parts)
+        shards: list[list[int]] = [[] for _ in range(parts)]
+        loads = [(0.0, i) for i in range(parts)]
+        for cost, (ind, _) in sorted(zip(costs, rows), key=lambda pair: -pair[0]):
+            load, i = heapq.heappop(loads)
+            shards[i].append(ind)
+            heapq.heappush(loads, (load + cost, i))
+        return shards
+
+    def observe(self, ind: int, seconds: float) -> None:
+        self.actual[ind] = seconds
+
+    def report(self, workers: int) -> dict[str, Any]:
+        """
+        FIFO 与 LPT 的完工时间（makespan）对比,按 workers 个并行工作者的列表调度模拟
+
+        predicted: 用预测成本（步数）模拟; actual: 用本次实际耗时（秒）模拟,
+        其中 lpt 为按预测成本排序的实际效果,oracle 为按实际耗时排序的理想情况
+        """
+        report: dict[str, Any] = {"policy": self.policy, "workers": workers, "model": self.model.stats()}
+        fifo = [self.predicted[ind] for ind in sorted(self.predicted)]
+        if fifo:
+            report["predicted"] = {
+                "fifo": round(list_schedule_makespan(fifo, workers), 2),
+                "lpt": round(list_schedule_makespan(sorted(fifo, reverse=True), workers), 2),
+                "lower_bound": round(max(sum(fifo) / workers, max(fifo)), 2),
+            }
+        inds = sorted(self.actual)
+        if inds:
+            actual = [self.actual[ind] for ind in inds]
+            by_prediction = sorted(inds, key=lambda ind: -self.predicted.get(ind, 0.0))
+            fifo_makespan = list_schedule_makespan(actual, workers)
+            lpt_makespan = list_schedule_makespan((self.actual[ind] for ind in by_prediction), workers)
+            report["actual"] = {
+                "fifo_s": round(fifo_makespan, 2),
+                "lpt_s": round(lpt_makespan, 2),
+                "oracle_s": round(list_schedule_makespan(sorted(actual, reverse=True), workers), 2),
+                "lower_bound_s": round(max(sum(actual) / workers, max(actual)), 2),
+                "lpt_vs_fifo": round(lpt_makespan / fifo_makespan, 3) if fifo_makespan else None,
+            }
+        return report
+
+
+def create_scheduler(history_patterns: Iterable[str], max_steps: int, policy: str = "lpt", window: int = 256) -> QuestionScheduler:
+    return QuestionScheduler(CostModel(load_history(history_patterns, max_steps)), policy=policy, window=window)
@@ -0,0 +1,104 @@
+"""
+多进程分片执行
+
+单个事件循环只能用满一个核: pydantic 复制、prompt 拼接、rich 输出、rapidfuzz 打分都在同一个线程里排队。
+这里把题目分片交给多个 worker 进程（spawn 启动,各自有独立的事件循环和并发预算）,
+子进程每完成一道题就通过队列把结果发回主进程,由主进程统一写入结果文件,结果文件只有一个写入者。
+
+子进程异常退出时,它还没发回的题目不会写入结果文件,下次续跑时重新运行。
+"""
+import asyncio
+import multiprocessing as mp
+import queue
+import time
+import traceback
+from typing import Any, Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def shard(items: Sequence[T], num_shards: int) -> list[list[T]]:
+    """交错分片（第 i 片为 items[i::num_shards]）,相邻的题目分到不同进程,各分片的难度分布接近"""
+    return [list(items[i::num_shards]) for i in range(num_shards)]
+
+
+class ShardChannel:
+    """子进程向主进程发送结果的通道"""
+
+    def __init__(self, shard_id: int, results: Any):
+        self.shard_id = shard_id
+        self._results = results
+
+    def send(self, payload: Any) -> None:
+        self._results.put(("result", self.shard_id, payload))
+
+
+def _shard_main(target: Callable[[int, list[Any], ShardChannel], None], shard_id: int, items: list[Any], results: Any) -> None:
+    try:
+        target(shard_id, items, ShardChannel(shard_id, results))
+    except BaseException:
+        results.put(("error", shard_id, traceback.format_exc()))
+        raise
+    results.put(("done", shard_id, None))
+
+
+async def run_sharded(
+    target: Callable[[int, list[Any], ShardChannel], None],
+    shards: list[list[Any]],
+    on_result: Callable[[Any], None],
+    poll_interval: float = 0.5,
+) -> dict[str, Any]:
+    """
+    每个分片启动一个子进程执行 target(shard_id, items, channel),在主进程中逐条处理发回的结果
+
+    参数:
+        target: 子进程入口,必须是模块级函数（spawn 启动时按名字导入）
+        shards: 每个子进程处理的数据（需要可以 pickle,通常只传行号）
+        on_result: 主进程中处理每条结果的回调,按到达顺序调用
+        poll_interval: 检查子进程是否存活的间隔
+
+    返回:
+        dict: 每个分片的条数、结果数、是否异常退出以及总耗时
+    """
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    processes = {
+        shard_id: ctx.Process(target=_shard_main, args=(target, shard_id, items, results), name=f"shard-{shard_id}")
+        for shard_id, items in enumerate(shards)
+        if items
+    }
+    start = time.perf_counter()
+    for process in processes.values():
+        process.start()
+
+    received = {shard_id: 0 for shard_id in processes}
+    running = set(processes)
+    failed: dict[int, str] = {}
+    while running:
+        try:
+            kind, shard_id, payload = await asyncio.to_thread(results.get, True, poll_interval)
+        except queue.Empty:
+            # 队列已经取空,仍未发送 done 而进程已经退出,说明异常退出（例如被 OOM kill）
+            for shard_id in [s for s in running if not processes[s].is_alive()]:
+                failed.setdefault(shard_id, f"exitcode={processes[shard_id].exitcode}")
+                running.discard(shard_id)
+            continue
+        if kind == "result":
+            received[shard_id] += 1
+            on_result(payload)
+        elif kind == "error":
+            failed[shard_id] = payload
+            running.discard(shard_id)
+            print(f"[red]❌ 分片 {shard_id} 异常退出:\n{payload}[/red]")
+        else:
+            running.discard(shard_id)
+
+    for process in processes.values():
+        await asyncio.to_thread(process.join)
+    return {
+        "shards": [
+            {"shard": shard_id, "items": len(shards[shard_id]), "results": received[shard_id], "failed": shard_id in failed}
+            for shard_id in processes
+        ],
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
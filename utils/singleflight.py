@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from utils.llm_cache import LLMCache
+from utils.rate_limit import estimate_tokens
+from utils.usage import record_llm_call
+
+
+class SingleFlight:
+    """
+    合并并发中的相同请求
+
+    同一时刻多个协程发送相同请求（相同 key）时，只有第一个真正请求接口，
+    其余协程等待同一个 future，结果返回后共享。
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future[str]] = {}
+        self.calls = 0       # 总调用次数
+        self.coalesced = 0   # 被合并（没有真正请求接口）的调用次数
+        self.leader_cancelled = 0  # 共享的请求被取消、等待者重新发起的次数
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        执行 fn,如果相同 key 的请求正在进行中则等待其结果
+
+        参数:
+            key: 请求的唯一标识
+            fn: 真正发起请求的函数
+
+        返回:
+            str: 请求结果
+        """
+        result, _ = await self.do_shared(key, fn)
+        return result
+
+    async def do_shared(self, key: str, fn: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        """
+        同 do,额外返回结果是否来自其他协程发起的请求
+
+        返回:
+            tuple[str, bool]: (请求结果, 是否被合并)
+        """
+        self.calls += 1
+        while (future := self._inflight.get(key)) is not None:
+            # shield: 某个等待者被取消时不影响其他共享结果的协程
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 真正发起请求的协程被取消（例如它所在的题目超过截止时间）而本协程没有被取消时,重新发起请求
+                if not future.cancelled() or asyncio.current_task().cancelling():  # type: ignore[union-attr]
+                    raise
+                self.leader_cancelled += 1
+                continue
+            self.coalesced += 1
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已被读取，没有其他等待者时避免 "Future exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+            "leader_cancelled": self.leader_cancelled,
+        }
+
+
+def create_singleflight_invoker(
+    invoker: Callable[[str], Awaitable[str]],
+    group: SingleFlight | None = None,
+    model: str = "",
+    params: dict[str, Any] | None = None,
+    stop: list[str] | None = None,
+) -> Callable[[str], Awaitable[str]]:
+    """
+    用 SingleFlight 包装一个 LLM 调用器,合并并发中的相同请求
+
+    合并键与 LLMCache.make_key 相同（模型名 + 采样参数 + 停止词 + prompt）,
+    同一个 SingleFlight 被多个调用器共享时,停止词或参数不同的请求不会拿到彼此的结果。
+    被合并的调用也记录一条用量（按缓存命中计,不计费用）,每道题的调用次数和 token 数不会少算。
+
+    参数:
+        invoker: 原始调用器
+        group: 共享的 SingleFlight 实例,不传则新建
+        model: 模型名称
+        params: 采样参数
+        stop: 停止词列表
+
+    返回:
+        Callable[[str], Awaitable[str]]: 带请求合并的调用器,可通过 .singleflight 读取统计
+    """
+    group = group or SingleFlight()
+    params = params or {}
+
+    async def ainvoke(prompt: str) -> str:
+        start = time.perf_counter()
+        result, shared = await group.do_shared(LLMCache.make_key(model, params, stop, prompt), lambda: invoker(prompt))
+        if shared:
+            record_llm_call(model, estimate_tokens(prompt), estimate_tokens(result), time.perf_counter() - start, cached=True)
+        return result
+
+    ainvoke.singleflight = group  # type: ignore[attr-defined]
+    return ainvoke
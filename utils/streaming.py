@@ -0,0 +1,93 @@
+import re
+from dataclasses import dataclass
+from typing import Any
+
+# ReAct 动作: 出现在开头、换行或冒号之后的完整 Search[...] / Lookup[...] / Finish[...]
+ACTION_BRACKET_PATTERN = re.compile(r"(?:^|\n|:)\s*(?:Search|Lookup|Finish)\[[^\]\n]*\]")
+
+
+class StopMatcher:
+    """
+    跨 chunk 的停止词匹配器
+
+    逐块喂入流式输出,在累计文本上查找停止词,因此停止词被拆在两个 chunk 之间也能识别。
+    开启 stop_on_action 时,出现第一个完整的 Action[...] 后立即停止。
+    """
+
+    def __init__(self, stop: list[str] | None = None, stop_on_action: bool = False):
+        self.stop = [s for s in (stop or []) if s]
+        self.stop_on_action = stop_on_action
+        self.max_stop_len = max((len(s) for s in self.stop), default=0)
+        self.text = ""
+        self.cut: int | None = None       # 停止位置（返回 text[:cut]）
+        self.reason: str | None = None    # 停止原因: 停止词本身或 "action"
+
+    def feed(self, chunk: str) -> bool:
+        """
+        喂入一个 chunk
+
+        返回:
+            bool: 是否已经命中停止条件
+        """
+        if self.cut is not None:
+            return True
+        # 只需从上一段末尾 max_stop_len-1 个字符开始查找,避免重复扫描整段文本
+        search_from = max(0, len(self.text) - self.max_stop_len + 1)
+        self.text += chunk
+
+        for s in self.stop:
+            idx = self.text.find(s, search_from)
+            if idx != -1 and (self.cut is None or idx < self.cut):
+                self.cut, self.reason = idx, s
+
+        if self.stop_on_action:
+            match = ACTION_BRACKET_PATTERN.search(self.text)
+            if match and (self.cut is None or match.end() <= self.cut):
+                self.cut, self.reason = match.end(), "action"
+
+        return self.cut is not None
+
+    @property
+    def result(self) -> str:
+        return self.text if self.cut is None else self.text[:self.cut]
+
+
+@dataclass
+class StreamStats:
+    """单次流式调用的统计"""
+    chunks: int = 0                 # 收到的 chunk 数（不等于 token 数: 一个 chunk 可能有多个 token,也有空的 role / usage chunk）
+    completion_chars: int = 0       # 返回给调用方的字符数
+    discarded_chars: int = 0        # 已收到但在停止点之后被丢弃的字符数
+    stopped_early: bool = False     # 是否在服务端结束前主动关闭了请求
+    stop_reason: str | None = None
+    tokens_saved_est: int = 0       # 估计值（不是实测）: 生成预算 - 按字符数估计的已生成 token 数
+
+
+class StreamReport:
+    """汇总多次流式调用的统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.stopped_early = 0
+        self.chunks = 0
+        self.discarded_chars = 0
+        self.tokens_saved_est = 0
+        self.last: StreamStats | None = None
+
+    def record(self, stats: StreamStats) -> None:
+        self.calls += 1
+        self.stopped_early += int(stats.stopped_early)
+        self.chunks += stats.chunks
+        self.discarded_chars += stats.discarded_chars
+        self.tokens_saved_est += stats.tokens_saved_est
+        self.last = stats
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "stopped_early": self.stopped_early,
+            "chunks": self.chunks,
+            "discarded_chars": self.discarded_chars,
+            "tokens_saved_est": self.tokens_saved_est,
+            "tokens_saved_est_per_call": self.tokens_saved_est / self.calls if self.calls else 0.0,
+        }
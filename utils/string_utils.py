@@ -1,4 +1,5 @@
 import re
+from enum import Enum
 from utils.prompt import LAST_TRAIL_HEADER, REFLECTION_AFTER_LAST_TRIAL_HEADER
 
 def format_step(step: str):
@@ -13,6 +14,42 @@ def format_step(step: str):
     """
     return step.strip("\n").strip().replace("\n", "")
 
+class StepMode(Enum):
+    SEPARATE = "separate"   # think 和 act 各调用一次 LLM
+    FUSED = "fused"         # 一次补全同时生成 Thought 和 Action,解析失败时只重试 Action
+
+
+FUSED_ACTION_PATTERN = re.compile(r"\n\s*Action(?:\s*\d+)?\s*:\s*")
+FUSED_OBSERVATION_PATTERN = re.compile(r"\n\s*Observation(?:\s*\d+)?\s*:")
+
+
+def split_thought_action(completion: str):
+    """
+    拆分融合模式的补全结果
+
+    参数:
+        completion: 形如 "思考内容\nAction 1: Search[xxx]\nObservation 1: ..." 的补全
+
+    返回:
+        (thought, action): action 为 None 表示没有生成合法的动作,需要单独重试 Action
+    """
+    match = FUSED_OBSERVATION_PATTERN.search(completion)
+    if match:
+        # 模型自己编造的 Observation 以及之后的内容全部丢弃
+        completion = completion[:match.start()]
+
+    parts = FUSED_ACTION_PATTERN.split(completion, maxsplit=1)
+    thought = format_step(parts[0])
+    if len(parts) < 2:
+        return thought, None
+
+    action = parts[1].strip().split("\n", 1)[0].strip()
+    action_type, _ = parse_action(action)
+    if action_type is None:
+        return thought, None
+    return thought, action
+
+
 def parse_action(action: str):
     """
     解析动作字符串
@@ -0,0 +1,197 @@
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator
+
+# 每 1M token 的价格（美元）: (输入, 输出)。未登记的模型（例如本地 vLLM）按 0 计费
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+def register_model_price(model: str, input_per_million: float, output_per_million: float) -> None:
+    MODEL_PRICES[model] = (input_per_million, output_per_million)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+@dataclass
+class LLMCallRecord:
+    """单次 LLM 调用的记录"""
+    phase: str | None           # think / act / reflect / judge / error-summary
+    trial: int | None
+    step: int | None
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    wall_time: float            # 秒
+    ttft: float | None          # 首 token 延迟（只有流式调用才有）
+    cached: bool = False        # 命中本地缓存,没有请求接口
+    cost: float = 0.0
+
+
+def _empty_totals() -> dict[str, Any]:
+    return {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "wall_time": 0.0, "cost_usd": 0.0}
+
+
+def _add_totals(totals: dict[str, Any], other: dict[str, Any]) -> None:
+    for name in ("calls", "cached_calls", "prompt_tokens", "completion_tokens", "wall_time", "cost_usd"):
+        totals[name] += other.get(name, 0)
+
+
+class UsageTracker:
+    """收集一道题内所有 LLM 调用的记录"""
+
+    def __init__(self):
+        self.calls: list[LLMCallRecord] = []
+
+    def record(self, call: LLMCallRecord) -> None:
+        self.calls.append(call)
+
+    def summary(self, include_calls: bool = True) -> dict[str, Any]:
+        """
+        汇总为可以直接写入 json 的字典
+
+        返回:
+            dict: 总计、按 phase 分组的小计,以及（可选）每次调用的明细
+        """
+        totals = _empty_totals()
+        by_phase: dict[str, dict[str, Any]] = {}
+        for call in self.calls:
+            call_totals = {
+                "calls": 1,
+                "cached_calls": int(call.cached),
+                "prompt_tokens": call.prompt_tokens,
+                "completion_tokens": call.completion_tokens,
+                "wall_time": call.wall_time,
+                "cost_usd": call.cost,
+            }
+            _add_totals(totals, call_totals)
+            _add_totals(by_phase.setdefault(call.phase or "other", _empty_totals()), call_totals)
+
+        summary: dict[str, Any] = {**totals, "by_phase": by_phase}
+        if include_calls:
+            summary["llm_calls"] = [asdict(call) for call in self.calls]
+        return summary
+
+
+class RunUsage:
+    """汇总整个 run 中所有题目的用量"""
+
+    def __init__(self):
+        self.questions = 0
+        self.correct = 0
+        self.totals = _empty_totals()
+        self.by_phase: dict[str, dict[str, Any]] = {}
+
+    def add(self, usage: dict[str, Any], is_correct: bool | None = None) -> None:
+        if not usage:
+            return
+        self.questions += 1
+        self.correct += int(bool(is_correct))
+        _add_totals(self.totals, usage)
+        for phase, totals in usage.get("by_phase", {}).items():
+            _add_totals(self.by_phase.setdefault(phase, _empty_totals()), totals)
+
+    def summary(self) -> dict[str, Any]:
+        cost = self.totals["cost_usd"]
+        wall = self.totals["wall_time"]
+        return {
+            "questions": self.questions,
+            "correct": self.correct,
+            **self.totals,
+            "correct_per_dollar": self.correct / cost if cost else None,
+            "correct_per_llm_second": self.correct / wall if wall else None,
+            "by_phase": self.by_phase,
+        }
+
+
+class SharedUsage:
+    """
+    扫描模式中被多个策略共享的调用
+
+    每个策略记录的 usage 都包含共享部分（shared_calls 条,由 shared_by 个策略共享）,便于与单独运行对比;
+    这里统计因为共享而实际省下的调用、token 和费用。
+    """
+
+    def __init__(self):
+        self.calls_saved = 0.0
+        self.prompt_tokens_saved = 0.0
+        self.completion_tokens_saved = 0.0
+        self.cost_saved = 0.0
+
+    def add(self, usage: dict[str, Any]) -> None:
+        shared_calls, shared_by = usage.get("shared_calls", 0), usage.get("shared_by", 1)
+        if not shared_calls or shared_by <= 1:
+            return
+        # 每个策略分摊 (shared_by - 1) / shared_by 份,所有策略加起来正好是省下的 shared_by - 1 份
+        share = (shared_by - 1) / shared_by
+        for call in usage.get("llm_calls", [])[:shared_calls]:
+            self.calls_saved += share
+            self.prompt_tokens_saved += call["prompt_tokens"] * share
+            self.completion_tokens_saved += call["completion_tokens"] * share
+            self.cost_saved += call["cost"] * share
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls_saved": round(self.calls_saved),
+            "prompt_tokens_saved": round(self.prompt_tokens_saved),
+            "completion_tokens_saved": round(self.completion_tokens_saved),
+            "cost_saved_usd": round(self.cost_saved, 5),
+        }
+
+
+_current_tracker: contextvars.ContextVar[UsageTracker | None] = contextvars.ContextVar("usage_tracker", default=None)
+_current_tags: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar("usage_tags", default={})
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageTracker]:
+    """在当前上下文（当前 asyncio task）内收集 LLM 调用记录"""
+    tracker = UsageTracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+@contextmanager
+def llm_phase(phase: str, trial: int | None = None, step: int | None = None) -> Iterator[None]:
+    """给上下文内发起的 LLM 调用打上阶段、轮次和步数标签"""
+    token = _current_tags.set({"phase": phase, "trial": trial, "step": step})
+    try:
+        yield
+    finally:
+        _current_tags.reset(token)
+
+
+def record_llm_call(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    wall_time: float,
+    ttft: float | None = None,
+    cached: bool = False,
+) -> None:
+    """记录一次 LLM 调用（没有处于 track_usage 上下文时直接忽略）"""
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return
+    tags = _current_tags.get()
+    tracker.record(LLMCallRecord(
+        phase=tags.get("phase"),
+        trial=tags.get("trial"),
+        step=tags.get("step"),
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        wall_time=wall_time,
+        ttft=ttft,
+        cached=cached,
+        cost=0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens),
+    ))